@@ -0,0 +1,128 @@
+# Per-task, per-host timing for the deployment playbooks
+# Read by scripts/deploy-profile-report.py
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: deploy_profile
+    type: aggregate
+    short_description: Record how long every task takes on every host
+    description:
+      - Writes one JSON file per playbook run with the duration and result of
+        each task on each host, plus the role and task file it came from.
+      - scripts/deploy-profile-report.py aggregates these files into a history.
+    options:
+      output_dir:
+        description: Directory for the run files, relative to the working directory
+        default: .cache/profile
+        env:
+          - name: DEPLOY_PROFILE_DIR
+        ini:
+          - section: callback_deploy_profile
+            key: output_dir
+'''
+
+import json
+import os
+import socket
+import time
+
+from ansible import context
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'deploy_profile'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.playbook = None
+        self.started = None
+        self.play = None
+        self.tasks = {}
+        self.running = {}
+        self.results = []
+
+    def v2_playbook_on_start(self, playbook):
+        self.playbook = os.path.basename(playbook._file_name)
+        self.started = time.time()
+
+    def v2_playbook_on_play_start(self, play):
+        self.play = play.get_name()
+
+    def _task_info(self, task, handler=False):
+        path = task.get_path() or ''
+        task_file = path.rsplit(':', 1)[0]
+        # Shorten to roles/<role>/tasks/<file>.yml or playbooks/<file>.yml
+        for marker in ('/roles/', '/playbooks/'):
+            if marker in task_file:
+                task_file = marker.strip('/') + '/' + task_file.split(marker, 1)[1]
+                break
+        return {
+            'task': task.get_name(),
+            'action': task.action,
+            'role': task._role.get_name() if task._role else None,
+            'file': task_file,
+            'path': path.rsplit('/', 1)[-1],
+            'handler': handler,
+            'play': self.play,
+        }
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.tasks[task._uuid] = self._task_info(task)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.tasks[task._uuid] = self._task_info(task, handler=True)
+
+    def v2_runner_on_start(self, host, task):
+        self.running[(host.get_name(), task._uuid)] = time.time()
+
+    def _record(self, result, status):
+        host = result._host.get_name()
+        task = result._task
+        start = self.running.pop((host, task._uuid), None)
+        end = time.time()
+        info = self.tasks.get(task._uuid) or self._task_info(task)
+        if status == 'ok' and result._result.get('changed'):
+            status = 'changed'
+        self.results.append(dict(info, host=host, status=status,
+                                 start=round(start or end, 3), duration=round(end - (start or end), 3)))
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, 'unreachable')
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.playbook:
+            return
+        output_dir = self.get_option('output_dir')
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            run = {
+                'playbook': self.playbook,
+                'start': round(self.started, 3),
+                'duration': round(time.time() - self.started, 3),
+                'limit': context.CLIARGS.get('subset'),
+                'controller': socket.gethostname(),
+                'failed': any(stats.failures.get(h) or stats.dark.get(h) for h in stats.processed),
+                'tasks': self.results,
+            }
+            # The pid keeps parallel runs of the same playbook (deploy-playbooks.py) apart
+            name = '%s-%s-%d.json' % (time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started)),
+                                      self.playbook.rsplit('.', 1)[0], os.getpid())
+            with open(os.path.join(output_dir, name), 'w') as f:
+                json.dump(run, f)
+        except (OSError, TypeError, ValueError) as e:
+            self._display.warning('deploy_profile: cannot write profile: %s' % e)
@@ -7,37 +7,26 @@ set -e
 GREEN='\033[0;32m'
 YELLOW='\033[1;33m'
 BLUE='\033[0;34m'
+RED='\033[0;31m'
 NC='\033[0m'
 
 echo -e "${BLUE}================================${NC}"
 echo -e "${BLUE} Raspberry Pi Cluster Deployment ${NC}"
 echo -e "${BLUE}================================${NC}"
 
-# Function to run playbook with status
-run_playbook() {
-    local playbook=$1
-    local description=$2
-    
-    echo -e "\n${YELLOW}Running: ${description}${NC}"
-    echo "Playbook: ${playbook}"
-    
-    if ansible-playbook "${playbook}" --diff; then
-        echo -e "${GREEN}✓ ${description} completed${NC}"
-    else
-        echo -e "${RED}✗ ${description} failed${NC}"
-        exit 1
-    fi
-}
-
 # Check connectivity
 echo -e "${YELLOW}Testing connectivity...${NC}"
 ansible -i inventories/prod/hosts.yml pis -m ping
 
-# Run playbooks in order
-run_playbook "playbooks/10-base.yml" "Base system configuration"
-run_playbook "playbooks/20-podman.yml" "Podman container runtime"
-run_playbook "playbooks/30-observability.yml" "Monitoring stack (Prometheus, Grafana, Loki)"
-run_playbook "playbooks/40-ingress.yml" "Ingress controller (Traefik/Caddy)"
+# Run playbooks as a dependency graph (deploy-graph.yml); steps on disjoint
+# hosts run in parallel, and only steps whose inputs changed since the last
+# deploy run. Arguments select steps, e.g. ./deploy-pis.sh ingress, or
+# ./deploy-pis.sh --force to converge everything
+echo -e "\n${YELLOW}Running playbooks...${NC}"
+if ! python3 ../scripts/deploy-playbooks.py --changed "$@" -- --diff; then
+    echo -e "${RED}✗ Deployment failed${NC}"
+    exit 1
+fi
 
 # Additional configurations
 echo -e "\n${YELLOW}Running additional configurations...${NC}"
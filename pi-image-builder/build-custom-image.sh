@@ -1,14 +1,36 @@
 #!/bin/bash
 # Custom Raspberry Pi Image Builder for Homelab Infrastructure
 # This script creates pre-configured images for each Pi with all software and configs
+#
+# Images are built in two layers:
+#   1. A common layer (base image + packages, podman and system configs shared
+#      by every Pi), cached in $CACHE_DIR and only rebuilt when its inputs change
+#   2. Per-Pi deltas (hostname, static IP from static-dhcp-config.json, role
+#      files), applied to reflink/sparse copies of the common layer in parallel
+#
+# Usage: ./build-custom-image.sh [pi-a pi-b ...]   (default: every Pi in the config)
 
 set -euo pipefail
 
 # Configuration
 WORK_DIR="/tmp/pi-image-builder"
 OUTPUT_DIR="./images"
+CACHE_DIR="${CACHE_DIR:-$WORK_DIR/cache}"
+CONFIG_FILE="${CONFIG_FILE:-./static-dhcp-config.json}"
 BASE_IMAGE_URL="https://cdimage.ubuntu.com/releases/24.04/release/ubuntu-24.04-preinstalled-server-arm64+raspi.img.xz"
 BASE_IMAGE_FILE="ubuntu-24.04-preinstalled-server-arm64+raspi.img"
+# Extra space for packages installed into the common layer
+COMMON_IMAGE_GROW="${COMMON_IMAGE_GROW:-1G}"
+# Output images are zstd-compressed with a bmap of the blocks in use
+ZSTD_LEVEL="${ZSTD_LEVEL:-19}"
+
+# Installed into the common layer when arm64 binaries can run here (qemu-user
+# binfmt or an arm64 build host); otherwise cloud-init installs them on first boot
+COMMON_PACKAGES=(
+    python3 python3-pip podman podman-compose curl wget git vim htop chrony ufw
+    prometheus-node-exporter fail2ban unattended-upgrades jq net-tools dnsutils
+    iotop ncdu tree tmux rsync nmap tcpdump
+)
 
 # Colors for output
 RED='\033[0;31m'
@@ -17,12 +39,22 @@ YELLOW='\033[1;33m'
 NC='\033[0m'
 
 # Create work directories
-mkdir -p "$WORK_DIR" "$OUTPUT_DIR"
+mkdir -p "$WORK_DIR" "$OUTPUT_DIR" "$CACHE_DIR"
 
 echo -e "${GREEN}========================================${NC}"
 echo -e "${GREEN}   Raspberry Pi Custom Image Builder${NC}"
 echo -e "${GREEN}========================================${NC}"
 
+# Network settings from the static DHCP config
+SUBNET=$(jq -r '.network.subnet' "$CONFIG_FILE")
+PREFIX="${SUBNET#*/}"
+GATEWAY=$(jq -r '.network.gateway' "$CONFIG_FILE")
+DNS_SERVERS=$(jq -r '[.network.dns_primary, .network.dns_secondary] | map(select(. != null)) | join(" ")' "$CONFIG_FILE")
+
+pi_ip() {
+    jq -r --arg pi "$1" '.static_leases[$pi].ip' "$CONFIG_FILE"
+}
+
 # Function to download base image
 download_base_image() {
     if [ ! -f "$WORK_DIR/$BASE_IMAGE_FILE" ]; then
@@ -37,28 +69,49 @@ download_base_image() {
     fi
 }
 
-# Function to mount image
+# Copy an image without duplicating data: shares extents on btrfs/XFS,
+# otherwise keeps the copy sparse
+copy_image() {
+    cp --reflink=auto --sparse=always "$1" "$2"
+}
+
+# Wait until the partition devices of a loop device exist
+wait_for_partitions() {
+    local LOOP_DEV="$1"
+
+    udevadm settle --timeout=10 2>/dev/null || true
+    for _ in $(seq 1 50); do
+        if [ -b "${LOOP_DEV}p1" ] && [ -b "${LOOP_DEV}p2" ]; then
+            return 0
+        fi
+        # Without udev (e.g. in a container) the nodes have to be created by hand
+        sudo partx -u "$LOOP_DEV" 2>/dev/null || true
+        sleep 0.1
+    done
+    echo -e "${RED}Partitions of $LOOP_DEV did not appear${NC}" >&2
+    return 1
+}
+
+# Function to mount image; prints the loop device
 mount_image() {
     local IMAGE_FILE="$1"
     local MOUNT_POINT="$2"
-    
+
     # Create loop device
     LOOP_DEV=$(sudo losetup --show -fP "$IMAGE_FILE")
-    echo "Loop device: $LOOP_DEV"
-    
-    # Wait for partitions to appear
-    sleep 2
-    
+    echo "Loop device: $LOOP_DEV" >&2
+    wait_for_partitions "$LOOP_DEV"
+
     # Mount partitions
     sudo mkdir -p "$MOUNT_POINT/boot"
     sudo mkdir -p "$MOUNT_POINT/root"
-    
+
     # Mount boot partition (usually partition 1)
     sudo mount "${LOOP_DEV}p1" "$MOUNT_POINT/boot"
-    
+
     # Mount root partition (usually partition 2)
     sudo mount "${LOOP_DEV}p2" "$MOUNT_POINT/root"
-    
+
     echo "$LOOP_DEV"
 }
 
@@ -66,23 +119,236 @@ mount_image() {
 unmount_image() {
     local MOUNT_POINT="$1"
     local LOOP_DEV="$2"
-    
+
+    # Discard free blocks: the loop device punches holes in the image file,
+    # so they are left out of the bmap and compress to nothing
+    sudo fstrim "$MOUNT_POINT/boot" 2>/dev/null || true
+    sudo fstrim "$MOUNT_POINT/root" 2>/dev/null || true
+
     sudo umount "$MOUNT_POINT/boot" || true
     sudo umount "$MOUNT_POINT/root" || true
     sudo losetup -d "$LOOP_DEV" || true
-    
+
     # Clean up mount points
     sudo rm -rf "$MOUNT_POINT"
 }
 
+# Files shared by every Pi, written straight into the common root filesystem
+write_common_files() {
+    local ROOT="$1"
+
+    echo "  - Writing system configuration..."
+    sudo mkdir -p "$ROOT/etc/chrony" "$ROOT/etc/containers/systemd" "$ROOT/etc/security/limits.d" \
+        "$ROOT/etc/sysctl.d" "$ROOT/usr/local/bin"
+
+    # Chrony configuration with NTS (CLAUDE.md requirement)
+    sudo tee "$ROOT/etc/chrony/chrony.conf" > /dev/null << EOF
+# NTS time sources as per CLAUDE.md golden rule
+server time.cloudflare.com iburst nts
+server time.nist.gov iburst
+
+# Fallback servers
+pool ntp.ubuntu.com iburst
+
+makestep 0.1 3
+rtcsync
+
+# Allow NTP client access from local network
+allow $SUBNET
+
+# Record drift
+driftfile /var/lib/chrony/chrony.drift
+EOF
+
+    # Podman configuration
+    sudo tee "$ROOT/etc/containers/containers.conf" > /dev/null << 'EOF'
+[containers]
+log_driver = "journald"
+log_size_max = 10485760
+
+[engine]
+runtime = "crun"
+events_logger = "journald"
+cgroup_manager = "systemd"
+EOF
+
+    # System limits for containers
+    sudo tee "$ROOT/etc/security/limits.d/containers.conf" > /dev/null << 'EOF'
+* soft nofile 1048576
+* hard nofile 1048576
+root soft nofile 1048576
+root hard nofile 1048576
+EOF
+
+    # Sysctl tuning for containers
+    sudo tee "$ROOT/etc/sysctl.d/99-containers.conf" > /dev/null << 'EOF'
+net.ipv4.ip_forward = 1
+net.bridge.bridge-nf-call-iptables = 1
+net.bridge.bridge-nf-call-ip6tables = 1
+fs.inotify.max_user_instances = 8192
+fs.inotify.max_user_watches = 524288
+vm.max_map_count = 262144
+EOF
+
+    # Container systemd directory creation script
+    sudo tee "$ROOT/usr/local/bin/setup-container-dirs.sh" > /dev/null << 'EOF'
+#!/bin/bash
+# Setup container directories for pi user
+mkdir -p /home/pi/.config/containers/systemd
+mkdir -p /home/pi/.config/systemd/user
+mkdir -p /home/pi/volumes
+mkdir -p /home/pi/backup
+mkdir -p /etc/containers/systemd
+chown -R pi:pi /home/pi/.config
+chown -R pi:pi /home/pi/volumes
+chown -R pi:pi /home/pi/backup
+
+# Enable lingering for pi user
+loginctl enable-linger pi
+
+# Create quadlet directories
+mkdir -p /etc/containers/systemd
+mkdir -p /home/pi/.config/containers/systemd
+EOF
+
+    # Health check script
+    sudo tee "$ROOT/usr/local/bin/health-check.sh" > /dev/null << 'EOF'
+#!/bin/bash
+echo "=== System Health Check ==="
+echo "Hostname: $(hostname)"
+echo "IP: $(hostname -I | cut -d' ' -f1)"
+echo "CPU: $(nproc) cores"
+echo "RAM: $(free -h | grep Mem | awk '{print $2}')"
+echo "Disk: $(df -h / | tail -1 | awk '{print $4}') free"
+echo "Load: $(uptime | awk -F'load average:' '{print $2}')"
+echo "Time sync: $(chronyc tracking | grep 'System time' | cut -d: -f2-)"
+echo "Containers: $(sudo podman ps --format '{{.Names}}' | wc -l) running"
+EOF
+
+    # Auto-update script for containers
+    sudo tee "$ROOT/usr/local/bin/update-containers.sh" > /dev/null << 'EOF'
+#!/bin/bash
+# Manual container update script
+echo "Checking for container updates..."
+sudo podman auto-update --dry-run
+echo "To apply updates, run: sudo podman auto-update"
+EOF
+    sudo chmod 0755 "$ROOT/usr/local/bin/setup-container-dirs.sh" "$ROOT/usr/local/bin/health-check.sh" \
+        "$ROOT/usr/local/bin/update-containers.sh"
+
+    # Homelab cluster addresses
+    {
+        echo ""
+        echo "# Homelab cluster"
+        jq -r '.static_leases[] | "\(.ip) \(.hostname)"' "$CONFIG_FILE"
+    } | sudo tee -a "$ROOT/etc/hosts" > /dev/null
+}
+
+# True when arm64 binaries can run on this host
+can_run_arm64() {
+    [ "$(uname -m)" == "aarch64" ] || [ -e /proc/sys/fs/binfmt_misc/qemu-aarch64 ]
+}
+
+# Install COMMON_PACKAGES into the common layer through a chroot
+install_common_packages() {
+    local ROOT="$1"
+
+    echo "  - Installing ${#COMMON_PACKAGES[@]} packages in chroot..."
+    for fs in dev proc sys; do
+        sudo mount --bind "/$fs" "$ROOT/$fs"
+    done
+    sudo cp --remove-destination /etc/resolv.conf "$ROOT/etc/resolv.conf"
+    # Do not start services inside the chroot
+    printf '#!/bin/sh\nexit 101\n' | sudo tee "$ROOT/usr/sbin/policy-rc.d" > /dev/null
+    sudo chmod 0755 "$ROOT/usr/sbin/policy-rc.d"
+
+    local status=0
+    sudo chroot "$ROOT" /bin/bash -c \
+        "export DEBIAN_FRONTEND=noninteractive; apt-get update -q && \
+         apt-get install -y -q --no-install-recommends ${COMMON_PACKAGES[*]} && apt-get clean" || status=$?
+
+    sudo rm -f "$ROOT/usr/sbin/policy-rc.d"
+    sudo ln -sf ../run/systemd/resolve/stub-resolv.conf "$ROOT/etc/resolv.conf"
+    for fs in sys proc dev; do
+        sudo umount "$ROOT/$fs" || true
+    done
+    return $status
+}
+
+# Cache key of the common layer: everything that goes into it
+common_layer_key() {
+    {
+        echo "$BASE_IMAGE_FILE"
+        echo "${COMMON_PACKAGES[*]}"
+        can_run_arm64 && echo "packages-baked"
+        declare -f write_common_files install_common_packages
+        jq -c '{network, static_leases: [.static_leases[] | {hostname, ip}]}' "$CONFIG_FILE"
+    } | sha256sum | cut -c1-16
+}
+
+# Build the common layer once; later builds reuse it until its inputs change
+build_common_layer() {
+    COMMON_IMAGE="$CACHE_DIR/common-$(common_layer_key).img"
+
+    if [ -f "$COMMON_IMAGE" ]; then
+        echo -e "${GREEN}✓ Using cached common layer $(basename "$COMMON_IMAGE")${NC}"
+        return 0
+    fi
+
+    echo -e "${YELLOW}Building common layer...${NC}"
+    local TMP_IMAGE="$COMMON_IMAGE.partial"
+    copy_image "$WORK_DIR/$BASE_IMAGE_FILE" "$TMP_IMAGE"
+
+    if can_run_arm64; then
+        # Room for the packages; cloud-init grows the root partition to the card on first boot
+        truncate -s "+$COMMON_IMAGE_GROW" "$TMP_IMAGE"
+        sudo parted -s "$TMP_IMAGE" resizepart 2 100%
+    fi
+
+    local MOUNT_POINT="$WORK_DIR/mount_common"
+    local LOOP_DEV
+    LOOP_DEV=$(mount_image "$TMP_IMAGE" "$MOUNT_POINT")
+
+    if can_run_arm64; then
+        sudo resize2fs "${LOOP_DEV}p2" > /dev/null 2>&1 || true
+    fi
+    # Subshell with set -e so any failed step stops it; `f || status=$?`
+    # would disable set -e inside f and cache a half-written layer
+    local status=0
+    set +e
+    (
+        set -e
+        write_common_files "$MOUNT_POINT/root"
+        if can_run_arm64; then
+            install_common_packages "$MOUNT_POINT/root"
+        else
+            echo -e "  ${YELLOW}⚠ Cannot run arm64 binaries here (install qemu-user-static); packages are left to cloud-init${NC}"
+        fi
+    )
+    status=$?
+    set -e
+    unmount_image "$MOUNT_POINT" "$LOOP_DEV"
+
+    if [ $status -ne 0 ]; then
+        rm -f "$TMP_IMAGE"
+        echo -e "${RED}✗ Common layer build failed${NC}"
+        return 1
+    fi
+
+    # Only one common layer is kept
+    rm -f "$CACHE_DIR"/common-*.img
+    mv "$TMP_IMAGE" "$COMMON_IMAGE"
+    echo -e "${GREEN}✓ Common layer cached: $(basename "$COMMON_IMAGE")${NC}"
+}
+
 # Function to customize image for specific Pi
 customize_image() {
     local PI_NAME="$1"
     local PI_IP="$2"
     local MOUNT_POINT="$3"
-    
+
     echo -e "${YELLOW}Customizing image for $PI_NAME ($PI_IP)...${NC}"
-    
+
     # Copy our configurations and software
     echo "  - Setting up network configuration..."
     sudo tee "$MOUNT_POINT/boot/network-config" > /dev/null << EOF
@@ -91,14 +357,20 @@ ethernets:
   eth0:
     dhcp4: false
     addresses:
-      - $PI_IP/24
-    gateway4: 10.0.1.1
+      - $PI_IP/$PREFIX
+    routes:
+      - to: default
+        via: $GATEWAY
     nameservers:
-      addresses:
-        - 1.1.1.1
-        - 8.8.8.8
+      addresses: [$(echo "$DNS_SERVERS" | sed 's/ /, /g')]
 EOF
-    
+
+    # Packages are already in the common layer when it could be built with a chroot
+    local PACKAGES=""
+    if ! can_run_arm64; then
+        PACKAGES="packages:"$'\n'"$(printf '  - %s\n' "${COMMON_PACKAGES[@]}")"
+    fi
+
     # Create cloud-init user-data
     echo "  - Creating cloud-init configuration..."
     sudo tee "$MOUNT_POINT/boot/user-data" > /dev/null << EOF
@@ -127,129 +399,10 @@ disable_root: true
 # Package installation
 package_update: true
 package_upgrade: true
-packages:
-  - python3
-  - python3-pip
-  - podman
-  - podman-compose
-  - curl
-  - wget
-  - git
-  - vim
-  - htop
-  - chrony
-  - ufw
-  - prometheus-node-exporter
-  - fail2ban
-  - unattended-upgrades
-  - jq
-  - net-tools
-  - dnsutils
-  - iotop
-  - ncdu
-  - tree
-  - tmux
-  - rsync
-  - nmap
-  - tcpdump
-
-# Write files
-write_files:
-  # Chrony configuration with NTS (CLAUDE.md requirement)
-  - path: /etc/chrony/chrony.conf
-    content: |
-      # NTS time sources as per CLAUDE.md golden rule
-      server time.cloudflare.com iburst nts
-      server time.nist.gov iburst
-      
-      # Fallback servers
-      pool ntp.ubuntu.com iburst
-      
-      makestep 0.1 3
-      rtcsync
-      
-      # Allow NTP client access from local network
-      allow 10.0.1.0/24
-      
-      # Record drift
-      driftfile /var/lib/chrony/chrony.drift
-    
-  # Podman configuration
-  - path: /etc/containers/containers.conf
-    content: |
-      [containers]
-      log_driver = "journald"
-      log_size_max = 10485760
-      
-      [engine]
-      runtime = "crun"
-      events_logger = "journald"
-      cgroup_manager = "systemd"
-  
-  # System limits for containers
-  - path: /etc/security/limits.d/containers.conf
-    content: |
-      * soft nofile 1048576
-      * hard nofile 1048576
-      root soft nofile 1048576
-      root hard nofile 1048576
-  
-  # Sysctl tuning for containers
-  - path: /etc/sysctl.d/99-containers.conf
-    content: |
-      net.ipv4.ip_forward = 1
-      net.bridge.bridge-nf-call-iptables = 1
-      net.bridge.bridge-nf-call-ip6tables = 1
-      fs.inotify.max_user_instances = 8192
-      fs.inotify.max_user_watches = 524288
-      vm.max_map_count = 262144
-  
-  # Container systemd directory creation script
-  - path: /usr/local/bin/setup-container-dirs.sh
-    permissions: '0755'
-    content: |
-      #!/bin/bash
-      # Setup container directories for pi user
-      mkdir -p /home/pi/.config/containers/systemd
-      mkdir -p /home/pi/.config/systemd/user
-      mkdir -p /home/pi/volumes
-      mkdir -p /home/pi/backup
-      mkdir -p /etc/containers/systemd
-      chown -R pi:pi /home/pi/.config
-      chown -R pi:pi /home/pi/volumes
-      chown -R pi:pi /home/pi/backup
-      
-      # Enable lingering for pi user
-      loginctl enable-linger pi
-      
-      # Create quadlet directories
-      mkdir -p /etc/containers/systemd
-      mkdir -p /home/pi/.config/containers/systemd
-  
-  # Health check script
-  - path: /usr/local/bin/health-check.sh
-    permissions: '0755'
-    content: |
-      #!/bin/bash
-      echo "=== System Health Check ==="
-      echo "Hostname: \$(hostname)"
-      echo "IP: \$(hostname -I | cut -d' ' -f1)"
-      echo "CPU: \$(nproc) cores"
-      echo "RAM: \$(free -h | grep Mem | awk '{print \$2}')"
-      echo "Disk: \$(df -h / | tail -1 | awk '{print \$4}') free"
-      echo "Load: \$(uptime | awk -F'load average:' '{print \$2}')"
-      echo "Time sync: \$(chronyc tracking | grep 'System time' | cut -d: -f2-)"
-      echo "Containers: \$(sudo podman ps --format '{{.Names}}' | wc -l) running"
-  
-  # Auto-update script for containers
-  - path: /usr/local/bin/update-containers.sh
-    permissions: '0755'
-    content: |
-      #!/bin/bash
-      # Manual container update script
-      echo "Checking for container updates..."
-      sudo podman auto-update --dry-run
-      echo "To apply updates, run: sudo podman auto-update"
+$PACKAGES
+
+# System configuration (chrony, podman, limits, sysctl, helper scripts) is
+# part of the image's common layer
 
 # Firewall rules
 runcmd:
@@ -261,34 +414,34 @@ runcmd:
   - ufw allow 80/tcp comment 'HTTP'
   - ufw allow 443/tcp comment 'HTTPS'
   - ufw allow 9100/tcp comment 'Node Exporter'
-  - ufw allow 9090/tcp comment 'Prometheus' 
+  - ufw allow 9090/tcp comment 'Prometheus'
   - ufw allow 3000/tcp comment 'Grafana'
   - ufw allow 3100/tcp comment 'Loki'
   - ufw reload
-  
+
   # Configure fail2ban
   - systemctl enable fail2ban
   - systemctl start fail2ban
-  
+
   # Enable services
   - systemctl enable chrony
   - systemctl restart chrony
   - systemctl enable podman.socket
   - systemctl start podman.socket
-  
+
   # Run setup script
   - /usr/local/bin/setup-container-dirs.sh
-  
+
   # Create systemd service for container auto-start
   - systemctl daemon-reload
   - systemctl enable podman-restart.service || true
-  
+
   # Set up unattended upgrades
   - dpkg-reconfigure -plow unattended-upgrades
-  
+
   # System optimization
   - sysctl -p /etc/sysctl.d/99-containers.conf
-  
+
   # Log completion
   - echo "Cloud-init setup completed at \$(date)" >> /var/log/cloud-init-complete.log
 
@@ -304,98 +457,133 @@ EOF
     if [ "$PI_NAME" == "pi-a" ]; then
         echo "  - Copying monitoring stack Quadlet files..."
         sudo mkdir -p "$MOUNT_POINT/root/etc/containers/systemd"
-        
+
         # Copy our Quadlet definitions
         for quadlet in ../quadlet/{prometheus,grafana,loki,node-exporter,promtail}.container; do
             if [ -f "$quadlet" ]; then
                 sudo cp "$quadlet" "$MOUNT_POINT/root/etc/containers/systemd/"
             fi
         done
-        
+
         # Copy configurations
         sudo mkdir -p "$MOUNT_POINT/root/etc/prometheus"
         sudo mkdir -p "$MOUNT_POINT/root/etc/grafana/provisioning"
         sudo mkdir -p "$MOUNT_POINT/root/etc/loki"
-        
+
         # Copy config files if they exist
         [ -f "../ansible/roles/prometheus/templates/prometheus.yml.j2" ] && \
             sudo cp "../ansible/roles/prometheus/templates/prometheus.yml.j2" "$MOUNT_POINT/root/etc/prometheus/prometheus.yml"
         [ -f "../ansible/roles/grafana/templates/datasources.yml.j2" ] && \
             sudo cp "../ansible/roles/grafana/templates/datasources.yml.j2" "$MOUNT_POINT/root/etc/grafana/provisioning/datasources.yml"
     fi
-    
+
     # Copy Caddy configuration if this is the ingress node
     if [ "$PI_NAME" == "pi-b" ]; then
+        local MONITORING_IP
+        MONITORING_IP=$(pi_ip pi-a)
         echo "  - Copying Caddy configuration..."
         sudo mkdir -p "$MOUNT_POINT/root/etc/containers/systemd"
         [ -f "../quadlet/caddy.container" ] && \
             sudo cp "../quadlet/caddy.container" "$MOUNT_POINT/root/etc/containers/systemd/"
-        
+
         sudo mkdir -p "$MOUNT_POINT/root/etc/caddy"
         # Create basic Caddyfile
-        sudo tee "$MOUNT_POINT/root/etc/caddy/Caddyfile" > /dev/null << 'CADDY'
+        sudo tee "$MOUNT_POINT/root/etc/caddy/Caddyfile" > /dev/null << CADDY
 :80 {
     respond "Homelab Ingress Ready"
 }
 
 :3000 {
-    reverse_proxy 10.0.1.10:3000
+    reverse_proxy $MONITORING_IP:3000
 }
 
 :9090 {
-    reverse_proxy 10.0.1.10:9090
+    reverse_proxy $MONITORING_IP:9090
 }
 
 :3100 {
-    reverse_proxy 10.0.1.10:3100
+    reverse_proxy $MONITORING_IP:3100
 }
 CADDY
     fi
-    
+
     # Set hostname in the actual system
     echo "$PI_NAME" | sudo tee "$MOUNT_POINT/root/etc/hostname" > /dev/null
-    
-    # Update hosts file
-    sudo tee -a "$MOUNT_POINT/root/etc/hosts" > /dev/null << EOF
-
-# Homelab cluster
-10.0.1.10 pi-a
-10.0.1.11 pi-b
-10.0.1.12 pi-c
-10.0.1.13 pi-d
-EOF
 
     echo -e "  ${GREEN}✓ Customization complete for $PI_NAME${NC}"
 }
 
-# Function to create custom image
+# Function to create custom image from the common layer
 create_custom_image() {
     local PI_NAME="$1"
     local PI_IP="$2"
-    
+    local THREADS="$3"
+
     echo -e "${YELLOW}Creating image for $PI_NAME...${NC}"
-    
-    # Copy base image
-    cp "$WORK_DIR/$BASE_IMAGE_FILE" "$WORK_DIR/${PI_NAME}.img"
-    
+
+    # Copy the common layer (reflink/sparse, so this is cheap)
+    copy_image "$COMMON_IMAGE" "$WORK_DIR/${PI_NAME}.img"
+
     # Mount the image
-    MOUNT_POINT="$WORK_DIR/mount_${PI_NAME}"
+    local MOUNT_POINT="$WORK_DIR/mount_${PI_NAME}"
+    local LOOP_DEV
     LOOP_DEV=$(mount_image "$WORK_DIR/${PI_NAME}.img" "$MOUNT_POINT")
-    
-    # Customize the image
-    customize_image "$PI_NAME" "$PI_IP" "$MOUNT_POINT"
-    
+
+    # Customize the image (in a set -e subshell, see build_common_layer)
+    local status=0
+    set +e
+    (set -e; customize_image "$PI_NAME" "$PI_IP" "$MOUNT_POINT")
+    status=$?
+    set -e
+
     # Unmount the image
     unmount_image "$MOUNT_POINT" "$LOOP_DEV"
-    
+    [ $status -eq 0 ] || return $status
+
+    # Map the blocks in use (with checksums) before compressing
+    echo -e "${YELLOW}Creating block map...${NC}"
+    bmaptool create -o "$WORK_DIR/${PI_NAME}.img.bmap" "$WORK_DIR/${PI_NAME}.img"
+
     # Compress the final image
     echo -e "${YELLOW}Compressing image...${NC}"
-    xz -9 -T0 "$WORK_DIR/${PI_NAME}.img"
-    
+    zstd -q -f --rm -"$ZSTD_LEVEL" -T"$THREADS" "$WORK_DIR/${PI_NAME}.img" -o "$WORK_DIR/${PI_NAME}.img.zst"
+
     # Move to output directory
-    mv "$WORK_DIR/${PI_NAME}.img.xz" "$OUTPUT_DIR/"
-    
-    echo -e "${GREEN}✓ Image created: $OUTPUT_DIR/${PI_NAME}.img.xz${NC}"
+    mv "$WORK_DIR/${PI_NAME}.img.zst" "$WORK_DIR/${PI_NAME}.img.bmap" "$OUTPUT_DIR/"
+
+    echo -e "${GREEN}✓ Image created: $OUTPUT_DIR/${PI_NAME}.img.zst ($(du -h "$OUTPUT_DIR/${PI_NAME}.img.zst" | cut -f1))${NC}"
+}
+
+# Build the per-Pi images in parallel, one log per Pi
+build_images() {
+    local pis=("$@")
+    local threads=$(( $(nproc) / ${#pis[@]} ))
+    [ $threads -ge 1 ] || threads=1
+
+    declare -A pids
+    for pi in "${pis[@]}"; do
+        local ip
+        ip=$(pi_ip "$pi")
+        if [ -z "$ip" ] || [ "$ip" == "null" ]; then
+            echo -e "${RED}Error: $pi is not in $CONFIG_FILE${NC}"
+            return 1
+        fi
+        create_custom_image "$pi" "$ip" "$threads" > "$WORK_DIR/${pi}.log" 2>&1 &
+        pids[$pi]=$!
+        echo "  - $pi ($ip): building, log $WORK_DIR/${pi}.log"
+    done
+
+    local failed=0
+    for pi in "${pis[@]}"; do
+        if wait "${pids[$pi]}"; then
+            echo -e "  ${GREEN}✓ $pi${NC}"
+        else
+            echo -e "  ${RED}✗ $pi failed:${NC}"
+            tail -n 15 "$WORK_DIR/${pi}.log" | sed 's/^/      /'
+            failed=1
+        fi
+    done
+    return $failed
 }
 
 # Main execution
@@ -406,30 +594,46 @@ main() {
         echo "The script will use sudo when needed."
         exit 1
     fi
-    
+
     # Check for required tools
-    for tool in wget xz losetup sudo mkfs.ext4; do
+    for tool in wget xz zstd bmaptool losetup sudo jq parted partx fstrim; do
         if ! command -v $tool &> /dev/null; then
             echo -e "${RED}Error: $tool is not installed${NC}"
-            echo "Install with: sudo apt install wget xz-utils mount util-linux e2fsprogs"
+            echo "Install with: sudo apt install wget xz-utils zstd bmap-tools mount util-linux jq parted"
             exit 1
         fi
     done
-    
+
+    local pis=("$@")
+    if [ ${#pis[@]} -eq 0 ]; then
+        mapfile -t pis < <(jq -r '.static_leases | keys[]' "$CONFIG_FILE")
+    fi
+
+    # The parallel builds run sudo in background jobs that cannot answer a
+    # password prompt: authenticate now and keep the timestamp fresh
+    sudo -v
+    while kill -0 $$ 2>/dev/null && sudo -n true 2>/dev/null; do sleep 60; done &
+    local sudo_keepalive=$!
+    trap "kill $sudo_keepalive 2>/dev/null || true" EXIT
+
     # Download base image
     download_base_image
-    
-    # Create custom images for each Pi
+
+    # Shared layer, then the per-Pi deltas in parallel
+    build_common_layer
     echo -e "${YELLOW}Building custom images...${NC}"
-    create_custom_image "pi-a" "10.0.1.10"
-    create_custom_image "pi-b" "10.0.1.11"
-    create_custom_image "pi-c" "10.0.1.12"
-    create_custom_image "pi-d" "10.0.1.13"
-    
+    if ! build_images "${pis[@]}"; then
+        echo -e "${RED}✗ Image build failed, see the logs in $WORK_DIR${NC}"
+        exit 1
+    fi
+
     # Create flash script
     cat > "$OUTPUT_DIR/flash-to-sdcard.sh" << 'FLASH'
 #!/bin/bash
 # Script to flash custom images to SD cards
+# Writes only the blocks listed in <pi>.img.bmap and verifies their checksums
+
+set -euo pipefail
 
 if [ $# -ne 2 ]; then
     echo "Usage: $0 <pi-name> <device>"
@@ -439,7 +643,13 @@ fi
 
 PI_NAME=$1
 DEVICE=$2
-IMAGE_FILE="${PI_NAME}.img.xz"
+IMAGE_FILE="${PI_NAME}.img.zst"
+BMAP_FILE="${PI_NAME}.img.bmap"
+
+# Images from build-custom-image-dhcp.sh are still xz-compressed
+if [ ! -f "$IMAGE_FILE" ] && [ -f "${PI_NAME}.img.xz" ]; then
+    IMAGE_FILE="${PI_NAME}.img.xz"
+fi
 
 if [ ! -f "$IMAGE_FILE" ]; then
     echo "Error: Image file $IMAGE_FILE not found"
@@ -461,8 +671,23 @@ if [ "$CONFIRM" != "yes" ]; then
     exit 1
 fi
 
+# Unmount any partitions of the card that the desktop auto-mounted
+sudo umount "${DEVICE}"?* 2>/dev/null || true
+
 echo "Flashing image to $DEVICE..."
-xzcat "$IMAGE_FILE" | sudo dd of="$DEVICE" bs=4M status=progress conv=fsync
+if [ -f "$BMAP_FILE" ] && command -v bmaptool &> /dev/null; then
+    # Skips unused blocks and checks the SHA256 of every mapped range
+    sudo bmaptool copy --bmap "$BMAP_FILE" "$IMAGE_FILE" "$DEVICE"
+else
+    # Write every block, zeros included: a reused card must not keep stale
+    # partition tables or filesystem metadata where the image is zero
+    echo "⚠️  bmaptool or $BMAP_FILE not available: writing the whole image without verification"
+    echo "   Install with: sudo apt install bmap-tools"
+    case "$IMAGE_FILE" in
+        *.zst) zstdcat "$IMAGE_FILE" | sudo dd of="$DEVICE" bs=4M status=progress conv=fsync ;;
+        *.xz) xzcat "$IMAGE_FILE" | sudo dd of="$DEVICE" bs=4M status=progress conv=fsync ;;
+    esac
+fi
 
 echo "Syncing..."
 sync
@@ -470,18 +695,17 @@ sync
 echo "✓ Flash complete! You can now safely remove the SD card."
 echo "Label this SD card: $PI_NAME"
 FLASH
-    
+
     chmod +x "$OUTPUT_DIR/flash-to-sdcard.sh"
-    
+
     echo -e "${GREEN}========================================${NC}"
     echo -e "${GREEN}✓ All images created successfully!${NC}"
     echo -e "${GREEN}========================================${NC}"
     echo ""
     echo "Images created in: $OUTPUT_DIR/"
-    echo "  - pi-a.img.xz (Monitoring stack)"
-    echo "  - pi-b.img.xz (Ingress/Caddy)"
-    echo "  - pi-c.img.xz (Worker)"
-    echo "  - pi-d.img.xz (Worker/Backup)"
+    for pi in "${pis[@]}"; do
+        echo "  - ${pi}.img.zst + ${pi}.img.bmap ($(jq -r --arg pi "$pi" '.static_leases[$pi].role' "$CONFIG_FILE"), $(pi_ip "$pi"))"
+    done
     echo ""
     echo "To flash to SD card:"
     echo "  cd $OUTPUT_DIR"
@@ -492,15 +716,15 @@ FLASH
     echo "2. Label each SD card clearly"
     echo "3. Insert into Raspberry Pis and power on"
     echo "4. Wait 5-10 minutes for initial setup"
-    echo "5. SSH to each Pi: ssh pi@10.0.1.10 (etc)"
+    echo "5. SSH to each Pi: ssh pi@$(pi_ip "${pis[0]}") (etc)"
     echo "6. Run health check: ssh pi@pi-a '/usr/local/bin/health-check.sh'"
-    
+
     # Clean up work directory
     echo -e "${YELLOW}Cleaning up temporary files...${NC}"
     sudo rm -rf "$WORK_DIR/mount_"*
-    
+
     echo -e "${GREEN}✓ Build complete!${NC}"
 }
 
 # Run main function
-main "$@"
\ No newline at end of file
+main "$@"
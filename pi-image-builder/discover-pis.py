@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Raspberry Pi Network Discovery
+==============================
+
+Finds the cluster Pis on the LAN and updates the Ansible inventory. All
+probes run at the same time instead of one host and one method after another:
+
+- mDNS: one multicast query for every <name>.local in static-dhcp-config.json
+- TCP/22 sweep of the configured subnet (asyncio, a few hundred connects in
+  flight), reading each SSH banner
+- ARP cache (/proc/net/arp), read after the sweep so it holds the MAC of every
+  host that answered; Raspberry Pi OUIs mark Pis
+- DHCP leases of a local dnsmasq or ISC dhcpd, if present
+- SSH host key (ssh-keyscan) of every SSH host, and `hostname` over SSH with
+  the cluster key
+
+A host is named by, in order: its hostname over SSH, its mDNS name, a host key
+or MAC seen for that name in a previous run (discovered-pis.json), the MAC of
+its static lease, or its DHCP lease. A reflashed Pi with a new address is
+therefore still recognised by its MAC.
+
+The inventory is updated in place (only the ansible_host lines of the Pis
+change, comments are kept) through a temporary file and an atomic rename.
+
+Usage:
+    python3 discover-pis.py
+    python3 discover-pis.py --dry-run --no-ssh
+    python3 discover-pis.py --subnet 192.168.1.0/24 --timeout 0.3
+
+Requirements:
+    None (standard library only); ssh and ssh-keyscan for host fingerprints
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(SCRIPT_DIR, 'static-dhcp-config.json')
+DEFAULT_INVENTORY = os.path.join(SCRIPT_DIR, '..', 'ansible', 'inventories', 'prod', 'hosts.yml')
+DEFAULT_STATE = os.path.join(SCRIPT_DIR, 'discovered-pis.json')
+
+MDNS_GROUP = ('224.0.0.251', 5353)
+
+# Raspberry Pi Foundation / Raspberry Pi Trading OUIs
+PI_OUIS = {'b8:27:eb', 'dc:a6:32', 'e4:5f:01', 'd8:3a:dd', '2c:cf:67', '28:cd:c1'}
+
+LEASE_FILES = {
+    'dnsmasq': '/var/lib/misc/dnsmasq.leases',
+    'dhcpd': '/var/lib/dhcp/dhcpd.leases',
+}
+
+
+def encode_name(name):
+    return b''.join(bytes([len(label)]) + label.encode() for label in name.rstrip('.').split('.')) + b'\0'
+
+
+def read_name(packet, offset):
+    """Decode a (possibly compressed) DNS name; returns (name, offset after it)"""
+    labels, end, jumps = [], None, 0
+    while True:
+        length = packet[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | packet[offset + 1]
+            jumps += 1
+            if jumps > 20:
+                raise ValueError('compression loop')
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(packet[offset:offset + length].decode(errors='replace'))
+        offset += length
+    return '.'.join(labels).lower(), end if end is not None else offset
+
+
+def parse_a_records(packet):
+    """(name, ipv4) pairs from the answer and additional sections of a DNS response"""
+    _, flags, qdcount, ancount, nscount, arcount = struct.unpack('!6H', packet[:12])
+    if not flags & 0x8000:
+        return []
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = read_name(packet, offset)
+        offset += 4
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        name, offset = read_name(packet, offset)
+        rtype, _, _, rdlength = struct.unpack('!HHIH', packet[offset:offset + 10])
+        offset += 10
+        if rtype == 1 and rdlength == 4:
+            records.append((name, socket.inet_ntoa(packet[offset:offset + 4])))
+        offset += rdlength
+    return records
+
+
+class MdnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, names):
+        self.names = names
+        self.found = {}
+
+    def datagram_received(self, data, addr):
+        try:
+            records = parse_a_records(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        for name, ip in records:
+            short = name[:-len('.local')] if name.endswith('.local') else name
+            if short in self.names:
+                self.found.setdefault(short, ip)
+
+
+async def mdns_lookup(names, wait):
+    """Ask for all <name>.local A records in one query and collect answers for `wait` seconds"""
+    loop = asyncio.get_running_loop()
+    query = struct.pack('!6H', random.randint(0, 0xFFFF), 0, len(names), 0, 0, 0)
+    for name in names:
+        # QU bit: ask for unicast replies to our ephemeral port
+        query += encode_name(f"{name}.local") + struct.pack('!HH', 1, 0x8001)
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(lambda: MdnsProtocol(set(names)),
+                                                                  local_addr=('0.0.0.0', 0))
+    except OSError:
+        return {}
+    try:
+        transport.sendto(query, MDNS_GROUP)
+        await asyncio.sleep(wait / 2)
+        # Second query for hosts that missed the first
+        transport.sendto(query, MDNS_GROUP)
+        await asyncio.sleep(wait / 2)
+    except OSError:
+        pass
+    finally:
+        transport.close()
+    return protocol.found
+
+
+async def probe_ssh(ip, timeout, semaphore):
+    """SSH banner of ip:22, or None if closed"""
+    async with semaphore:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, 22), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        try:
+            banner = await asyncio.wait_for(reader.readline(), timeout * 2)
+            return banner.decode(errors='replace').strip() or 'SSH'
+        except (OSError, asyncio.TimeoutError):
+            return 'SSH'
+        finally:
+            writer.close()
+
+
+async def sweep(subnet, timeout, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    hosts = [str(ip) for ip in ipaddress.ip_network(subnet, strict=False).hosts()]
+    banners = await asyncio.gather(*(probe_ssh(ip, timeout, semaphore) for ip in hosts))
+    return {ip: banner for ip, banner in zip(hosts, banners) if banner}
+
+
+def read_arp_cache():
+    """ip -> MAC from the kernel ARP table"""
+    entries = {}
+    try:
+        with open('/proc/net/arp') as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4 and fields[3] != '00:00:00:00:00:00':
+                    entries[fields[0]] = fields[3].lower()
+    except (OSError, StopIteration):
+        pass
+    return entries
+
+
+def read_dhcp_leases(names):
+    """ip -> hostname from local DHCP server leases, for the cluster names only"""
+    leases = {}
+    try:
+        with open(LEASE_FILES['dnsmasq']) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 4 and fields[3] in names:
+                    leases[fields[2]] = fields[3]
+    except OSError:
+        pass
+    try:
+        with open(LEASE_FILES['dhcpd']) as f:
+            ip = None
+            for line in f:
+                match = re.match(r'lease (\S+) \{', line)
+                if match:
+                    ip = match.group(1)
+                match = re.search(r'client-hostname "([^"]+)"', line)
+                if match and ip and match.group(1) in names:
+                    leases[ip] = match.group(1)
+    except OSError:
+        pass
+    return leases
+
+
+def fingerprint(key_b64):
+    """OpenSSH SHA256 fingerprint of a base64 public key blob"""
+    digest = hashlib.sha256(base64.b64decode(key_b64)).digest()
+    return 'SHA256:' + base64.b64encode(digest).decode().rstrip('=')
+
+
+async def keyscan(ips, timeout):
+    """ip -> ed25519 host key fingerprint, from one ssh-keyscan run"""
+    if not ips or not shutil.which('ssh-keyscan'):
+        return {}
+    process = await asyncio.create_subprocess_exec(
+        'ssh-keyscan', '-T', str(max(int(timeout * 4), 1)), '-t', 'ed25519', *ips,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    output, _ = await process.communicate()
+    keys = {}
+    for line in output.decode(errors='replace').splitlines():
+        fields = line.split()
+        if len(fields) >= 3 and not line.startswith('#'):
+            try:
+                keys[fields[0]] = fingerprint(fields[2])
+            except (ValueError, TypeError):
+                continue
+    return keys
+
+
+async def ssh_hostname(ip, user, key, timeout):
+    if not shutil.which('ssh'):
+        return None
+    command = ['ssh', '-o', 'BatchMode=yes', '-o', f"ConnectTimeout={max(int(timeout * 4), 1)}",
+               '-o', 'StrictHostKeyChecking=no', '-o', 'UserKnownHostsFile=/dev/null', '-o', 'LogLevel=ERROR']
+    if key and os.path.exists(os.path.expanduser(key)):
+        command += ['-i', os.path.expanduser(key)]
+    process = await asyncio.create_subprocess_exec(*command, f"{user}@{ip}", 'hostname -s',
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.DEVNULL)
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), timeout * 4 + 3)
+    except asyncio.TimeoutError:
+        process.kill()
+        return None
+    return output.decode(errors='replace').strip().lower() if process.returncode == 0 else None
+
+
+class PiDiscovery:
+    """Runs the probes and works out which address belongs to which Pi"""
+
+    def __init__(self, config, previous, args):
+        self.leases = config.get('static_leases', {})
+        self.names = sorted(self.leases)
+        self.subnet = args.subnet or config.get('network', {}).get('subnet', '192.168.1.0/24')
+        self.previous = {entry['hostname']: entry for entry in previous if entry.get('hostname')}
+        self.args = args
+        self.hosts = {}
+
+    def _host(self, ip):
+        return self.hosts.setdefault(ip, {'ip': ip, 'methods': [], 'names': {}})
+
+    def _name(self, ip, name, method):
+        host = self._host(ip)
+        host['names'].setdefault(method, name)
+        if method not in host['methods']:
+            host['methods'].append(method)
+
+    async def run(self):
+        start = time.perf_counter()
+        mdns, ssh_hosts = await asyncio.gather(
+            mdns_lookup(self.names, self.args.mdns_wait),
+            sweep(self.subnet, self.args.timeout, self.args.concurrency),
+        )
+        for name, ip in mdns.items():
+            self._name(ip, name, 'mdns')
+        for ip, banner in ssh_hosts.items():
+            host = self._host(ip)
+            host['ssh_banner'] = banner
+            host['methods'].append('ssh')
+        for ip, name in read_dhcp_leases(set(self.names)).items():
+            self._name(ip, name, 'dhcp')
+        for ip, mac in read_arp_cache().items():
+            if ip in self.hosts or mac[:8] in PI_OUIS:
+                host = self._host(ip)
+                host['mac'] = mac
+                host['raspberry_pi'] = mac[:8] in PI_OUIS
+                if 'arp' not in host['methods']:
+                    host['methods'].append('arp')
+
+        ssh_ips = sorted(ip for ip, host in self.hosts.items() if 'ssh_banner' in host)
+        tasks = [keyscan(ssh_ips, self.args.timeout)]
+        if not self.args.no_ssh:
+            tasks += [ssh_hostname(ip, self.args.ssh_user, self.args.ssh_key, self.args.timeout) for ip in ssh_ips]
+        results = await asyncio.gather(*tasks)
+        for ip, key in results[0].items():
+            self._host(ip)['host_key'] = key
+        for ip, name in zip(ssh_ips, results[1:]):
+            if name in self.leases:
+                self._name(ip, name, 'ssh-hostname')
+
+        self.elapsed = time.perf_counter() - start
+        return self.assign()
+
+    def assign(self):
+        """name -> host record; strongest evidence wins, each name and address used once"""
+        by_mac = {}
+        for name, lease in self.leases.items():
+            if re.match(r'^([0-9a-f]{2}:){5}[0-9a-f]{2}$', str(lease.get('mac', '')).lower()):
+                by_mac[lease['mac'].lower()] = (name, 'static-lease')
+        for name, entry in self.previous.items():
+            if entry.get('mac'):
+                by_mac.setdefault(entry['mac'], (name, 'previous-mac'))
+        by_key = {entry['host_key']: name for name, entry in self.previous.items() if entry.get('host_key')}
+
+        candidates = []
+        for ip, host in self.hosts.items():
+            for rank, method in enumerate(('ssh-hostname', 'mdns')):
+                if method in host['names']:
+                    candidates.append((rank, host['names'][method], ip, method))
+            if host.get('host_key') in by_key:
+                candidates.append((2, by_key[host['host_key']], ip, 'host-key'))
+            if host.get('mac') in by_mac:
+                name, method = by_mac[host['mac']]
+                candidates.append((3, name, ip, method))
+            if 'dhcp' in host['names']:
+                candidates.append((4, host['names']['dhcp'], ip, 'dhcp'))
+
+        assigned, used = {}, set()
+        for rank, name, ip, method in sorted(candidates):
+            if name in assigned or ip in used:
+                continue
+            assigned[name] = dict(self.hosts[ip], hostname=name, identified_by=method)
+            used.add(ip)
+        self.unassigned = [host for ip, host in sorted(self.hosts.items(), key=lambda item: socket.inet_aton(item[0]))
+                           if ip not in used and host.get('raspberry_pi')]
+        return assigned
+
+
+def update_inventory(path, addresses):
+    """Rewrite the ansible_host lines of the given hosts; returns {name: (old, new)}"""
+    with open(path) as f:
+        lines = f.readlines()
+
+    changes = {}
+    current, indent = None, None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        line_indent = len(line) - len(line.lstrip())
+        if current and line_indent <= indent:
+            current = None
+        match = re.match(r'^(\s*)([\w.-]+):\s*$', line)
+        if match and match.group(2) in addresses and current is None:
+            current, indent = match.group(2), len(match.group(1))
+            continue
+        if current:
+            field = re.match(r'^(\s*ansible_host:\s*)(\S+)(.*)$', line.rstrip('\n'))
+            if field:
+                old = field.group(2).strip('"\'')
+                new = addresses[current]
+                if old != new:
+                    lines[i] = f"{field.group(1)}{new}{field.group(3)}\n"
+                    changes[current] = (old, new)
+
+    if changes:
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.hosts.', suffix='.yml')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(lines)
+            shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            os.unlink(tmp)
+            raise
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the cluster Pis on the network and update the inventory')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='static-dhcp-config.json with subnet and Pi names')
+    parser.add_argument('--inventory', default=DEFAULT_INVENTORY, help='Ansible inventory to update')
+    parser.add_argument('--state', default=DEFAULT_STATE, help='Discovery results, also used to recognise Pis next time')
+    parser.add_argument('--subnet', help='Subnet to sweep (default: from the config)')
+    parser.add_argument('--timeout', type=float, default=0.5, help='TCP connect timeout per address')
+    parser.add_argument('--concurrency', type=int, default=256, help='Connects in flight')
+    parser.add_argument('--mdns-wait', type=float, default=1.0, help='Seconds to collect mDNS answers')
+    parser.add_argument('--ssh-user', default='pi', help='User for the hostname check')
+    parser.add_argument('--ssh-key', default=os.environ.get('SSH_KEY', '~/.ssh/pi_ed25519'), help='Key for the hostname check')
+    parser.add_argument('--no-ssh', action='store_true', help='Do not log in to read hostnames')
+    parser.add_argument('--dry-run', action='store_true', help='Report only; do not write the inventory or state')
+
+    args = parser.parse_args()
+
+    try:
+        with open(args.config) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ Cannot read {args.config}: {e}")
+        sys.exit(1)
+    try:
+        with open(args.state) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = []
+
+    discovery = PiDiscovery(config, previous, args)
+    print("🔍 Raspberry Pi Network Discovery")
+    print("=" * 50)
+    print(f"  Subnet {discovery.subnet}, looking for {', '.join(discovery.names)}")
+
+    assigned = asyncio.run(discovery.run())
+
+    print("")
+    for name in discovery.names:
+        host = assigned.get(name)
+        if host:
+            details = ', '.join(filter(None, [host.get('mac'), host.get('host_key', '')[:20]]))
+            print(f"  ✅ {name:6} {host['ip']:15} via {host['identified_by']:13} {details}")
+        else:
+            print(f"  ❌ {name:6} not found")
+    for host in discovery.unassigned:
+        print(f"  ❓ unknown Pi at {host['ip']} ({host.get('mac')}); not identified by name")
+    print("")
+    print(f"⏱️  {len(discovery.hosts)} hosts probed in {discovery.elapsed:.1f}s")
+
+    if args.dry_run or not assigned:
+        sys.exit(0 if assigned else 1)
+
+    state = [{key: host.get(key) for key in ('hostname', 'ip', 'mac', 'host_key', 'ssh_banner', 'identified_by',
+                                              'methods')} for host in assigned.values()]
+    with open(args.state, 'w') as f:
+        json.dump(state, f, indent=2)
+
+    try:
+        changes = update_inventory(args.inventory, {name: host['ip'] for name, host in assigned.items()})
+    except OSError as e:
+        print(f"❌ Cannot update {args.inventory}: {e}")
+        sys.exit(1)
+    for name, (old, new) in sorted(changes.items()):
+        print(f"📝 {name}: ansible_host {old} → {new}")
+    if not changes:
+        print("✅ Inventory already up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -59,7 +59,7 @@ fi
 
 # Create copy for pi-a
 echo -e "\n${YELLOW}Creating Pi-a image...${NC}"
-cp "$BASE_IMAGE_FILE" "pi-a.img"
+cp --sparse=always "$BASE_IMAGE_FILE" "pi-a.img"
 
 # Mount the image to customize
 echo -e "${YELLOW}Mounting image for customization...${NC}"
@@ -201,6 +201,9 @@ echo -e "${GREEN}✓ Cloud-init configured${NC}"
 
 # Unmount
 echo -e "\n${YELLOW}Unmounting image...${NC}"
+# Discard free blocks so they are left out of the block map
+sudo fstrim "$MOUNT_BOOT" 2>/dev/null || true
+sudo fstrim "$MOUNT_ROOT" 2>/dev/null || true
 sudo umount "$MOUNT_BOOT"
 sudo umount "$MOUNT_ROOT"
 sudo losetup -d "$LOOP_DEV"
@@ -218,7 +221,14 @@ sudo umount ${SD_DEVICE}* 2>/dev/null || true
 echo -e "${YELLOW}Writing image to $SD_DEVICE...${NC}"
 echo "This will take several minutes..."
 
-sudo dd if=pi-a.img of="$SD_DEVICE" bs=4M status=progress conv=fsync
+if command -v bmaptool &> /dev/null; then
+    # Write only the blocks in use and verify their checksums
+    bmaptool create -o pi-a.img.bmap pi-a.img
+    sudo bmaptool copy --bmap pi-a.img.bmap pi-a.img "$SD_DEVICE"
+else
+    echo -e "${YELLOW}bmaptool not found (sudo apt install bmap-tools), writing the whole image without verification${NC}"
+    sudo dd if=pi-a.img of="$SD_DEVICE" bs=4M status=progress conv=fsync
+fi
 
 echo -e "\n${GREEN}✓ Image written successfully${NC}"
 
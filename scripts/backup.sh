@@ -15,14 +15,44 @@ YELLOW='\033[1;33m'
 RED='\033[0;31m'
 NC='\033[0m' # No Color
 
-# Create backup directory
-mkdir -p "${BACKUP_PATH}"
+# Options
+#   --prometheus-mode full|incremental   Prometheus backup mode (default: incremental)
+#   --restore-prometheus MANIFEST        Restore Prometheus blocks listed in an
+#                                        incremental manifest instead of backing up
+#   --restore-target DIR                 Where to restore blocks (default: ./prometheus-restore)
+RESTORE_MANIFEST=""
+RESTORE_TARGET="./prometheus-restore"
+while [[ $# -gt 0 ]]; do
+    case $1 in
+        --prometheus-mode)
+            PROMETHEUS_BACKUP_MODE="$2"
+            shift 2
+            ;;
+        --restore-prometheus)
+            RESTORE_MANIFEST="$2"
+            shift 2
+            ;;
+        --restore-target)
+            RESTORE_TARGET="$2"
+            shift 2
+            ;;
+        *)
+            echo -e "${RED}Unknown option: $1${NC}"
+            exit 1
+            ;;
+    esac
+done
 
-echo "==========================================="
-echo "   Homelab Infrastructure Backup"
-echo "   Timestamp: ${TIMESTAMP}"
-echo "==========================================="
-echo ""
+if [[ -z "${RESTORE_MANIFEST}" ]]; then
+    # Create backup directory
+    mkdir -p "${BACKUP_PATH}"
+
+    echo "==========================================="
+    echo "   Homelab Infrastructure Backup"
+    echo "   Timestamp: ${TIMESTAMP}"
+    echo "==========================================="
+    echo ""
+fi
 
 # Function to backup VM configuration
 backup_vm() {
@@ -69,14 +99,32 @@ backup_vm() {
     echo -e "  ${GREEN}✓ ${vm} backup complete${NC}"
 }
 
-# Function to backup Prometheus data
-backup_prometheus_data() {
-    echo -e "${YELLOW}Backing up Prometheus data...${NC}"
+# Prometheus backup mode: "incremental" keeps a shared store of immutable
+# TSDB blocks and only transfers blocks not seen before; "full" copies the
+# whole snapshot into every backup
+PROMETHEUS_BACKUP_MODE="${PROMETHEUS_BACKUP_MODE:-incremental}"
+PROMETHEUS_BLOCK_STORE="${PROMETHEUS_BLOCK_STORE:-${BACKUP_DIR}/prometheus-blocks}"
+PROMETHEUS_MANIFEST_RETENTION_DAYS="${PROMETHEUS_MANIFEST_RETENTION_DAYS:-30}"
+
+# Create a Prometheus snapshot and print its name (empty on failure)
+create_prometheus_snapshot() {
+    curl -s -X POST http://localhost:9090/api/v1/admin/tsdb/snapshot | \
+        jq -r '.data.name // empty' 2>/dev/null || true
+}
+
+# Remove a snapshot directory once it has been copied
+remove_prometheus_snapshot() {
+    local snapshot="$1"
+    ssh vm-a "sudo podman exec prometheus rm -rf /prometheus/snapshots/${snapshot}" 2>/dev/null || true
+}
+
+# Function to backup Prometheus data (full snapshot copy)
+backup_prometheus_full() {
+    echo -e "${YELLOW}Backing up Prometheus data (full)...${NC}"
     
     # Create a snapshot in Prometheus
     echo "  - Creating Prometheus snapshot..."
-    curl -s -X POST http://localhost:9090/api/v1/admin/tsdb/snapshot > /tmp/snapshot.json
-    SNAPSHOT_NAME=$(jq -r '.data.name' /tmp/snapshot.json 2>/dev/null || echo "")
+    SNAPSHOT_NAME=$(create_prometheus_snapshot)
     
     if [[ -n "${SNAPSHOT_NAME}" ]]; then
         # Copy snapshot from container
@@ -84,9 +132,10 @@ backup_prometheus_data() {
         ssh vm-a "sudo podman cp prometheus:/tmp/prometheus-snapshot.tar.gz /tmp/" 2>/dev/null || true
         scp vm-a:/tmp/prometheus-snapshot.tar.gz "${BACKUP_PATH}/prometheus-snapshot.tar.gz" 2>/dev/null || true
         ssh vm-a 'rm /tmp/prometheus-snapshot.tar.gz' 2>/dev/null || true
+        ssh vm-a "sudo podman exec prometheus rm -f /tmp/prometheus-snapshot.tar.gz" 2>/dev/null || true
         
         # Clean up snapshot
-        curl -s -X POST "http://localhost:9090/api/v1/admin/tsdb/delete_series?match[]={__name__=~\".*\"}" > /dev/null 2>&1 || true
+        remove_prometheus_snapshot "${SNAPSHOT_NAME}"
         
         echo -e "  ${GREEN}✓ Prometheus data backed up${NC}"
     else
@@ -94,6 +143,175 @@ backup_prometheus_data() {
     fi
 }
 
+# Check that a block archive is complete: it decompresses and lists the
+# block's meta.json
+verify_block_archive() {
+    local archive="$1"
+    local block="$2"
+    
+    [[ -s "${archive}" ]] || return 1
+    case "${archive}" in
+        *.tar.zst.partial)
+            zstd -q -t "${archive}" 2>/dev/null || return 1
+            zstd -q -dc "${archive}" | tar tf - 2>/dev/null | grep -x "${block}/meta.json" >/dev/null
+            ;;
+        *)
+            gzip -t "${archive}" 2>/dev/null || return 1
+            tar tzf "${archive}" 2>/dev/null | grep -x "${block}/meta.json" >/dev/null
+            ;;
+    esac
+}
+
+# Function to backup Prometheus data (incremental, block store + manifest)
+backup_prometheus_incremental() {
+    echo -e "${YELLOW}Backing up Prometheus data (incremental)...${NC}"
+    
+    local manifest_dir="${PROMETHEUS_BLOCK_STORE}/manifests"
+    mkdir -p "${PROMETHEUS_BLOCK_STORE}/blocks" "${manifest_dir}"
+    
+    echo "  - Creating Prometheus snapshot..."
+    local snapshot
+    snapshot=$(create_prometheus_snapshot)
+    if [[ -z "${snapshot}" ]]; then
+        echo -e "  ${YELLOW}⚠ Could not create Prometheus snapshot${NC}"
+        return 0
+    fi
+    
+    # TSDB blocks are immutable and named by ULID, so a block already in the
+    # store never needs to be copied again
+    local blocks
+    blocks=$(ssh vm-a "sudo podman exec prometheus ls -1 /prometheus/snapshots/${snapshot}" 2>/dev/null | \
+        grep -E '^[0-9A-HJKMNP-TV-Z]{26}$' || true)
+    if [[ -z "${blocks}" ]]; then
+        echo -e "  ${YELLOW}⚠ Snapshot ${snapshot} contains no blocks${NC}"
+        remove_prometheus_snapshot "${snapshot}"
+        return 0
+    fi
+    
+    # Compress on vm-a when it has zstd so only compressed bytes cross the network
+    local remote_compress="" ext="tar.zst"
+    if ssh vm-a 'command -v zstd' &>/dev/null; then
+        remote_compress="| zstd -q -T0 -c"
+    elif ! command -v zstd &>/dev/null; then
+        ext="tar.gz"
+    fi
+    
+    local new_count=0 reused_count=0 new_bytes=0 block file
+    for block in ${blocks}; do
+        file=$(find "${PROMETHEUS_BLOCK_STORE}/blocks" -maxdepth 1 -name "${block}.tar.*" -print -quit)
+        if [[ -n "${file}" ]]; then
+            reused_count=$((reused_count + 1))
+            continue
+        fi
+        
+        file="${PROMETHEUS_BLOCK_STORE}/blocks/${block}.${ext}"
+        echo "  - Streaming new block ${block}..."
+        # A block that is moved into place is never fetched again, so a
+        # failed or truncated transfer must not get that far
+        local status=0
+        if [[ -n "${remote_compress}" ]]; then
+            ssh vm-a "bash -o pipefail -c 'sudo podman exec prometheus tar cf - -C /prometheus/snapshots/${snapshot} ${block} ${remote_compress}'" \
+                > "${file}.partial" || status=$?
+        elif [[ "${ext}" == "tar.zst" ]]; then
+            ssh vm-a "sudo podman exec prometheus tar cf - -C /prometheus/snapshots/${snapshot} ${block}" | \
+                zstd -q -T0 -c > "${file}.partial" || status=$?
+        else
+            ssh vm-a "sudo podman exec prometheus tar cf - -C /prometheus/snapshots/${snapshot} ${block}" | \
+                gzip -c > "${file}.partial" || status=$?
+        fi
+        if [[ ${status} -ne 0 ]] || ! verify_block_archive "${file}.partial" "${block}"; then
+            rm -f "${file}.partial"
+            remove_prometheus_snapshot "${snapshot}"
+            echo -e "  ${RED}✗ Transfer of block ${block} failed (exit ${status}); backup aborted${NC}"
+            exit 1
+        fi
+        mv "${file}.partial" "${file}"
+        new_count=$((new_count + 1))
+        new_bytes=$((new_bytes + $(stat -c %s "${file}")))
+    done
+    
+    remove_prometheus_snapshot "${snapshot}"
+    
+    # The manifest lists every block of this snapshot, which is all that is
+    # needed to restore Prometheus to this point in time
+    local manifest="${manifest_dir}/${TIMESTAMP}.json"
+    printf '%s\n' ${blocks} | while read -r block; do
+        file=$(find "${PROMETHEUS_BLOCK_STORE}/blocks" -maxdepth 1 -name "${block}.tar.*" -printf '%f\n' -quit)
+        jq -n --arg ulid "${block}" --arg file "blocks/${file}" \
+            --argjson size "$(stat -c %s "${PROMETHEUS_BLOCK_STORE}/blocks/${file}")" \
+            '{ulid: $ulid, file: $file, size: $size}'
+    done | jq -s --arg timestamp "${TIMESTAMP}" --arg date "$(date -Iseconds)" --arg snapshot "${snapshot}" \
+        '{timestamp: $timestamp, date: $date, snapshot: $snapshot, blocks: .}' > "${manifest}"
+    cp "${manifest}" "${BACKUP_PATH}/prometheus-manifest.json"
+    
+    echo -e "  ${GREEN}✓ Prometheus data backed up: ${new_count} new block(s) ($(numfmt --to=iec ${new_bytes})), ${reused_count} already stored${NC}"
+}
+
+# Drop manifests past retention and any block no remaining manifest references
+prune_prometheus_blocks() {
+    local manifest_dir="${PROMETHEUS_BLOCK_STORE}/manifests"
+    [[ -d "${manifest_dir}" ]] || return 0
+    
+    find "${manifest_dir}" -name "*.json" -mtime "+${PROMETHEUS_MANIFEST_RETENTION_DAYS}" -delete 2>/dev/null || true
+    
+    local referenced
+    referenced=$(cat "${manifest_dir}"/*.json 2>/dev/null | jq -r '.blocks[].file' | sort -u || true)
+    local file removed=0
+    for file in "${PROMETHEUS_BLOCK_STORE}"/blocks/*.tar.*; do
+        [[ -e "${file}" ]] || continue
+        if ! grep -qxF "blocks/$(basename "${file}")" <<< "${referenced}"; then
+            rm -f "${file}"
+            removed=$((removed + 1))
+        fi
+    done
+    echo "  - Pruned ${removed} unreferenced Prometheus block(s)"
+}
+
+# Rebuild a Prometheus data directory from an incremental backup manifest
+restore_prometheus() {
+    local manifest="$1"
+    local target="$2"
+    
+    if [[ ! -f "${manifest}" ]]; then
+        manifest="${PROMETHEUS_BLOCK_STORE}/manifests/${manifest%.json}.json"
+    fi
+    if [[ ! -f "${manifest}" ]]; then
+        echo -e "${RED}Manifest not found: $1${NC}"
+        echo "Available manifests:"
+        ls -1 "${PROMETHEUS_BLOCK_STORE}/manifests" 2>/dev/null || echo "  none"
+        exit 1
+    fi
+    
+    mkdir -p "${target}"
+    echo -e "${YELLOW}Restoring Prometheus blocks from $(basename "${manifest}") into ${target}...${NC}"
+    
+    local file
+    jq -r '.blocks[].file' "${manifest}" | while read -r file; do
+        echo "  - ${file}"
+        case "${file}" in
+            *.tar.zst) zstd -q -dc "${PROMETHEUS_BLOCK_STORE}/${file}" | tar xf - -C "${target}" ;;
+            *.tar.gz) tar xzf "${PROMETHEUS_BLOCK_STORE}/${file}" -C "${target}" ;;
+        esac
+    done
+    
+    echo -e "${GREEN}✓ Restored $(jq '.blocks | length' "${manifest}") block(s)${NC}"
+    echo "Stop Prometheus, replace the contents of its prometheus-data volume with ${target}, then start it again."
+}
+
+backup_prometheus_data() {
+    case "${PROMETHEUS_BACKUP_MODE}" in
+        full)
+            backup_prometheus_full
+            ;;
+        incremental)
+            backup_prometheus_incremental
+            ;;
+        *)
+            echo -e "  ${RED}Unknown PROMETHEUS_BACKUP_MODE: ${PROMETHEUS_BACKUP_MODE} (use full or incremental)${NC}"
+            ;;
+    esac
+}
+
 # Function to backup Loki data
 backup_loki_data() {
     echo -e "${YELLOW}Backing up Loki data...${NC}"
@@ -121,6 +339,12 @@ backup_ansible() {
     echo -e "  ${GREEN}✓ Ansible configuration backed up${NC}"
 }
 
+# Restore mode: rebuild a Prometheus data directory and stop
+if [[ -n "${RESTORE_MANIFEST}" ]]; then
+    restore_prometheus "${RESTORE_MANIFEST}" "${RESTORE_TARGET}"
+    exit 0
+fi
+
 # Main backup process
 echo "Starting backup process..."
 echo ""
@@ -176,6 +400,7 @@ echo ""
 # Cleanup old backups (keep last 7 days)
 echo "Cleaning up old backups..."
 find "${BACKUP_DIR}" -name "backup-*.tar.gz" -mtime +7 -delete 2>/dev/null || true
+prune_prometheus_blocks
 
 # List current backups
 echo "Current backups:"
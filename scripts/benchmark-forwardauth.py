@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+ForwardAuth Latency Benchmark
+=============================
+
+Measures ForwardAuth decision latency straight against the Authentik outpost
+and through forwardauth-cache.py, replaying the request pattern Traefik
+produces when a dashboard loads (many concurrent requests, one session).
+
+Usage:
+    # Against the real outpost and a deployed cache (session cookie from a browser)
+    python3 benchmark-forwardauth.py --direct http://192.168.1.13:9002 --cached http://127.0.0.1:9003 \\
+        --cookie 'authentik_proxy_abc=...' --host grafana.homelab.grenlan.com
+
+    # Self-contained run against a simulated outpost with 40 ms decisions
+    python3 benchmark-forwardauth.py --mock-upstream-latency 40
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import concurrent.futures
+import http.client
+import http.server
+import importlib.util
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AUTH_PATH = '/outpost.goauthentik.io/auth/traefik'
+
+
+def load_cache_module():
+    """Import forwardauth-cache.py (hyphenated, so not importable by name)"""
+    spec = importlib.util.spec_from_file_location('forwardauth_cache', os.path.join(SCRIPT_DIR, 'forwardauth-cache.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_mock_outpost(latency):
+    """Simulated outpost that approves every request after a fixed delay"""
+    class MockOutpost(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('X-authentik-username', 'benchmark')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockOutpost)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_cache(upstream, ttl):
+    module = load_cache_module()
+    server = module.ForwardAuthCacheServer(('127.0.0.1', 0), upstream, ttl, 1024, 'authentik_proxy_', 5)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class Worker:
+    """Keep-alive client, one per benchmark thread (like Traefik's transport)"""
+
+    def __init__(self, base_url, headers):
+        parsed = urllib.parse.urlsplit(base_url)
+        cls = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.conn = cls(parsed.netloc, timeout=10)
+        self.headers = headers
+
+    def request(self, uri):
+        headers = dict(self.headers, **{'X-Forwarded-Uri': uri})
+        start = time.perf_counter()
+        self.conn.request('GET', AUTH_PATH, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        return time.perf_counter() - start, response.status
+
+
+def run_benchmark(base_url, headers, requests, concurrency):
+    """Fire `requests` ForwardAuth calls with `concurrency` clients; returns latencies in ms"""
+    local = threading.local()
+    statuses = {}
+
+    def one(i):
+        if not hasattr(local, 'worker'):
+            local.worker = Worker(base_url, headers)
+        seconds, status = local.worker.request(f"/api/ds/query?panel={i}")
+        statuses[status] = statuses.get(status, 0) + 1
+        return seconds * 1000
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed, statuses
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed, statuses):
+    row = {
+        'name': name,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies),
+        'rps': len(latencies) / elapsed,
+    }
+    status_text = ', '.join(f"{code}×{count}" for code, count in sorted(statuses.items()))
+    print(f"  {name:10} p50={row['p50']:7.2f}ms  p95={row['p95']:7.2f}ms  p99={row['p99']:7.2f}ms  "
+          f"mean={row['mean']:7.2f}ms  {row['rps']:8.1f} req/s  [{status_text}]")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ForwardAuth latency with and without the decision cache')
+    parser.add_argument('--direct', help='Authentik outpost base URL')
+    parser.add_argument('--cached', help='forwardauth-cache base URL')
+    parser.add_argument('--cookie', default='authentik_proxy_benchmark=session', help='Cookie header to send')
+    parser.add_argument('--host', default='grafana.homelab.grenlan.com', help='X-Forwarded-Host to send')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per target')
+    parser.add_argument('--concurrency', type=int, default=10, help='Concurrent clients')
+    parser.add_argument('--ttl', type=float, default=30, help='Cache TTL for the in-process cache')
+    parser.add_argument('--mock-upstream-latency', type=float, metavar='MS',
+                        help='Start a simulated outpost with this decision latency and an in-process cache')
+
+    args = parser.parse_args()
+
+    if args.mock_upstream_latency is not None:
+        args.direct = start_mock_outpost(args.mock_upstream_latency / 1000)
+        args.cached = start_cache(args.direct, args.ttl)
+    elif not args.direct or not args.cached:
+        parser.error('--direct and --cached are required unless --mock-upstream-latency is given')
+
+    headers = {
+        'Cookie': args.cookie,
+        'X-Forwarded-Host': args.host,
+        'X-Forwarded-Proto': 'https',
+        'X-Forwarded-Method': 'GET',
+    }
+
+    print("⏱️  ForwardAuth Latency Benchmark")
+    print("=" * 50)
+    print(f"  {args.requests} requests, {args.concurrency} concurrent clients, host {args.host}")
+    print("")
+
+    try:
+        direct = summarize('direct', *run_benchmark(args.direct, headers, args.requests, args.concurrency))
+        cached = summarize('cached', *run_benchmark(args.cached, headers, args.requests, args.concurrency))
+    except (OSError, http.client.HTTPException) as e:
+        print(f"❌ Benchmark failed: {e}")
+        sys.exit(1)
+
+    print("")
+    print(f"📊 p50 {direct['p50'] / cached['p50']:.1f}x faster, p99 {direct['p99'] / cached['p99']:.1f}x faster, "
+          f"throughput {cached['rps'] / direct['rps']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Ingress Compression and Caching Benchmark
+=========================================
+
+Loads a page through Traefik the way a browser does (HTML first, then its
+scripts, stylesheets, fonts and images over a few parallel keep-alive
+connections) and reports bytes on the wire and load time for:
+
+- identity:  no compression (Accept-Encoding: identity)
+- compressed: Accept-Encoding: br, gzip, as sent by phone browsers
+- repeat:    compressed second visit; assets with Cache-Control max-age are
+             served from the simulated browser cache, the rest revalidated
+
+Because the Tailscale/Cloudflare path to a phone is much slower than the LAN,
+each result also shows an estimated load time on a constrained link
+(--link-mbps, --rtt-ms).
+
+Save a run before enabling a performance profile and compare after:
+
+Usage:
+    python3 benchmark-ingress-compression.py https://grafana.homelab.grenlan.com/login --save before.json
+    python3 benchmark-ingress-compression.py https://grafana.homelab.grenlan.com/login --compare before.json
+
+    # Pages behind Authentik need a session cookie from the browser
+    python3 benchmark-ingress-compression.py https://grafana.homelab.grenlan.com/ --cookie 'authentik_proxy_abc=...'
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import concurrent.futures
+import html.parser
+import http.client
+import json
+import math
+import re
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+
+
+ENCODINGS = {
+    'identity': 'identity',
+    'compressed': 'br, gzip',
+}
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class AssetParser(html.parser.HTMLParser):
+    """Collect the sub-resources a browser would fetch for first paint"""
+
+    LINK_RELS = {'stylesheet', 'preload', 'modulepreload', 'icon', 'shortcut icon', 'manifest'}
+
+    def __init__(self):
+        super().__init__()
+        self.assets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'script' and attrs.get('src'):
+            self.assets.append(attrs['src'])
+        elif tag == 'link' and attrs.get('href') and (attrs.get('rel') or '').lower() in self.LINK_RELS:
+            self.assets.append(attrs['href'])
+        elif tag == 'img' and attrs.get('src') and not attrs['src'].startswith('data:'):
+            self.assets.append(attrs['src'])
+
+
+class Client:
+    """One keep-alive connection per thread, like a browser's connection pool"""
+
+    def __init__(self, base_url, headers, insecure=False, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.netloc = parsed.netloc
+        self.https = parsed.scheme == 'https'
+        self.headers = headers
+        self.timeout = timeout
+        self.context = ssl._create_unverified_context() if insecure else ssl.create_default_context()
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            if self.https:
+                conn = http.client.HTTPSConnection(self.netloc, timeout=self.timeout, context=self.context)
+            else:
+                conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def get(self, path, encoding, extra_headers=None):
+        """Fetch path; returns (status, headers, raw body) without decoding the content encoding"""
+        headers = dict(self.headers, **{'Accept-Encoding': encoding}, **(extra_headers or {}))
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                return response.status, {k.lower(): v for k, v in response.getheaders()}, body
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+
+
+def cache_lifetime(headers):
+    """Seconds a browser may reuse the response without revalidating"""
+    cache_control = headers.get('cache-control', '')
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0
+    match = MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else 0
+
+
+def discover_assets(client, url, same_origin_only=True):
+    """Fetch the page uncompressed once and return its same-origin asset paths"""
+    parsed = urllib.parse.urlsplit(url)
+    path = parsed.path or '/'
+    if parsed.query:
+        path += f"?{parsed.query}"
+    status, _, body = client.get(path, 'identity')
+    if status != 200:
+        raise RuntimeError(f"{url} returned HTTP {status}")
+    parser = AssetParser()
+    parser.feed(body.decode('utf-8', errors='replace'))
+
+    assets = []
+    for ref in parser.assets:
+        absolute = urllib.parse.urlsplit(urllib.parse.urljoin(url, ref))
+        if same_origin_only and absolute.netloc != parsed.netloc:
+            continue
+        asset_path = absolute.path + (f"?{absolute.query}" if absolute.query else '')
+        if asset_path not in assets:
+            assets.append(asset_path)
+    return path, assets
+
+
+def load_page(client, page, assets, encoding, concurrency, cache=None):
+    """Simulate one page load; `cache` maps path -> (lifetime, validators) from a previous visit"""
+    results = []
+
+    def fetch(path):
+        extra = {}
+        if cache is not None and path in cache:
+            lifetime, etag, last_modified = cache[path]
+            if lifetime > 0:
+                return {'path': path, 'status': 'cached', 'bytes': 0, 'encoding': '', 'seconds': 0.0,
+                        'lifetime': lifetime, 'etag': etag, 'last_modified': last_modified}
+            if etag:
+                extra['If-None-Match'] = etag
+            if last_modified:
+                extra['If-Modified-Since'] = last_modified
+        start = time.perf_counter()
+        status, headers, body = client.get(path, encoding, extra)
+        return {
+            'path': path,
+            'status': status,
+            'bytes': len(body),
+            'encoding': headers.get('content-encoding', ''),
+            'seconds': time.perf_counter() - start,
+            'lifetime': cache_lifetime(headers),
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+        }
+
+    start = time.perf_counter()
+    results.append(fetch(page))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results += list(executor.map(fetch, assets))
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(name, results, elapsed, concurrency, link_mbps, rtt_ms):
+    transferred = sum(r['bytes'] for r in results)
+    requests = sum(1 for r in results if r['status'] != 'cached')
+    compressed = sum(1 for r in results if r['encoding'])
+    cached = sum(1 for r in results if r['status'] == 'cached')
+    not_modified = sum(1 for r in results if r['status'] == 304)
+    # HTML round trip, then assets in waves of `concurrency`, plus serialisation on the link
+    waves = 1 + math.ceil(max(requests - 1, 0) / concurrency)
+    estimate = waves * rtt_ms / 1000 + transferred * 8 / (link_mbps * 1_000_000)
+    row = {
+        'name': name,
+        'bytes': transferred,
+        'requests': requests,
+        'compressed': compressed,
+        'cached': cached,
+        'not_modified': not_modified,
+        'seconds': elapsed,
+        'estimate': estimate,
+    }
+    print(f"  {name:11} {transferred / 1024:9.1f} KiB  {requests:3d} req  {compressed:3d} compressed  "
+          f"{cached:3d} cached  {not_modified:3d} 304  LAN {elapsed * 1000:7.1f}ms  "
+          f"link {estimate * 1000:7.0f}ms")
+    return row
+
+
+def print_largest(results, top):
+    print("")
+    print(f"📦 Largest uncompressed responses (top {top})")
+    for r in sorted(results, key=lambda r: r['bytes'], reverse=True)[:top]:
+        hint = '' if r['lifetime'] else '  ⚠️  no max-age'
+        print(f"  {r['bytes'] / 1024:9.1f} KiB  {r['path'][:70]}{hint}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bytes transferred and load time with compression and caching')
+    parser.add_argument('url', help='Page to load, e.g. https://grafana.homelab.grenlan.com/login')
+    parser.add_argument('--cookie', help='Cookie header (session cookie for pages behind Authentik)')
+    parser.add_argument('--concurrency', type=int, default=6, help='Parallel connections (browsers use 6)')
+    parser.add_argument('--runs', type=int, default=3, help='Loads per mode; the fastest is reported')
+    parser.add_argument('--link-mbps', type=float, default=5, help='Bandwidth of the simulated phone link')
+    parser.add_argument('--rtt-ms', type=float, default=80, help='Round-trip time of the simulated phone link')
+    parser.add_argument('--insecure', action='store_true', help='Skip TLS certificate verification')
+    parser.add_argument('--save', help='Write results to a JSON file')
+    parser.add_argument('--compare', help='Compare against results saved with --save')
+    parser.add_argument('--top', type=int, default=5, help='Largest responses to list')
+
+    args = parser.parse_args()
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Linux; Android 14) benchmark-ingress-compression',
+        'Accept': '*/*',
+    }
+    if args.cookie:
+        headers['Cookie'] = args.cookie
+    client = Client(args.url, headers, insecure=args.insecure)
+
+    try:
+        page, assets = discover_assets(client, args.url)
+    except (OSError, http.client.HTTPException, RuntimeError) as e:
+        print(f"❌ Cannot load {args.url}: {e}")
+        sys.exit(1)
+
+    print("📱 Ingress Compression and Caching Benchmark")
+    print("=" * 50)
+    print(f"  {args.url}: {len(assets)} assets, {args.concurrency} connections, "
+          f"link {args.link_mbps:g} Mbit/s / {args.rtt_ms:g}ms RTT")
+    print("")
+
+    rows = {}
+    try:
+        identity = None
+        for name, encoding in ENCODINGS.items():
+            best = None
+            for _ in range(args.runs):
+                results, elapsed = load_page(client, page, assets, encoding, args.concurrency)
+                if best is None or elapsed < best[1]:
+                    best = (results, elapsed)
+            rows[name] = summarize(name, *best, args.concurrency, args.link_mbps, args.rtt_ms)
+            if name == 'identity':
+                identity = best[0]
+            else:
+                compressed = best[0]
+
+        cache = {r['path']: (r['lifetime'], r['etag'], r['last_modified']) for r in compressed}
+        results, elapsed = load_page(client, page, assets, ENCODINGS['compressed'], args.concurrency, cache)
+        rows['repeat'] = summarize('repeat', results, elapsed, args.concurrency, args.link_mbps, args.rtt_ms)
+    except (OSError, http.client.HTTPException) as e:
+        print(f"❌ Benchmark failed: {e}")
+        sys.exit(1)
+
+    print_largest(identity, args.top)
+
+    saving = 1 - rows['compressed']['bytes'] / rows['identity']['bytes'] if rows['identity']['bytes'] else 0
+    print("")
+    print(f"📊 Compression saves {saving * 100:.0f}% of bytes; estimated phone load "
+          f"{rows['identity']['estimate'] * 1000:.0f}ms → {rows['compressed']['estimate'] * 1000:.0f}ms "
+          f"(repeat visit {rows['repeat']['estimate'] * 1000:.0f}ms)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)['rows']
+        print("")
+        print(f"🔁 Compared with {args.compare}")
+        for name in ('compressed', 'repeat'):
+            if name in before:
+                print(f"  {name:11} {before[name]['bytes'] / 1024:9.1f} → {rows[name]['bytes'] / 1024:9.1f} KiB  "
+                      f"link {before[name]['estimate'] * 1000:7.0f} → {rows[name]['estimate'] * 1000:7.0f}ms")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'url': args.url, 'timestamp': time.time(), 'rows': rows}, f, indent=2)
+        print(f"\n✅ Results saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+"""
+Parallel Playbook Runner
+========================
+
+Runs the numbered playbooks as a dependency graph (ansible/deploy-graph.yml)
+instead of one after another. A step starts as soon as every step it depends
+on has succeeded and none of its hosts is in use by a running step, so e.g.
+the ingress, Authentik and monitoring-stack playbooks run side by side on
+pi-b, pi-d and pi-a.
+
+Facts come from the persistent cache configured in ansible.cfg (jsonfile in
+ansible/.cache/facts, or Redis with --fact-cache redis), so with
+`gathering = smart` each host is only gathered once per cache timeout
+instead of once per playbook. --refresh-facts gathers all hosts in one
+ad-hoc run before the first step.
+
+With --changed only steps whose inputs changed since their last successful
+run are deployed, and only to the hosts affected: the playbook, its roles,
+referenced files, group_vars and inventory variables are hashed per host and
+compared with ansible/.cache/deploy-state.json. Every successful step updates
+that state, so a full run followed by --changed deploys runs nothing; --force
+ignores it. Runs in check mode (-- --check) do not update the state.
+
+Output of every step goes to logs/deploy/<timestamp>/<step>.log under the
+ansible directory; step durations are kept in .cache/deploy-timings.json
+and used by --dry-run to estimate the wall-clock time of a plan.
+
+Usage:
+    python3 deploy-playbooks.py                      # full graph
+    python3 deploy-playbooks.py ingress dashboards   # these steps and what they depend on
+    python3 deploy-playbooks.py --only dashboards         # just this step
+    python3 deploy-playbooks.py --dry-run
+    python3 deploy-playbooks.py --changed               # only what changed since the last deploy
+    python3 deploy-playbooks.py --fact-cache redis --fact-cache-connection 192.168.1.13:6379:1
+    python3 deploy-playbooks.py podman -- --diff --check   # extra ansible-playbook arguments
+
+Requirements:
+    ansible (PyYAML is installed with it); community.general for the Redis fact cache
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import yaml
+
+
+ANSIBLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ansible')
+DEFAULT_DURATION = 120.0
+
+# "{{ role_path }}/..." or "{{ playbook_dir }}/..." with a literal remainder
+TEMPLATED_PATH_RE = re.compile(r'^\{\{\s*(role_path|playbook_dir)\s*\}\}/([^{}]+)$')
+
+# Role directories whose YAML may reference files outside the role
+ROLE_VARS_DIRS = ('tasks', 'handlers', 'defaults', 'vars')
+
+
+def check_mode(args):
+    """Whether extra ansible-playbook arguments ask for a dry run (-C/--check)"""
+    return any(arg == '--check' or (arg.startswith('-') and not arg.startswith('--') and 'C' in arg)
+               for arg in args)
+
+
+class DeployGraph:
+    """Steps and their dependencies, loaded from deploy-graph.yml"""
+
+    def __init__(self, path):
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        self.steps = {}
+        for name, step in (data.get('steps') or {}).items():
+            self.steps[name] = {
+                'playbook': step['playbook'],
+                'limit': step.get('limit'),
+                'after': list(step.get('after') or []),
+                'inputs': list(step.get('inputs') or []),
+            }
+        for name, step in self.steps.items():
+            for dep in step['after']:
+                if dep not in self.steps:
+                    raise ValueError(f"step {name} depends on unknown step {dep}")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"dependency cycle: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            for dep in self.steps[name]['after']:
+                visit(dep, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.steps:
+            visit(name, [])
+        return order
+
+    def check_inputs(self, ansible_dir):
+        """Every `inputs` glob must match a file, or --changed would never see it change"""
+        for name, step in self.steps.items():
+            for pattern in step['inputs']:
+                if not glob.glob(os.path.join(ansible_dir, pattern), recursive=True):
+                    raise ValueError(f"step {name}: input {pattern} matches no files under {ansible_dir}")
+
+    def select(self, targets, only=False):
+        """Targets plus everything they depend on (unless only), in graph order"""
+        if not targets:
+            return list(self.order)
+        unknown = [t for t in targets if t not in self.steps]
+        if unknown:
+            raise ValueError(f"unknown step(s): {', '.join(unknown)}")
+        if only:
+            return [name for name in self.order if name in targets]
+        selected = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.steps[name]['after'])
+        return [name for name in self.order if name in selected]
+
+
+class AnsibleLoader(yaml.SafeLoader):
+    """SafeLoader that tolerates Ansible tags such as !vault"""
+
+
+AnsibleLoader.add_multi_constructor('!', lambda loader, suffix, node: None)
+
+
+def iter_strings(data):
+    """Every string value in a parsed YAML document"""
+    if isinstance(data, str):
+        yield data
+    elif isinstance(data, dict):
+        for value in data.values():
+            yield from iter_strings(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from iter_strings(value)
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ChangeDetector:
+    """Hashes what each step deploys, per host, and compares it with the last successful run
+
+    The inputs of a step are its playbook, every role it uses (all files of the
+    role, including role dependencies), static files the playbook references,
+    files referenced as {{ role_path }}/... or {{ playbook_dir }}/... anywhere
+    in the playbook or a role's tasks and variables (e.g. scripts and alert
+    rules outside the role), the step's `inputs` globs from the graph, the
+    group_vars of the host's groups and the host's inventory variables.
+    """
+
+    def __init__(self, graph, ansible_dir, env):
+        self.graph = graph
+        self.ansible_dir = ansible_dir
+        self.state_file = os.path.join(ansible_dir, '.cache', 'deploy-state.json')
+        try:
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+        result = subprocess.run(['ansible-inventory', '--list'], cwd=ansible_dir, env=env,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ansible-inventory failed: {result.stderr.strip()}")
+        self.inventory = json.loads(result.stdout)
+        self.file_hashes = {}
+        self.playbook_dir = ansible_dir
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.ansible_dir)
+
+    def _add_path(self, files, path):
+        """Add a file, or every file below a directory"""
+        if os.path.isfile(path):
+            files.add(self._relative(path))
+        elif os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+                for name in names:
+                    if not name.endswith('.pyc'):
+                        files.add(self._relative(os.path.join(root, name)))
+
+    def _templated_paths(self, data, role_dir, files):
+        """Add files named by {{ role_path }}/... and {{ playbook_dir }}/... strings"""
+        for value in iter_strings(data):
+            match = TEMPLATED_PATH_RE.match(value.strip())
+            if not match:
+                continue
+            base = role_dir if match.group(1) == 'role_path' else self.playbook_dir
+            if base:
+                self._add_path(files, os.path.normpath(os.path.join(base, match.group(2))))
+
+    def _role_files(self, role, files, seen):
+        if role in seen:
+            return
+        seen.add(role)
+        role_dir = os.path.join(self.ansible_dir, 'roles', role)
+        self._add_path(files, role_dir)
+        for subdir in ROLE_VARS_DIRS:
+            for path in sorted(glob.glob(os.path.join(role_dir, subdir, '**', '*.y*ml'), recursive=True)):
+                with open(path) as f:
+                    self._templated_paths(yaml.load(f, Loader=AnsibleLoader), role_dir, files)
+        meta = os.path.join(role_dir, 'meta', 'main.yml')
+        if os.path.isfile(meta):
+            with open(meta) as f:
+                data = yaml.load(f, Loader=AnsibleLoader) or {}
+            for dep in data.get('dependencies') or []:
+                name = dep if isinstance(dep, str) else dep.get('role') or dep.get('name')
+                if name:
+                    self._role_files(name, files, seen)
+
+    def _static_path(self, playbook_dir, value):
+        """A path written literally in the playbook; templated paths need `inputs` in the graph"""
+        if not isinstance(value, str) or '{{' in value:
+            return None
+        for base in ('', 'templates', 'files'):
+            candidate = os.path.normpath(os.path.join(playbook_dir, base, value))
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _walk_tasks(self, tasks, playbook_dir, files, seen):
+        for task in tasks or []:
+            if not isinstance(task, dict):
+                continue
+            for key in ('block', 'rescue', 'always'):
+                self._walk_tasks(task.get(key), playbook_dir, files, seen)
+            for key, args in task.items():
+                module = key.rsplit('.', 1)[-1]
+                if module in ('include_role', 'import_role') and isinstance(args, dict) and args.get('name'):
+                    self._role_files(args['name'], files, seen)
+                elif module in ('include_tasks', 'import_tasks'):
+                    path = self._static_path(playbook_dir, args.get('file') if isinstance(args, dict) else args)
+                    if path:
+                        self._playbook_files(path, files, seen)
+                elif isinstance(args, dict) and 'src' in args:
+                    path = self._static_path(playbook_dir, args['src'])
+                    if path:
+                        self._add_path(files, path)
+
+    def _playbook_files(self, path, files, seen):
+        self._add_path(files, path)
+        playbook_dir = os.path.dirname(path)
+        with open(path) as f:
+            data = yaml.load(f, Loader=AnsibleLoader) or []
+        if isinstance(data, dict):
+            data = [data]
+        self._templated_paths(data, None, files)
+        for play in data:
+            if not isinstance(play, dict):
+                continue
+            for key in ('import_playbook', 'ansible.builtin.import_playbook'):
+                imported = self._static_path(playbook_dir, play.get(key))
+                if imported:
+                    self._playbook_files(imported, files, seen)
+            for role in play.get('roles') or []:
+                name = role if isinstance(role, str) else role.get('role') or role.get('name')
+                if name:
+                    self._role_files(name, files, seen)
+            for vars_file in play.get('vars_files') or []:
+                vars_path = self._static_path(playbook_dir, vars_file)
+                if vars_path:
+                    self._add_path(files, vars_path)
+            for key in ('pre_tasks', 'tasks', 'post_tasks', 'handlers'):
+                self._walk_tasks(play.get(key), playbook_dir, files, seen)
+            # A task list, as pulled in by include_tasks
+            if 'hosts' not in play and 'import_playbook' not in play:
+                self._walk_tasks([play], playbook_dir, files, seen)
+
+    def _host_groups(self, host):
+        groups = {'all'}
+        for group, data in self.inventory.items():
+            if group != '_meta' and host in (data.get('hosts') or []):
+                groups.add(group)
+        # Parent groups
+        changed = True
+        while changed:
+            changed = False
+            for group, data in self.inventory.items():
+                if group not in groups and groups & set(data.get('children') or []):
+                    groups.add(group)
+                    changed = True
+        return groups
+
+    def step_files(self, name):
+        step = self.graph.steps[name]
+        files = set()
+        playbook = os.path.join(self.ansible_dir, step['playbook'])
+        self.playbook_dir = os.path.dirname(playbook)
+        self._playbook_files(playbook, files, set())
+        for pattern in step['inputs']:
+            for path in glob.glob(os.path.join(self.ansible_dir, pattern), recursive=True):
+                self._add_path(files, path)
+        return files
+
+    def step_hashes(self, name, hosts):
+        """(per-host hashes, file hashes) for the current tree"""
+        files = self.step_files(name)
+        for path in files:
+            if path not in self.file_hashes:
+                self.file_hashes[path] = sha256_file(os.path.join(self.ansible_dir, path))
+        step_files = {path: self.file_hashes[path] for path in files}
+        hostvars = self.inventory.get('_meta', {}).get('hostvars', {})
+
+        host_files = {}
+        for host in hosts:
+            group_files = set()
+            for group in self._host_groups(host):
+                for base in ('group_vars', os.path.join('playbooks', 'group_vars')):
+                    self._add_path(group_files, os.path.join(self.ansible_dir, base, group))
+                    self._add_path(group_files, os.path.join(self.ansible_dir, base, f"{group}.yml"))
+            for path in group_files:
+                if path not in self.file_hashes:
+                    self.file_hashes[path] = sha256_file(os.path.join(self.ansible_dir, path))
+            host_files[host] = group_files
+
+        hashes = {}
+        for host in hosts:
+            digest = hashlib.sha256()
+            for path in sorted(files | host_files[host]):
+                digest.update(f"{path}:{self.file_hashes[path]}\n".encode())
+            digest.update(json.dumps(hostvars.get(host, {}), sort_keys=True, default=str).encode())
+            hashes[host] = digest.hexdigest()
+            step_files.update({path: self.file_hashes[path] for path in host_files[host]})
+        return hashes, step_files
+
+    def changes(self, name, hashes, step_files):
+        """Hosts whose inputs differ from the last successful run, and the files that changed"""
+        applied = self.state.get(name, {})
+        hosts = {host for host, digest in hashes.items() if applied.get('hosts', {}).get(host) != digest}
+        previous = applied.get('files', {})
+        changed_files = sorted(path for path, digest in step_files.items() if previous.get(path) != digest)
+        changed_files += sorted(f"{path} (removed)" for path in previous if path not in step_files)
+        return hosts, changed_files
+
+    def record(self, name, hashes, step_files):
+        entry = self.state.setdefault(name, {'hosts': {}, 'files': {}})
+        entry['hosts'].update(hashes)
+        entry['files'] = step_files
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+
+class PlaybookRunner:
+    """Schedules the selected steps over ansible-playbook subprocesses"""
+
+    def __init__(self, graph, steps, ansible_dir, max_parallel, extra_args, env, verbose=False):
+        self.graph = graph
+        self.steps = steps
+        self.ansible_dir = ansible_dir
+        self.max_parallel = max_parallel
+        self.extra_args = extra_args
+        self.check_mode = check_mode(extra_args)
+        self.env = env
+        self.verbose = verbose
+        self.hosts = {}
+        self.results = {}
+        self.detector = None
+        self.hashes = {}
+        self.limits = {}
+        self.unchanged = set()
+        self.timings_file = os.path.join(ansible_dir, '.cache', 'deploy-timings.json')
+        self.log_dir = os.path.join(ansible_dir, 'logs', 'deploy', time.strftime('%Y%m%d_%H%M%S'))
+
+    def _command(self, name, *args):
+        step = self.graph.steps[name]
+        command = ['ansible-playbook', step['playbook']]
+        if name in self.limits:
+            command += ['--limit', ','.join(sorted(self.limits[name]))]
+        elif step['limit']:
+            command += ['--limit', step['limit']]
+        return command + list(args)
+
+    def resolve_hosts(self):
+        """Hosts each step touches, from `ansible-playbook --list-hosts`"""
+        def list_hosts(name):
+            result = subprocess.run(self._command(name, '--list-hosts', *self.extra_args), cwd=self.ansible_dir,
+                                    env=self.env, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"--list-hosts failed for {name}: {result.stderr.strip() or result.stdout.strip()}")
+            hosts, remaining = set(), 0
+            for line in result.stdout.splitlines():
+                stripped = line.strip()
+                if stripped.startswith('hosts (') and stripped.endswith('):'):
+                    remaining = int(stripped[len('hosts ('):-2])
+                elif remaining and stripped:
+                    hosts.add(stripped)
+                    remaining -= 1
+            return name, hosts
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            for name, hosts in executor.map(list_hosts, self.steps):
+                self.hosts[name] = hosts
+
+    def detect_changes(self, detector, selective):
+        """Hash every step's inputs; in selective mode limit steps to the hosts that changed"""
+        self.detector = detector
+        for name in self.steps:
+            self.hashes[name] = detector.step_hashes(name, self.hosts[name])
+            if not selective:
+                continue
+            hosts, files = detector.changes(name, *self.hashes[name])
+            if not hosts:
+                self.unchanged.add(name)
+                continue
+            if hosts != self.hosts[name]:
+                self.limits[name] = hosts
+                self.hosts[name] = hosts
+            shown = ', '.join(files[:3]) + (f" and {len(files) - 3} more" if len(files) > 3 else '')
+            print(f"🔍 {name}: {', '.join(sorted(hosts))} changed" + (f" ({shown})" if files else ' (new host or inventory variables)'))
+        if selective:
+            print(f"⏭️  Unchanged: {', '.join(name for name in self.steps if name in self.unchanged) or 'none'}")
+            print("")
+
+    def load_timings(self):
+        try:
+            with open(self.timings_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_timings(self):
+        timings = self.load_timings()
+        for name, result in self.results.items():
+            if result['status'] == 'ok':
+                timings[name] = round(result['seconds'], 1)
+        os.makedirs(os.path.dirname(self.timings_file), exist_ok=True)
+        with open(self.timings_file, 'w') as f:
+            json.dump(timings, f, indent=2, sort_keys=True)
+
+    def _ready(self, done, started, running):
+        """Steps whose dependencies succeeded and whose hosts are free"""
+        busy = set().union(*(self.hosts[name] for name in running)) if running else set()
+        ready = []
+        for name in self.steps:
+            # Dependencies outside the selection (--only) are assumed to be deployed
+            deps = [dep for dep in self.graph.steps[name]['after'] if dep in self.steps]
+            if name in started or any(done.get(dep) != 'ok' for dep in deps):
+                continue
+            if self.hosts[name] & busy:
+                continue
+            if len(running) + len(ready) >= self.max_parallel:
+                break
+            ready.append(name)
+            busy |= self.hosts[name]
+        return ready
+
+    def plan(self):
+        """Simulate the schedule with durations from previous runs"""
+        timings = self.load_timings()
+        clock, running = 0.0, {}
+        done = {name: 'ok' for name in self.unchanged}
+        started = set(self.unchanged)
+        print(f"📋 Plan for {len(self.steps)} steps (durations from previous runs, "
+              f"{DEFAULT_DURATION:.0f}s if unknown)")
+        while len(done) < len(self.steps):
+            for name in self._ready(done, started, running):
+                started.add(name)
+                running[name] = clock + timings.get(name, DEFAULT_DURATION)
+                hosts = ', '.join(sorted(self.hosts[name])) or 'no hosts'
+                print(f"  {clock:7.0f}s  start {name:22} [{hosts}]")
+            if not running:
+                break
+            name = min(running, key=running.get)
+            clock = running.pop(name)
+            done[name] = 'ok'
+        serial = sum(timings.get(name, DEFAULT_DURATION) for name in self.steps if name not in self.unchanged)
+        print("")
+        print(f"⏱️  Estimated {clock / 60:.1f} min in parallel, {serial / 60:.1f} min serially")
+
+    def _run_step(self, name, events):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_path = os.path.join(self.log_dir, f"{name}.log")
+        start = time.monotonic()
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen(self._command(name, *self.extra_args), cwd=self.ansible_dir, env=self.env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            for line in process.stdout:
+                log.write(line)
+                if self.verbose:
+                    print(f"[{name}] {line}", end='')
+            returncode = process.wait()
+        events.put((name, returncode, time.monotonic() - start, log_path))
+
+    def run(self):
+        events = queue.Queue()
+        done = {name: 'ok' for name in self.unchanged}
+        started, running = set(self.unchanged), set()
+        failed = False
+        for name in self.unchanged:
+            self.results[name] = {'status': 'unchanged', 'seconds': 0.0, 'log': None}
+        start = time.monotonic()
+
+        while True:
+            if not failed:
+                for name in self._ready(done, started, running):
+                    started.add(name)
+                    running.add(name)
+                    hosts = ', '.join(sorted(self.hosts[name])) or 'no hosts'
+                    print(f"▶️  {name} ({self.graph.steps[name]['playbook']}) on {hosts}")
+                    threading.Thread(target=self._run_step, args=(name, events), daemon=True).start()
+            if not running:
+                break
+
+            name, returncode, seconds, log_path = events.get()
+            running.discard(name)
+            status = 'ok' if returncode == 0 else 'failed'
+            done[name] = status
+            self.results[name] = {'status': status, 'seconds': seconds, 'log': log_path}
+            if status == 'ok':
+                print(f"✅ {name} finished in {seconds:.0f}s")
+                # A --check run applied nothing, so the next --changed run must still deploy it
+                if self.detector and not self.check_mode:
+                    hashes, step_files = self.hashes[name]
+                    self.detector.record(name, {host: hashes[host] for host in self.hosts[name]}, step_files)
+            else:
+                failed = True
+                print(f"❌ {name} failed after {seconds:.0f}s (log: {log_path})")
+                with open(log_path) as f:
+                    for line in f.readlines()[-15:]:
+                        print(f"   {line}", end='')
+
+        for name in self.steps:
+            if name not in self.results:
+                self.results[name] = {'status': 'skipped', 'seconds': 0.0, 'log': None}
+
+        self.save_timings()
+        self.print_summary(time.monotonic() - start)
+        return not failed
+
+    def print_summary(self, elapsed):
+        print("")
+        print("📊 Deployment summary")
+        print("=" * 50)
+        icons = {'ok': '✅', 'failed': '❌', 'skipped': '⏭️ ', 'unchanged': '💤'}
+        for name in self.steps:
+            result = self.results[name]
+            print(f"  {icons[result['status']]} {name:22} {result['status']:8} {result['seconds']:7.0f}s")
+        serial = sum(result['seconds'] for result in self.results.values())
+        print("")
+        print(f"⏱️  Wall clock {elapsed / 60:.1f} min; the same steps back to back: {serial / 60:.1f} min")
+        print(f"📁 Logs: {self.log_dir}")
+
+
+def warm_fact_cache(hosts, ansible_dir, env):
+    """Gather facts for every host in one ad-hoc run; the cache plugin stores them"""
+    print(f"🔄 Gathering facts for {len(hosts)} hosts...")
+    result = subprocess.run(['ansible', ','.join(sorted(hosts)), '-m', 'ansible.builtin.setup'],
+                            cwd=ansible_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(f"⚠️  Fact gathering failed for some hosts; playbooks will gather them: {result.stderr.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the deployment playbooks as a parallel dependency graph')
+    parser.add_argument('steps', nargs='*', help='Steps to run (with their dependencies); default: all')
+    parser.add_argument('--only', action='store_true', help='Run only the named steps, not their dependencies')
+    parser.add_argument('--graph', help='Graph file (default: ansible/deploy-graph.yml)')
+    parser.add_argument('--ansible-dir', default=ANSIBLE_DIR, help='Directory with ansible.cfg and playbooks/')
+    parser.add_argument('--max-parallel', type=int, default=4, help='Playbooks running at the same time')
+    parser.add_argument('--fact-cache', choices=['jsonfile', 'redis'],
+                        help='Override the fact cache plugin from ansible.cfg')
+    parser.add_argument('--fact-cache-connection', help='Cache location (jsonfile: directory, redis: host:port:db)')
+    parser.add_argument('--refresh-facts', action='store_true', help='Gather facts for all hosts before the first step')
+    parser.add_argument('--changed', action='store_true',
+                        help='Only run steps (and hosts) whose inputs changed since their last successful run')
+    parser.add_argument('--force', action='store_true', help='With --changed: run everything anyway')
+    parser.add_argument('--dry-run', action='store_true', help='Show the schedule without running anything')
+    parser.add_argument('--verbose', action='store_true', help='Stream playbook output, prefixed with the step name')
+
+    # Everything after -- goes to ansible-playbook unchanged
+    argv = sys.argv[1:]
+    split = argv.index('--') if '--' in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    extra_args = argv[split + 1:]
+
+    env = dict(os.environ)
+    if args.fact_cache:
+        env['ANSIBLE_CACHE_PLUGIN'] = 'community.general.redis' if args.fact_cache == 'redis' else 'jsonfile'
+    if args.fact_cache_connection:
+        env['ANSIBLE_CACHE_PLUGIN_CONNECTION'] = args.fact_cache_connection
+
+    try:
+        graph = DeployGraph(args.graph or os.path.join(args.ansible_dir, 'deploy-graph.yml'))
+        steps = graph.select(args.steps, only=args.only)
+        graph.check_inputs(args.ansible_dir)
+    except (OSError, ValueError, KeyError, yaml.YAMLError) as e:
+        print(f"❌ Invalid deploy graph: {e}")
+        sys.exit(1)
+
+    runner = PlaybookRunner(graph, steps, args.ansible_dir, max(args.max_parallel, 1), extra_args, env,
+                            verbose=args.verbose)
+    try:
+        runner.resolve_hosts()
+    except (RuntimeError, OSError) as e:
+        print(f"❌ Cannot resolve hosts: {e}")
+        sys.exit(1)
+
+    try:
+        runner.detect_changes(ChangeDetector(graph, args.ansible_dir, env), args.changed and not args.force)
+    except (RuntimeError, OSError, ValueError, yaml.YAMLError) as e:
+        if args.changed and not args.force:
+            print(f"❌ Cannot detect changes: {e}")
+            sys.exit(1)
+        print(f"⚠️  Deploy state will not be recorded: {e}")
+
+    if args.dry_run:
+        runner.plan()
+        return
+
+    if args.refresh_facts:
+        warm_fact_cache(set().union(*runner.hosts.values()), args.ansible_dir, env)
+
+    sys.exit(0 if runner.run() else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Deployment Profile Report
+=========================
+
+Aggregates the run files written by the deploy_profile callback
+(ansible/callback_plugins/deploy_profile.py) and shows where deploy time goes:
+
+- History: duration of the last runs of every playbook
+- Task files: wall time per role task file (e.g. roles/podman/tasks/install.yml)
+  in the latest run, counting overlapping hosts once
+- Slowest tasks and the host they were slowest on
+- Hosts: busy time per Pi, to spot a slow SD card or a flaky link
+- Regressions: task files that took much longer in the latest run than the
+  median of the runs before it
+
+Runs are compared per playbook and --limit, so the split observability steps
+of deploy-playbooks.py are tracked separately.
+
+Usage:
+    python3 deploy-profile-report.py
+    python3 deploy-profile-report.py --playbook 20-podman --top 15
+    python3 deploy-profile-report.py --since 7 --threshold 1.3 --json report.json
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import collections
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ansible', '.cache', 'profile')
+
+
+def wall_time(intervals):
+    """Length of the union of (start, end) intervals"""
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def load_runs(directory, since_days=None, playbook=None):
+    cutoff = time.time() - since_days * 86400 if since_days else 0
+    runs = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        try:
+            with open(path) as f:
+                run = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if run.get('start', 0) < cutoff:
+            continue
+        if playbook and not run['playbook'].startswith(playbook):
+            continue
+        run['key'] = run['playbook'] + (f" --limit {run['limit']}" if run.get('limit') else '')
+        runs.append(run)
+    return sorted(runs, key=lambda r: r['start'])
+
+
+def file_times(run):
+    """Wall seconds per task file in one run"""
+    intervals = collections.defaultdict(list)
+    for task in run['tasks']:
+        if task['status'] != 'skipped':
+            intervals[task['file']].append((task['start'], task['start'] + task['duration']))
+    return {name: wall_time(spans) for name, spans in intervals.items()}
+
+
+class ProfileReport:
+    """Builds the report sections from a list of runs"""
+
+    def __init__(self, runs, top, baseline, threshold, min_seconds):
+        self.runs = runs
+        self.top = top
+        self.baseline = baseline
+        self.threshold = threshold
+        self.min_seconds = min_seconds
+        self.by_key = collections.OrderedDict()
+        for run in runs:
+            self.by_key.setdefault(run['key'], []).append(run)
+        self.latest = [history[-1] for history in self.by_key.values()]
+
+    def history(self):
+        rows = []
+        for key, history in self.by_key.items():
+            durations = [run['duration'] for run in history]
+            rows.append({
+                'playbook': key,
+                'runs': len(history),
+                'last': durations[-1],
+                'median': statistics.median(durations),
+                'recent': durations[-self.baseline - 1:],
+                'failed': history[-1].get('failed', False),
+            })
+        return rows
+
+    def task_files(self):
+        totals = collections.Counter()
+        for run in self.latest:
+            for name, seconds in file_times(run).items():
+                totals[name] += seconds
+        deploy = sum(run['duration'] for run in self.latest) or 1
+        return [{'file': name, 'seconds': seconds, 'share': seconds / deploy}
+                for name, seconds in totals.most_common(self.top)]
+
+    def slowest_tasks(self):
+        tasks = [dict(task, playbook=run['key']) for run in self.latest for task in run['tasks']]
+        tasks.sort(key=lambda task: task['duration'], reverse=True)
+        return tasks[:self.top]
+
+    def hosts(self):
+        busy = collections.defaultdict(list)
+        for run in self.latest:
+            for task in run['tasks']:
+                if task['status'] != 'skipped':
+                    busy[task['host']].append((task['start'], task['start'] + task['duration']))
+        return sorted(((host, wall_time(spans)) for host, spans in busy.items()),
+                      key=lambda row: row[1], reverse=True)
+
+    def regressions(self):
+        rows = []
+        for key, history in self.by_key.items():
+            if len(history) < 2:
+                continue
+            latest = file_times(history[-1])
+            previous = [file_times(run) for run in history[-self.baseline - 1:-1]]
+            for name, seconds in latest.items():
+                before = [times[name] for times in previous if name in times]
+                if not before:
+                    continue
+                median = statistics.median(before)
+                if seconds - median >= self.min_seconds and seconds >= median * self.threshold:
+                    rows.append({'playbook': key, 'file': name, 'seconds': seconds, 'baseline': median,
+                                 'ratio': seconds / median if median else float('inf')})
+        return sorted(rows, key=lambda row: row['seconds'] - row['baseline'], reverse=True)
+
+    def print_report(self):
+        print("⏱️  Deployment Profile")
+        print("=" * 60)
+        print(f"  {len(self.runs)} runs of {len(self.by_key)} playbooks")
+
+        print("")
+        print("📜 History (seconds, oldest → newest)")
+        for row in self.history():
+            recent = ' '.join(f"{d:.0f}" for d in row['recent'])
+            flag = '  ❌ failed' if row['failed'] else ''
+            print(f"  {row['playbook'][:44]:44} last {row['last']:6.0f}  median {row['median']:6.0f}  [{recent}]{flag}")
+
+        print("")
+        print(f"📂 Task files by wall time, latest runs (top {self.top})")
+        for row in self.task_files():
+            print(f"  {row['seconds']:7.1f}s  {row['share'] * 100:4.0f}%  {row['file']}")
+
+        print("")
+        print(f"🐢 Slowest tasks (top {self.top})")
+        for task in self.slowest_tasks():
+            print(f"  {task['duration']:7.1f}s  {task['host']:6} {task['task'][:50]:50} {task['path']}")
+
+        print("")
+        print("🖥️  Busy time per host, latest runs")
+        for host, seconds in self.hosts():
+            print(f"  {host:10} {seconds:7.1f}s")
+
+        print("")
+        regressions = self.regressions()
+        if regressions:
+            print(f"⚠️  Regressions (≥{self.threshold:g}× and +{self.min_seconds:g}s over the median of "
+                  f"the previous {self.baseline} runs)")
+            for row in regressions:
+                print(f"  {row['baseline']:6.1f}s → {row['seconds']:6.1f}s  ({row['ratio']:.1f}×)  "
+                      f"{row['file']}  [{row['playbook']}]")
+        else:
+            print("✅ No regressions against previous runs")
+
+    def to_dict(self):
+        return {
+            'history': self.history(),
+            'task_files': self.task_files(),
+            'slowest_tasks': self.slowest_tasks(),
+            'hosts': [{'host': host, 'seconds': seconds} for host, seconds in self.hosts()],
+            'regressions': self.regressions(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize deploy_profile runs and find regressions')
+    parser.add_argument('--dir', default=PROFILE_DIR, help='Directory with the callback run files')
+    parser.add_argument('--playbook', help='Only playbooks whose file name starts with this, e.g. 20-podman')
+    parser.add_argument('--since', type=float, help='Only runs from the last N days')
+    parser.add_argument('--top', type=int, default=10, help='Rows per section')
+    parser.add_argument('--baseline', type=int, default=5, help='Previous runs to compare the latest run with')
+    parser.add_argument('--threshold', type=float, default=1.5, help='Slowdown factor reported as a regression')
+    parser.add_argument('--min-seconds', type=float, default=5, help='Ignore slowdowns smaller than this')
+    parser.add_argument('--json', help='Also write the report as JSON to this file')
+
+    args = parser.parse_args()
+
+    runs = load_runs(args.dir, args.since, args.playbook)
+    if not runs:
+        print(f"❌ No profile runs in {args.dir}; enable the deploy_profile callback in ansible.cfg")
+        sys.exit(1)
+
+    report = ProfileReport(runs, args.top, args.baseline, args.threshold, args.min_seconds)
+    report.print_report()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+        print(f"\n✅ Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+ForwardAuth Decision Cache
+==========================
+
+Small caching proxy between Traefik's forwardAuth middleware and the
+Authentik outpost. Positive (2xx) decisions are cached per session cookie
+and forwarded host for a short TTL, so a burst of requests from one browser
+(e.g. a Grafana dashboard loading 30 panels) costs one outpost round trip
+instead of thirty.
+
+Only requests carrying an Authentik session cookie are cached, and only
+replies that name the authenticated user (X-authentik-username): the
+outpost also answers 200 for skip/unauthenticated paths without checking
+the session, and such a reply must not vouch for the cookie on other paths.
+Redirects to the login flow, 401/403 responses, responses that set cookies
+and requests for the outpost's own /outpost.goauthentik.io/ paths are always
+passed through. A revoked session stays valid for at most --ttl seconds.
+
+Endpoints:
+    /outpost.goauthentik.io/auth/traefik   ForwardAuth (point Traefik here)
+    /healthz                               Liveness check
+    /metrics                               Prometheus metrics (hits, misses, latency)
+
+Usage:
+    python3 forwardauth-cache.py --upstream http://192.168.1.13:9002 --listen 127.0.0.1:9003 --ttl 30
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import collections
+import hashlib
+import http.client
+import http.server
+import sys
+import threading
+import time
+import urllib.parse
+
+
+# Headers that describe the connection rather than the decision
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+    'trailers', 'transfer-encoding', 'upgrade', 'content-length',
+}
+
+# Request headers that influence the outpost's decision and must be forwarded
+FORWARDED_HEADERS = (
+    'Cookie', 'Authorization', 'User-Agent', 'Accept',
+    'X-Forwarded-Method', 'X-Forwarded-Proto', 'X-Forwarded-Host',
+    'X-Forwarded-Uri', 'X-Forwarded-For', 'X-Real-Ip',
+)
+
+
+class DecisionCache:
+    """Thread-safe LRU cache with per-entry expiry"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class UpstreamPool:
+    """One persistent HTTP connection to the outpost per handler thread"""
+
+    def __init__(self, upstream, timeout):
+        parsed = urllib.parse.urlsplit(upstream)
+        self.scheme = parsed.scheme
+        self.netloc = parsed.netloc
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = cls(self.netloc, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def request(self, path, headers):
+        """GET path upstream; retries once on a stale keep-alive connection"""
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                return response.status, response.getheaders(), body
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+
+
+class ForwardAuthHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'forwardauth-cache'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def cache_key(self):
+        """Session cookie(s) + forwarded host, or None if the request must not be cached"""
+        uri = self.headers.get('X-Forwarded-Uri', '')
+        if uri.startswith('/outpost.goauthentik.io/'):
+            return None
+        cookies = []
+        for part in self.headers.get('Cookie', '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name.startswith(self.server.cookie_prefix) and value:
+                cookies.append(f"{name}={value}")
+        if not cookies:
+            return None
+        material = '\n'.join(sorted(cookies) + [self.headers.get('X-Forwarded-Host', '')])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def send_decision(self, status, headers, body, cache_state):
+        self.send_response(status)
+        for name, value in headers:
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(name, value)
+        self.send_header('X-Forwardauth-Cache', cache_state)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/healthz':
+            self.send_decision(200, [('Content-Type', 'text/plain')], b'ok\n', 'bypass')
+            return
+        if self.path == '/metrics':
+            body = self.server.render_metrics().encode()
+            self.send_decision(200, [('Content-Type', 'text/plain; version=0.0.4')], body, 'bypass')
+            return
+
+        start = time.monotonic()
+        key = self.cache_key()
+        leader = False
+        if key is not None:
+            cached = self.server.cache.get(key)
+            if cached is None:
+                # Single flight: concurrent misses for one session wait for the
+                # first request instead of all hitting the outpost
+                leader, done = self.server.begin_flight(key)
+                if not leader:
+                    done.wait(self.server.upstream.timeout)
+                    cached = self.server.cache.get(key)
+            if cached is not None:
+                self.send_decision(*cached, 'hit')
+                self.server.observe('hit', time.monotonic() - start)
+                return
+
+        try:
+            self.forward(key, start)
+        finally:
+            if leader:
+                self.server.end_flight(key)
+
+    def forward(self, key, start):
+        headers = {name: self.headers[name] for name in FORWARDED_HEADERS if self.headers.get(name)}
+        try:
+            status, response_headers, body = self.server.upstream.request(self.path, headers)
+        except (http.client.HTTPException, OSError) as e:
+            self.server.observe('error', time.monotonic() - start)
+            body = f"forwardauth upstream error: {e}\n".encode()
+            self.send_decision(502, [('Content-Type', 'text/plain')], body, 'error')
+            return
+
+        sets_cookie = any(name.lower() == 'set-cookie' for name, _ in response_headers)
+        # A 2xx without the user header is a skip-path answer, not a verdict on the session
+        authenticated = any(name.lower() == self.server.identity_header and value
+                            for name, value in response_headers)
+        if key is not None and 200 <= status < 300 and authenticated and not sets_cookie:
+            self.server.cache.put(key, (status, response_headers, body))
+            state = 'miss'
+        else:
+            state = 'bypass'
+        self.send_decision(status, response_headers, body, state)
+        self.server.observe(state, time.monotonic() - start)
+
+
+class ForwardAuthCacheServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, upstream, ttl, max_entries, cookie_prefix, timeout, verbose=False,
+                 identity_header='X-authentik-username'):
+        super().__init__(address, ForwardAuthHandler)
+        self.upstream = UpstreamPool(upstream, timeout)
+        self.cache = DecisionCache(ttl, max_entries)
+        self.cookie_prefix = cookie_prefix
+        self.identity_header = identity_header.lower()
+        self.verbose = verbose
+        self.stats_lock = threading.Lock()
+        self.inflight = {}
+        self.request_counts = collections.Counter()
+        self.request_seconds = collections.Counter()
+
+    def begin_flight(self, key):
+        """Returns (True, event) for the first request of a key, (False, event) for followers"""
+        with self.stats_lock:
+            event = self.inflight.get(key)
+            if event is None:
+                event = self.inflight[key] = threading.Event()
+                return True, event
+            return False, event
+
+    def end_flight(self, key):
+        with self.stats_lock:
+            event = self.inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def observe(self, state, seconds):
+        with self.stats_lock:
+            self.request_counts[state] += 1
+            self.request_seconds[state] += seconds
+
+    def render_metrics(self):
+        lines = [
+            '# HELP forwardauth_cache_requests_total ForwardAuth requests by cache result',
+            '# TYPE forwardauth_cache_requests_total counter',
+        ]
+        with self.stats_lock:
+            for state in ('hit', 'miss', 'bypass', 'error'):
+                lines.append(f'forwardauth_cache_requests_total{{result="{state}"}} {self.request_counts[state]}')
+            lines += [
+                '# HELP forwardauth_cache_request_seconds_total Time spent answering ForwardAuth requests',
+                '# TYPE forwardauth_cache_request_seconds_total counter',
+            ]
+            for state in ('hit', 'miss', 'bypass', 'error'):
+                lines.append(f'forwardauth_cache_request_seconds_total{{result="{state}"}} '
+                             f'{self.request_seconds[state]:.6f}')
+        lines += [
+            '# HELP forwardauth_cache_entries Cached decisions',
+            '# TYPE forwardauth_cache_entries gauge',
+            f'forwardauth_cache_entries {len(self.cache)}',
+            '# HELP forwardauth_cache_evictions_total Decisions evicted by the LRU limit',
+            '# TYPE forwardauth_cache_evictions_total counter',
+            f'forwardauth_cache_evictions_total {self.cache.evictions}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caching proxy for Traefik ForwardAuth decisions')
+    parser.add_argument('--upstream', default='http://192.168.1.13:9002', help='Authentik outpost base URL')
+    parser.add_argument('--listen', default='127.0.0.1:9003', help='host:port to listen on')
+    parser.add_argument('--ttl', type=float, default=30, help='Seconds a positive decision is reused')
+    parser.add_argument('--max-entries', type=int, default=1024, help='LRU size (cached sessions x hosts)')
+    parser.add_argument('--cookie-prefix', default='authentik_proxy_', help='Session cookie name prefix')
+    parser.add_argument('--identity-header', default='X-authentik-username',
+                        help='Response header that marks an authenticated decision; others are not cached')
+    parser.add_argument('--timeout', type=float, default=5, help='Upstream timeout in seconds')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request')
+
+    args = parser.parse_args()
+
+    host, _, port = args.listen.rpartition(':')
+    server = ForwardAuthCacheServer((host or '0.0.0.0', int(port)), args.upstream, args.ttl,
+                                    args.max_entries, args.cookie_prefix, args.timeout, args.verbose,
+                                    args.identity_header)
+    print(f"🔐 ForwardAuth cache listening on {args.listen} → {args.upstream} (ttl {args.ttl:g}s, "
+          f"{args.max_entries} entries)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️  Shutting down")
+        server.server_close()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
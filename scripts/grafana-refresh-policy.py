@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Grafana Dashboard Refresh Policy
+================================
+
+Rewrites the auto-refresh settings of the dashboards in grafana-dashboards/
+according to grafana-dashboards/refresh-policy.yml, so a few open browser
+tabs don't keep the Pi-hosted Prometheus busy:
+
+- `refresh`: auto-refresh interval (false disables it); intervals below
+  min_refresh are raised to it
+- `time`: default time range the dashboard opens with
+- `timepicker.refresh_intervals`: intervals offered in the refresh picker,
+  without the ones below min_refresh
+
+The policy has a `defaults` section and per-dashboard overrides keyed by the
+file name without .json. Without --write only the changes are shown; with
+--check the script exits non-zero when a dashboard differs from the policy.
+Files are written back with the same formatting (2-space indent).
+
+Usage:
+    python3 grafana-refresh-policy.py
+    python3 grafana-refresh-policy.py --write
+    python3 grafana-refresh-policy.py --check
+    python3 grafana-refresh-policy.py --policy my-policy.yml ../ansible/roles/monitoring/files/dashboards/*.json
+
+Requirements:
+    PyYAML
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import re
+import sys
+
+import yaml
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DASHBOARDS_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), 'grafana-dashboards')
+DEFAULT_POLICY = os.path.join(DEFAULT_DASHBOARDS_DIR, 'refresh-policy.yml')
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+POLICY_KEYS = {'min_refresh', 'refresh', 'time', 'refresh_intervals'}
+
+
+def parse_duration(value):
+    """Convert a Grafana duration such as 30s or 1h to seconds"""
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)', str(value))
+    if not parts or ''.join(a + u for a, u in parts) != str(value):
+        raise ValueError(f"Invalid duration: {value}")
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class RefreshPolicy:
+    def __init__(self, defaults, dashboards=None):
+        self.defaults = defaults or {}
+        self.dashboards = dashboards or {}
+        for name, settings in [('defaults', self.defaults)] + list(self.dashboards.items()):
+            unknown = set(settings or {}) - POLICY_KEYS
+            if unknown:
+                raise ValueError(f"{name}: unknown policy keys {', '.join(sorted(unknown))}")
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        return cls(data.get('defaults'), data.get('dashboards'))
+
+    def settings_for(self, name):
+        """Merge the defaults with the overrides of one dashboard"""
+        settings = dict(self.defaults)
+        settings.update(self.dashboards.get(name) or {})
+        return settings
+
+    def apply(self, name, dashboard):
+        """Return a copy of the dashboard with the policy applied"""
+        settings = self.settings_for(name)
+        min_refresh = settings.get('min_refresh')
+        floor = parse_duration(min_refresh) if min_refresh else 0
+        result = copy.deepcopy(dashboard)
+
+        if 'refresh' in settings:
+            refresh = settings['refresh']
+            if refresh not in (False, None, '') and parse_duration(refresh) < floor:
+                refresh = min_refresh
+            result['refresh'] = refresh if refresh not in (None, '') else False
+
+        if 'time' in settings:
+            result['time'] = dict(settings['time'])
+
+        if 'refresh_intervals' in settings:
+            intervals = [i for i in settings['refresh_intervals'] if parse_duration(i) >= floor]
+            timepicker = result.get('timepicker')
+            if not isinstance(timepicker, dict):
+                timepicker = {}
+            timepicker['refresh_intervals'] = intervals
+            result['timepicker'] = timepicker
+
+        return result
+
+
+def describe_changes(before, after):
+    """List the top-level settings the policy changed"""
+    changes = []
+    for key in ('refresh', 'time'):
+        if before.get(key) != after.get(key):
+            changes.append(f"{key}: {json.dumps(before.get(key))} -> {json.dumps(after.get(key))}")
+    old_intervals = (before.get('timepicker') or {}).get('refresh_intervals')
+    new_intervals = (after.get('timepicker') or {}).get('refresh_intervals')
+    if old_intervals != new_intervals:
+        changes.append(f"refresh_intervals: {json.dumps(old_intervals)} -> {json.dumps(new_intervals)}")
+    return changes
+
+
+def process_file(path, policy, write):
+    """Apply the policy to one dashboard file and return the list of changes"""
+    with open(path) as f:
+        text = f.read()
+    data = json.loads(text)
+
+    # API exports wrap the dashboard in {"dashboard": ..., "meta": ...}
+    wrapped = 'dashboard' in data and isinstance(data['dashboard'], dict)
+    dashboard = data['dashboard'] if wrapped else data
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    updated = policy.apply(name, dashboard)
+    changes = describe_changes(dashboard, updated)
+
+    if changes and write:
+        if wrapped:
+            data['dashboard'] = updated
+        else:
+            data = updated
+        output = json.dumps(data, indent=2, ensure_ascii=False)
+        if text.endswith('\n'):
+            output += '\n'
+        with open(path, 'w') as f:
+            f.write(output)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply the refresh/time policy to Grafana dashboard JSON files')
+    parser.add_argument('paths', nargs='*', help='Dashboard JSON files (default: grafana-dashboards/*.json)')
+    parser.add_argument('--policy', default=DEFAULT_POLICY, help='Policy file')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--write', action='store_true', help='Rewrite the dashboard files')
+    mode.add_argument('--check', action='store_true', help='Exit non-zero if a dashboard differs from the policy')
+
+    args = parser.parse_args()
+
+    try:
+        policy = RefreshPolicy.load(args.policy)
+    except (OSError, yaml.YAMLError, ValueError) as e:
+        print(f"❌ Cannot load policy {args.policy}: {e}")
+        sys.exit(1)
+
+    paths = args.paths or sorted(glob.glob(os.path.join(DEFAULT_DASHBOARDS_DIR, '*.json')))
+    if not paths:
+        print(f"❌ No dashboard JSON files found in {DEFAULT_DASHBOARDS_DIR}")
+        sys.exit(1)
+
+    unknown = set(policy.dashboards) - {os.path.splitext(os.path.basename(p))[0] for p in paths}
+    if unknown and not args.paths:
+        print(f"⚠️  Policy entries without a dashboard: {', '.join(sorted(unknown))}")
+
+    changed = 0
+    for path in paths:
+        name = os.path.basename(path)
+        try:
+            changes = process_file(path, policy, args.write)
+        except (OSError, json.JSONDecodeError, ValueError) as e:
+            print(f"❌ {name}: {e}")
+            sys.exit(1)
+        if not changes:
+            print(f"✅ {name}")
+            continue
+        changed += 1
+        print(f"{'✏️ ' if args.write else '🔍'} {name}")
+        for change in changes:
+            print(f"    {change}")
+
+    if not changed:
+        print("\n✅ All dashboards follow the policy")
+    elif args.write:
+        print(f"\n✅ Updated {changed} dashboard(s)")
+    else:
+        print(f"\n{changed} dashboard(s) differ from the policy; run with --write to update them")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -71,6 +71,25 @@ check_requirements() {
     fi
 }
 
+lint_dashboards() {
+    local strict="$1"
+
+    if ! command -v python3 &> /dev/null; then
+        log_warning "python3 not found, skipping dashboard query lint"
+        return 0
+    fi
+
+    log_info "Linting dashboard queries..."
+    if python3 "$SCRIPT_DIR/lint-grafana-dashboards.py" --fail-on error; then
+        log_success "Dashboard queries passed lint"
+    elif [[ "$strict" == "true" ]]; then
+        log_error "Dashboard lint found errors (see above); fix them or drop --strict-lint"
+        exit 1
+    else
+        log_warning "Dashboard lint found errors (see above); importing anyway"
+    fi
+}
+
 list_dashboards() {
     log_info "Available dashboards:"
     find "$DASHBOARDS_DIR" -name "*.json" -exec basename {} \; | sort | while read -r dashboard; do
@@ -149,6 +168,21 @@ import_via_api() {
     done
 }
 
+import_via_sync() {
+    log_info "Syncing changed dashboards via Grafana API..."
+    
+    if ! python3 -c "import requests" &> /dev/null; then
+        log_error "python3 with the requests module is required for sync (pip install requests)."
+        exit 1
+    fi
+    
+    if ! GRAFANA_URL="$GRAFANA_URL" GRAFANA_USER="$GRAFANA_USER" GRAFANA_PASSWORD="$GRAFANA_PASSWORD" \
+        python3 "$SCRIPT_DIR/sync-grafana-dashboards.py"; then
+        log_error "Dashboard sync failed"
+        exit 1
+    fi
+}
+
 show_usage() {
     cat << EOF
 Usage: $0 [OPTIONS]
@@ -158,10 +192,13 @@ Import Grafana dashboards to the homelab monitoring system.
 OPTIONS:
     -h, --help          Show this help message
     -l, --list          List available dashboards
-    -m, --method METHOD Import method: 'ansible' (default) or 'api'
+    -m, --method METHOD Import method: 'ansible' (default), 'api' or 'sync'
+                        ('sync' pushes only changed dashboards, in parallel)
     --grafana-url URL   Grafana URL (default: $GRAFANA_URL)
     --grafana-user USER Grafana username (default: $GRAFANA_USER)
     --grafana-password PWD Grafana password (default: from env or 'admin')
+    --skip-lint         Do not lint dashboard queries before import
+    --strict-lint       Abort the import when the query lint reports errors
 
 EXAMPLES:
     # Import using Ansible (recommended)
@@ -170,6 +207,9 @@ EXAMPLES:
     # Import directly via API
     $0 --method api
 
+    # Push only dashboards that differ from the live Grafana version
+    $0 --method sync
+
     # List available dashboards
     $0 --list
 
@@ -186,6 +226,8 @@ EOF
 
 main() {
     local import_method="ansible"
+    local run_lint="true"
+    local strict_lint="false"
     
     while [[ $# -gt 0 ]]; do
         case $1 in
@@ -213,6 +255,14 @@ main() {
                 GRAFANA_PASSWORD="$2"
                 shift 2
                 ;;
+            --skip-lint)
+                run_lint="false"
+                shift
+                ;;
+            --strict-lint)
+                strict_lint="true"
+                shift
+                ;;
             *)
                 log_error "Unknown option: $1"
                 show_usage
@@ -227,6 +277,10 @@ main() {
     
     check_requirements
     
+    if [[ "$run_lint" == "true" ]]; then
+        lint_dashboards "$strict_lint"
+    fi
+    
     case $import_method in
         ansible)
             import_via_ansible
@@ -234,9 +288,12 @@ main() {
         api)
             import_via_api
             ;;
+        sync)
+            import_via_sync
+            ;;
         *)
             log_error "Invalid import method: $import_method"
-            log_error "Valid methods: ansible, api"
+            log_error "Valid methods: ansible, api, sync"
             exit 1
             ;;
     esac
@@ -0,0 +1,646 @@
+#!/usr/bin/env python3
+"""
+Grafana Dashboard Query Linter
+==============================
+
+Offline analyser for the dashboards in grafana-dashboards/. It parses every
+PromQL and LogQL target and reports queries that are expensive to evaluate on
+the Pi-hosted Prometheus and Loki:
+
+1. Counter/range functions without a range window (rate, increase, ...)
+2. histogram_quantile() over raw _bucket series without rate()
+3. Unbounded regex matchers (=~".*", leading wildcards) and unscoped selectors
+4. Grouping by high-cardinality labels
+5. Dashboard auto-refresh intervals below the configured minimum
+6. Long LogQL ranges that scan raw chunks on every refresh
+
+When a Prometheus URL (e.g. a local Prometheus started on a TSDB snapshot) or
+a snapshot directory (read with `promtool tsdb dump`) is given, the series
+count of each selector is looked up and the series/samples touched per
+refresh are estimated.
+
+Usage:
+    python3 lint-grafana-dashboards.py
+    python3 lint-grafana-dashboards.py --min-refresh 1m --fail-on warning
+    python3 lint-grafana-dashboards.py --prometheus-url http://localhost:9091
+    python3 lint-grafana-dashboards.py --tsdb-snapshot /backups/prometheus/snapshots/20250101T000000Z-abc
+
+Requirements:
+    None (standard library only); promtool for --tsdb-snapshot
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import urllib.parse
+import urllib.request
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DASHBOARDS_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), 'grafana-dashboards')
+
+SEVERITIES = ['info', 'warning', 'error']
+
+# Functions whose argument must be a range vector
+RANGE_FUNCTIONS = {
+    'rate', 'irate', 'increase', 'delta', 'idelta', 'deriv', 'changes', 'resets',
+    'predict_linear', 'holt_winters', 'absent_over_time', 'present_over_time',
+    'avg_over_time', 'min_over_time', 'max_over_time', 'sum_over_time',
+    'count_over_time', 'quantile_over_time', 'stddev_over_time', 'stdvar_over_time',
+    'last_over_time', 'bytes_over_time', 'bytes_rate', 'rate_counter',
+}
+
+# Functions that turn raw histogram buckets into something histogram_quantile can use
+BUCKET_RATE_FUNCTIONS = {'rate', 'irate', 'increase', 'delta', 'idelta'}
+
+KEYWORDS = {
+    'by', 'without', 'on', 'ignoring', 'group_left', 'group_right',
+    'and', 'or', 'unless', 'offset', 'bool', 'atan2',
+}
+
+AGGREGATION_OPERATORS = {
+    'sum', 'min', 'max', 'avg', 'group', 'stddev', 'stdvar', 'count', 'count_values',
+    'bottomk', 'topk', 'quantile',
+}
+
+GROUPING_KEYWORDS = {'by', 'without', 'on', 'ignoring', 'group_left', 'group_right'}
+
+HIGH_CARDINALITY_LABELS = {'id', 'path', 'url', 'uri', 'uid', 'request_id', 'container_id', 'image_id', 'session'}
+
+GRAFANA_INTERVAL_MACROS = {'$__rate_interval', '$__interval', '$__range', '$__auto'}
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+TOKEN_RE = re.compile(r'''
+    (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`[^`]*`)
+  | (?P<variable>\[\[[^\]]+\]\])
+  | (?P<duration>\[[^\]]*\])
+  | (?P<ident>[a-zA-Z_:$][a-zA-Z0-9_:$]*|\$\{[^}]+\})
+  | (?P<number>\d+(?:\.\d+)?(?:e[+-]?\d+)?)
+  | (?P<lbrace>\{)
+  | (?P<rbrace>\})
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<op>\|=|\|~|!=|!~|=~|==|>=|<=|[-+*/%^=<>|,!])
+  | (?P<space>\s+)
+''', re.VERBOSE)
+
+
+def parse_duration(value):
+    """Convert a Prometheus/Grafana duration such as 5m or 1h30m to seconds"""
+    if value is None or value is False or value == '':
+        return None
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)', str(value)):
+        total += float(amount) * DURATION_UNITS[unit]
+        matched = True
+    return total if matched else None
+
+
+def format_duration(seconds):
+    """Render seconds as a short duration string"""
+    if seconds is None:
+        return '-'
+    for unit in ('d', 'h', 'm'):
+        size = DURATION_UNITS[unit]
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+
+def tokenize(expr):
+    """Split a PromQL/LogQL expression into (kind, text) tokens"""
+    tokens = []
+    pos = 0
+    while pos < len(expr):
+        match = TOKEN_RE.match(expr, pos)
+        if not match:
+            tokens.append(('other', expr[pos]))
+            pos += 1
+            continue
+        kind = match.lastgroup
+        if kind != 'space':
+            tokens.append((kind, match.group()))
+        pos = match.end()
+    return tokens
+
+
+def unquote(text):
+    """Strip PromQL/LogQL string quotes"""
+    if len(text) >= 2 and text[0] in '"\'`' and text[-1] == text[0]:
+        inner = text[1:-1]
+        return inner if text[0] == '`' else inner.replace('\\\\', '\\').replace('\\"', '"')
+    return text
+
+
+class Selector:
+    """A vector (PromQL) or stream (LogQL) selector found in a query"""
+
+    def __init__(self, metric, matchers, window=None):
+        self.metric = metric
+        self.matchers = matchers
+        self.window = window
+        self.series = None
+
+    def text(self, substitutions=None):
+        """Render the selector back to PromQL, optionally substituting dashboard variables"""
+        parts = []
+        for label, op, value in self.matchers:
+            value, op = substitute_variables(value, op, substitutions or {})
+            parts.append(f'{label}{op}"{value}"')
+        body = '{' + ','.join(parts) + '}' if parts else ''
+        if self.metric:
+            return f"{self.metric}{body}"
+        return body or '{__name__=~".+"}'
+
+
+class QueryAnalysis:
+    """Result of walking a single query expression"""
+
+    def __init__(self):
+        self.selectors = []
+        self.functions = []
+        self.grouping_labels = set()
+        self.missing_windows = []
+        self.raw_bucket_quantiles = []
+        self.max_window = None
+
+
+def substitute_variables(value, op, substitutions):
+    """Replace Grafana $var/${var}/[[var]] references in a matcher value"""
+    names = re.findall(r'\$\{([^}:]+)(?::[^}]*)?\}|\$([a-zA-Z_]\w*)|\[\[([^\]]+)\]\]', value)
+    if not names:
+        return value, op
+    for groups in names:
+        name = next(n for n in groups if n)
+        if name in substitutions:
+            value = re.sub(r'\$\{' + re.escape(name) + r'(?::[^}]*)?\}|\$' + re.escape(name) + r'\b|\[\[' +
+                           re.escape(name) + r'\]\]', substitutions[name], value)
+        else:
+            # Unknown variable: count every value it could take (upper bound)
+            value = re.sub(r'\$\{' + re.escape(name) + r'(?::[^}]*)?\}|\$' + re.escape(name) + r'\b|\[\[' +
+                           re.escape(name) + r'\]\]', '.+', value)
+            if op == '=':
+                op = '=~'
+            elif op == '!=':
+                op = '!~'
+    return value, op
+
+
+def parse_matchers(tokens, start):
+    """Parse label matchers starting after '{'; returns (matchers, next index)"""
+    matchers = []
+    i = start
+    while i < len(tokens) and tokens[i][0] != 'rbrace':
+        if tokens[i][0] == 'ident' and i + 2 < len(tokens) and tokens[i + 1][1] in ('=', '!=', '=~', '!~'):
+            value_kind, value_text = tokens[i + 2]
+            if value_kind == 'string':
+                matchers.append((tokens[i][1], tokens[i + 1][1], unquote(value_text)))
+                i += 3
+                continue
+        elif tokens[i][0] == 'string':
+            # {"metric_name"} style selector
+            matchers.append(('__name__', '=', unquote(tokens[i][1])))
+        i += 1
+    return matchers, i + 1
+
+
+def analyse_query(expr):
+    """Walk a PromQL/LogQL expression and collect selectors, functions and windows"""
+    analysis = QueryAnalysis()
+    tokens = tokenize(expr)
+    # Stack of [function name, saw a range vector inside it]
+    stack = []
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else (None, None)
+
+        if kind == 'ident' and text in GROUPING_KEYWORDS and nxt[0] == 'lparen':
+            j = i + 2
+            while j < len(tokens) and tokens[j][0] != 'rparen':
+                if tokens[j][0] == 'ident':
+                    analysis.grouping_labels.add(tokens[j][1])
+                j += 1
+            i = j + 1
+            continue
+
+        if kind == 'ident' and nxt[0] == 'lparen':
+            analysis.functions.append(text)
+            stack.append([text, False])
+            i += 2
+            continue
+
+        if kind == 'ident' and text in AGGREGATION_OPERATORS and nxt[1] in ('by', 'without'):
+            # Prefix grouping: "sum by (le) (...)" - the function call follows the label list
+            i += 1
+            continue
+
+        if kind == 'ident' and text.lower() in KEYWORDS:
+            i += 1
+            continue
+
+        if kind == 'ident' and text in GRAFANA_INTERVAL_MACROS:
+            i += 1
+            continue
+
+        if kind == 'ident' or kind == 'lbrace':
+            # Ident directly following a pipe is a LogQL parser stage (| json, | logfmt)
+            prev = tokens[i - 1] if i > 0 else (None, None)
+            if kind == 'ident' and prev[1] == '|':
+                i += 1
+                continue
+            metric = text if kind == 'ident' else None
+            j = i + 1 if kind == 'ident' else i
+            matchers = []
+            if j < len(tokens) and tokens[j][0] == 'lbrace':
+                matchers, j = parse_matchers(tokens, j + 1)
+            selector = Selector(metric, matchers)
+            analysis.selectors.append(selector)
+            i = j
+            continue
+
+        if kind == 'duration':
+            window_text = text[1:-1].split(':')[0].strip()
+            # Grafana interval macros are resolved per query and always satisfy the window checks
+            window = 0 if window_text in GRAFANA_INTERVAL_MACROS else parse_duration(window_text)
+            if analysis.selectors and analysis.selectors[-1].window is None:
+                analysis.selectors[-1].window = window
+            if window:
+                analysis.max_window = max(analysis.max_window or 0, window)
+            if stack:
+                stack[-1][1] = True
+            i += 1
+            continue
+
+        if kind == 'rparen':
+            if stack:
+                name, saw_range = stack.pop()
+                if name in RANGE_FUNCTIONS and not saw_range:
+                    analysis.missing_windows.append(name)
+                if stack:
+                    stack[-1][1] = stack[-1][1] or saw_range
+            i += 1
+            continue
+
+        i += 1
+
+    if 'histogram_quantile' in analysis.functions and not any(f in BUCKET_RATE_FUNCTIONS for f in analysis.functions):
+        analysis.raw_bucket_quantiles = [s.metric for s in analysis.selectors if s.metric and s.metric.endswith('_bucket')]
+    return analysis
+
+
+class Finding:
+    """A single lint finding"""
+
+    def __init__(self, severity, rule, dashboard, panel, message, expr=None):
+        self.severity = severity
+        self.rule = rule
+        self.dashboard = dashboard
+        self.panel = panel
+        self.message = message
+        self.expr = expr
+
+    def to_dict(self):
+        return {
+            'severity': self.severity,
+            'rule': self.rule,
+            'dashboard': self.dashboard,
+            'panel': self.panel,
+            'message': self.message,
+            'expr': self.expr,
+        }
+
+
+class SeriesCounter:
+    """Looks up how many series a selector matches in Prometheus or a TSDB snapshot"""
+
+    def __init__(self, prometheus_url=None, tsdb_snapshot=None, promtool='promtool', timeout=10):
+        self.prometheus_url = prometheus_url.rstrip('/') if prometheus_url else None
+        self.tsdb_snapshot = tsdb_snapshot
+        self.promtool = promtool
+        self.timeout = timeout
+        self.cache = {}
+
+    @property
+    def enabled(self):
+        return bool(self.prometheus_url or self.tsdb_snapshot)
+
+    def count(self, selector_text):
+        """Return the number of series matched by a selector, or None if unknown"""
+        if selector_text in self.cache:
+            return self.cache[selector_text]
+        try:
+            if self.prometheus_url:
+                result = self._count_via_api(selector_text)
+            else:
+                result = self._count_via_promtool(selector_text)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            print(f"⚠️  Could not count series for {selector_text}: {e}", file=sys.stderr)
+            result = None
+        self.cache[selector_text] = result
+        return result
+
+    def _count_via_api(self, selector_text):
+        query = urllib.parse.urlencode({'query': f'count({selector_text}) or vector(0)'})
+        with urllib.request.urlopen(f"{self.prometheus_url}/api/v1/query?{query}", timeout=self.timeout) as response:
+            payload = json.load(response)
+        if payload.get('status') != 'success':
+            raise ValueError(payload.get('error', 'query failed'))
+        results = payload['data']['result']
+        return int(float(results[0]['value'][1])) if results else 0
+
+    def _count_via_promtool(self, selector_text):
+        cmd = [self.promtool, 'tsdb', 'dump', f'--match={selector_text}', self.tsdb_snapshot]
+        series = set()
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as proc:
+            for line in proc.stdout:
+                # Each line is "<labels> <value> <timestamp>"
+                labels = line.rsplit(' ', 2)[0]
+                series.add(labels)
+        if proc.returncode != 0:
+            raise ValueError(f"promtool exited with {proc.returncode}")
+        return len(series)
+
+
+class DashboardLinter:
+    def __init__(self, min_refresh=60, scrape_interval=15, max_series=1000, max_log_range=3600,
+                 series_counter=None, variables=None):
+        self.min_refresh = min_refresh
+        self.scrape_interval = scrape_interval
+        self.max_series = max_series
+        self.max_log_range = max_log_range
+        self.series_counter = series_counter or SeriesCounter()
+        self.variables = variables or {}
+        self.findings = []
+        self.costs = []
+
+    def add(self, severity, rule, dashboard, panel, message, expr=None):
+        self.findings.append(Finding(severity, rule, dashboard, panel, message, expr))
+
+    @staticmethod
+    def load_dashboard(path):
+        """Load a dashboard file, unwrapping API export format if needed"""
+        with open(path) as f:
+            data = json.load(f)
+        return data.get('dashboard', data)
+
+    @staticmethod
+    def iter_panels(panels):
+        """Yield every panel, descending into collapsed rows"""
+        for panel in panels or []:
+            yield panel
+            yield from DashboardLinter.iter_panels(panel.get('panels'))
+
+    @staticmethod
+    def datasource_type(datasource, default='prometheus'):
+        if isinstance(datasource, dict):
+            return (datasource.get('type') or default).lower()
+        if isinstance(datasource, str):
+            return 'loki' if 'loki' in datasource.lower() else default
+        return default
+
+    def lint_file(self, path):
+        name = os.path.basename(path)
+        try:
+            dashboard = self.load_dashboard(path)
+        except (OSError, json.JSONDecodeError) as e:
+            self.add('error', 'invalid-json', name, None, f"Could not load dashboard: {e}")
+            return
+
+        refresh = parse_duration(dashboard.get('refresh'))
+        self.lint_refresh(name, dashboard, refresh)
+        time_range = self.dashboard_range(dashboard)
+
+        for panel in self.iter_panels(dashboard.get('panels')):
+            panel_ds = self.datasource_type(panel.get('datasource'))
+            title = panel.get('title') or f"panel {panel.get('id')}"
+            for target in panel.get('targets') or []:
+                ds_type = self.datasource_type(target.get('datasource'), panel_ds)
+                expr = target.get('expr')
+                if not expr or ds_type not in ('prometheus', 'loki'):
+                    continue
+                self.lint_target(name, title, ds_type, expr, target, time_range, refresh)
+
+    def dashboard_range(self, dashboard):
+        """Seconds covered by the default dashboard time range"""
+        time_cfg = dashboard.get('time') or {}
+        start = str(time_cfg.get('from', 'now-6h'))
+        match = re.match(r'now-(\w+)', start)
+        return parse_duration(match.group(1)) if match else 6 * 3600
+
+    def lint_refresh(self, name, dashboard, refresh):
+        if refresh is not None and refresh < self.min_refresh:
+            self.add('warning', 'short-refresh', name, None,
+                     f"Auto-refresh {dashboard.get('refresh')} is below the {format_duration(self.min_refresh)} minimum")
+        intervals = (dashboard.get('timepicker') or {}).get('refresh_intervals') or []
+        too_short = [i for i in intervals if (parse_duration(i) or self.min_refresh) < self.min_refresh]
+        if too_short:
+            self.add('info', 'short-refresh-option', name, None,
+                     f"Refresh picker offers intervals below the minimum: {', '.join(too_short)}")
+
+    def lint_target(self, name, title, ds_type, expr, target, time_range, refresh):
+        analysis = analyse_query(expr)
+
+        for func in analysis.missing_windows:
+            self.add('error', 'missing-rate-window', name, title,
+                     f"{func}() is applied without a range window", expr)
+
+        if analysis.raw_bucket_quantiles:
+            self.add('error', 'raw-bucket-quantile', name, title,
+                     "histogram_quantile() over raw buckets; wrap them in rate(...[$__rate_interval])", expr)
+
+        for selector in analysis.selectors:
+            self.lint_selector(name, title, ds_type, expr, selector)
+
+        for label in sorted(analysis.grouping_labels & HIGH_CARDINALITY_LABELS):
+            self.add('warning', 'high-cardinality-grouping', name, title,
+                     f"Grouping by high-cardinality label '{label}'", expr)
+
+        if ds_type == 'prometheus':
+            for selector in analysis.selectors:
+                if selector.window and selector.window < 4 * self.scrape_interval:
+                    self.add('warning', 'short-rate-window', name, title,
+                             f"Range [{format_duration(selector.window)}] is shorter than 4x the "
+                             f"{format_duration(self.scrape_interval)} scrape interval; use $__rate_interval", expr)
+        elif analysis.max_window and analysis.max_window > self.max_log_range:
+            self.add('warning', 'long-log-range', name, title,
+                     f"LogQL range [{format_duration(analysis.max_window)}] scans raw chunks on every refresh; "
+                     "consider a recording rule", expr)
+
+        if ds_type == 'prometheus':
+            self.estimate_cost(name, title, expr, target, analysis, time_range, refresh)
+
+    def lint_selector(self, name, title, ds_type, expr, selector):
+        positive = [m for m in selector.matchers if m[1] in ('=', '=~') and m[0] != '__name__']
+        equality = [m for m in positive if m[1] == '=' and m[2]]
+
+        for label, op, value in selector.matchers:
+            if op != '=~':
+                continue
+            if value in ('.*', '.+', '(.*)', '(.+)'):
+                self.add('warning', 'unbounded-regex', name, title,
+                         f"Matcher {label}=~\"{value}\" matches every value of '{label}'", expr)
+            elif value.startswith('.*') or value.startswith('.+'):
+                self.add('warning', 'unanchored-regex', name, title,
+                         f"Matcher {label}=~\"{value}\" starts with a wildcard and cannot use the index efficiently",
+                         expr)
+
+        if ds_type == 'loki':
+            if not equality:
+                self.add('warning', 'unscoped-stream', name, title,
+                         "Stream selector has no equality matcher; Loki must scan every matching stream", expr)
+            return
+
+        if selector.metric and selector.metric.endswith('_bucket') and not equality:
+            self.add('warning', 'high-cardinality-selector', name, title,
+                     f"{selector.metric} is selected without narrowing labels (one series per bucket)", expr)
+        elif not selector.metric and not equality:
+            self.add('warning', 'high-cardinality-selector', name, title,
+                     "Selector without a metric name or equality matcher", expr)
+
+    def estimate_cost(self, name, title, expr, target, analysis, time_range, refresh):
+        """Estimate series and samples read per refresh for a Prometheus target"""
+        counter = self.series_counter
+        series_total = None
+        if counter.enabled:
+            series_total = 0
+            for selector in analysis.selectors:
+                selector.series = counter.count(selector.text(self.variables))
+                if selector.series is None:
+                    series_total = None
+                    break
+                series_total += selector.series
+                if selector.series > self.max_series:
+                    self.add('warning', 'high-cardinality-selector', name, title,
+                             f"{selector.text()} matches {selector.series} series (limit {self.max_series})", expr)
+
+        window = analysis.max_window or 0
+        instant = bool(target.get('instant')) and not target.get('range', False)
+        span = window if instant else time_range + window
+        samples = None
+        if series_total is not None:
+            samples = int(series_total * max(span, self.scrape_interval) / self.scrape_interval)
+
+        self.costs.append({
+            'dashboard': name,
+            'panel': title,
+            'expr': expr,
+            'series': series_total,
+            'samples_per_refresh': samples,
+            'refreshes_per_hour': int(3600 / refresh) if refresh else 0,
+        })
+
+    def summary_by_dashboard(self):
+        totals = {}
+        for cost in self.costs:
+            entry = totals.setdefault(cost['dashboard'], {'series': 0, 'samples_per_refresh': 0,
+                                                          'samples_per_hour': 0, 'known': True})
+            if cost['series'] is None:
+                entry['known'] = False
+                continue
+            entry['series'] += cost['series']
+            entry['samples_per_refresh'] += cost['samples_per_refresh']
+            entry['samples_per_hour'] += cost['samples_per_refresh'] * cost['refreshes_per_hour']
+        return totals
+
+
+def print_report(linter, verbose=False):
+    icons = {'error': '❌', 'warning': '⚠️ ', 'info': 'ℹ️ '}
+    by_dashboard = {}
+    for finding in linter.findings:
+        by_dashboard.setdefault(finding.dashboard, []).append(finding)
+
+    print("🔍 Dashboard Query Lint Report")
+    print("=" * 50)
+    for dashboard in sorted(by_dashboard):
+        print(f"\n📊 {dashboard}")
+        for finding in by_dashboard[dashboard]:
+            where = f"[{finding.panel}] " if finding.panel else ""
+            print(f"  {icons[finding.severity]} {finding.rule}: {where}{finding.message}")
+            if verbose and finding.expr:
+                print(f"       {finding.expr}")
+
+    if linter.series_counter.enabled:
+        print("\n💰 Estimated cost per refresh")
+        print("=" * 50)
+        for dashboard, entry in sorted(linter.summary_by_dashboard().items()):
+            suffix = "" if entry['known'] else " (partial)"
+            print(f"  {dashboard:32} series={entry['series']:<6} samples/refresh={entry['samples_per_refresh']:<9} "
+                  f"samples/hour={entry['samples_per_hour']}{suffix}")
+        if verbose:
+            print("\n  Most expensive targets:")
+            ranked = sorted((c for c in linter.costs if c['samples_per_refresh'] is not None),
+                            key=lambda c: c['samples_per_refresh'], reverse=True)
+            for cost in ranked[:10]:
+                print(f"    {cost['samples_per_refresh']:>9}  {cost['dashboard']} / {cost['panel']}: {cost['expr']}")
+
+    counts = {s: sum(1 for f in linter.findings if f.severity == s) for s in SEVERITIES}
+    print("")
+    print(f"Findings: {counts['error']} errors, {counts['warning']} warnings, {counts['info']} info")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lint Grafana dashboard queries and estimate their cost')
+    parser.add_argument('paths', nargs='*', help='Dashboard JSON files (default: grafana-dashboards/*.json)')
+    parser.add_argument('--min-refresh', default='1m', help='Minimum allowed auto-refresh interval')
+    parser.add_argument('--scrape-interval', default='15s', help='Prometheus scrape interval')
+    parser.add_argument('--max-log-range', default='1h', help='Longest LogQL range before warning')
+    parser.add_argument('--max-series', type=int, default=1000, help='Series per selector before warning')
+    parser.add_argument('--prometheus-url', help='Prometheus to count series against (e.g. one serving a snapshot)')
+    parser.add_argument('--tsdb-snapshot', help='TSDB snapshot directory to count series with promtool')
+    parser.add_argument('--promtool', default='promtool', help='Path to promtool')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='Value for a dashboard variable when counting series (repeatable)')
+    parser.add_argument('--fail-on', choices=SEVERITIES + ['never'], default='error',
+                        help='Exit non-zero when findings of this severity or worse exist')
+    parser.add_argument('--json', action='store_true', help='Emit findings and costs as JSON')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show offending expressions')
+
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(DEFAULT_DASHBOARDS_DIR, '*.json')))
+    if not paths:
+        print(f"❌ No dashboard JSON files found in {DEFAULT_DASHBOARDS_DIR}")
+        sys.exit(1)
+
+    variables = {}
+    for item in args.var:
+        if '=' not in item:
+            parser.error(f"--var expects NAME=VALUE, got {item!r}")
+        key, value = item.split('=', 1)
+        variables[key] = value
+
+    linter = DashboardLinter(
+        min_refresh=parse_duration(args.min_refresh),
+        scrape_interval=parse_duration(args.scrape_interval),
+        max_series=args.max_series,
+        max_log_range=parse_duration(args.max_log_range),
+        series_counter=SeriesCounter(args.prometheus_url, args.tsdb_snapshot, args.promtool),
+        variables=variables,
+    )
+    for path in paths:
+        linter.lint_file(path)
+
+    if args.json:
+        print(json.dumps({
+            'findings': [f.to_dict() for f in linter.findings],
+            'costs': linter.costs,
+            'summary': linter.summary_by_dashboard(),
+        }, indent=2))
+    else:
+        print_report(linter, args.verbose)
+
+    if args.fail_on != 'never':
+        threshold = SEVERITIES.index(args.fail_on)
+        if any(SEVERITIES.index(f.severity) >= threshold for f in linter.findings):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Loki Label Cardinality Report
+=============================
+
+Shows which label sets Promtail produces and what they cost Loki:
+
+- Streams: number of distinct label sets over --since, per job and host
+- Labels: distinct values per label name, the values with the most streams
+  and values that look like IDs (hashes, numbers), which usually mean a label
+  grows without bound, e.g. a unit per login session
+- Volume (--volume): bytes per stream from a bytes_over_time() query, to find
+  the units worth dropping or rate limiting in the Promtail pipeline
+- Promtail (--promtail): lines sent, lines dropped per pipeline reason
+  (journal_level, journal_unit, app_level, rate limit) and entries per push
+  request, which shows whether client batching works
+
+Usage:
+    python3 loki-cardinality-report.py
+    python3 loki-cardinality-report.py --since 24h --volume
+    python3 loki-cardinality-report.py --promtail http://192.168.1.11:9080 --promtail http://192.168.1.12:9080
+    python3 loki-cardinality-report.py --json cardinality.json
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import collections
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# Values that are probably IDs rather than a bounded set of names
+ID_PATTERN = re.compile(r'[0-9a-f]{12,}|[0-9]{3,}|[0-9a-f]{8}-[0-9a-f]{4}-', re.IGNORECASE)
+
+SAMPLE_PATTERN = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_duration(value):
+    """Convert a duration such as 1h or 7d to seconds"""
+    parts = re.findall(r'(\d+)([smhdw])', str(value))
+    if not parts:
+        raise ValueError(f"Invalid duration: {value}")
+    return sum(int(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def format_bytes(value):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(value) < 1024:
+            return f"{value:.0f}{unit}" if unit == 'B' else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TiB"
+
+
+def render_labels(labels):
+    return '{' + ', '.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class LokiClient:
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def get(self, path, params):
+        url = f"{self.url}/loki/api/v1/{path}?{urllib.parse.urlencode(params, doseq=True)}"
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            payload = json.load(response)
+        if payload.get('status') != 'success':
+            raise RuntimeError(f"Loki error: {payload.get('error', 'unknown error')}")
+        return payload['data']
+
+    def series(self, selector, start, end):
+        return self.get('series', {'match[]': selector, 'start': int(start * 1e9), 'end': int(end * 1e9)})
+
+    def volume(self, selector, since, by):
+        query = f"sum by ({', '.join(by)}) (bytes_over_time({selector}[{since}]))"
+        data = self.get('query', {'query': query})
+        return [(series['metric'], float(series['value'][1])) for series in data['result']]
+
+
+def scrape_promtail(url, timeout=10):
+    """Sum the pipeline and client counters of one Promtail /metrics page"""
+    with urllib.request.urlopen(f"{url.rstrip('/')}/metrics", timeout=timeout) as response:
+        text = response.read().decode()
+
+    stats = {'sent_entries': 0.0, 'sent_bytes': 0.0, 'failed_entries': 0.0, 'requests': 0.0,
+             'dropped': collections.Counter()}
+    for line in text.splitlines():
+        match = SAMPLE_PATTERN.match(line)
+        if not match:
+            continue
+        name, labels, value = match.group(1), dict(LABEL_PATTERN.findall(match.group(2) or '')), match.group(3)
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        if name == 'promtail_sent_entries_total':
+            stats['sent_entries'] += value
+        elif name == 'promtail_sent_bytes_total':
+            stats['sent_bytes'] += value
+        elif name == 'promtail_dropped_entries_total':
+            stats['failed_entries'] += value
+        elif name == 'promtail_request_duration_seconds_count':
+            stats['requests'] += value
+        elif name == 'logentry_dropped_lines_total':
+            stats['dropped'][labels.get('reason', 'unknown')] += value
+    return stats
+
+
+class CardinalityReport:
+    def __init__(self, streams, top, max_values):
+        self.streams = streams
+        self.top = top
+        self.max_values = max_values
+        self.values = collections.defaultdict(collections.Counter)
+        for labels in streams:
+            for name, value in labels.items():
+                self.values[name][value] += 1
+
+    def labels(self):
+        rows = []
+        for name, counter in self.values.items():
+            id_like = sorted(v for v in counter if ID_PATTERN.search(v))
+            rows.append({
+                'label': name,
+                'values': len(counter),
+                'streams': sum(counter.values()),
+                'top': counter.most_common(self.top),
+                'id_like': id_like[:self.top],
+                'id_like_count': len(id_like),
+                'warning': len(counter) > self.max_values or bool(id_like),
+            })
+        return sorted(rows, key=lambda row: row['values'], reverse=True)
+
+    def streams_by(self, name):
+        return collections.Counter(labels.get(name, '(none)') for labels in self.streams).most_common()
+
+    def print_report(self, volume=None, promtail=None):
+        print("🏷️  Loki Label Cardinality")
+        print("=" * 60)
+        print(f"  {len(self.streams)} streams, {len(self.values)} label names")
+
+        for name in ('job', 'host'):
+            if name in self.values:
+                print("")
+                print(f"📦 Streams per {name}")
+                for value, count in self.streams_by(name):
+                    print(f"  {count:6}  {value}")
+
+        print("")
+        print("🔢 Distinct values per label")
+        for row in self.labels():
+            flag = '⚠️ ' if row['warning'] else '  '
+            top = ', '.join(f"{value} ({count})" for value, count in row['top'][:3])
+            print(f"  {flag}{row['label']:20} {row['values']:6} values  top: {top}")
+            if row['id_like']:
+                print(f"      {row['id_like_count']} ID-like values, e.g. {', '.join(row['id_like'][:3])}")
+
+        if volume is not None:
+            print("")
+            print(f"💾 Bytes per stream (top {self.top})")
+            total = sum(size for _, size in volume) or 1
+            for labels, size in sorted(volume, key=lambda row: row[1], reverse=True)[:self.top]:
+                print(f"  {format_bytes(size):>9}  {size / total * 100:4.0f}%  {render_labels(labels)}")
+
+        if promtail:
+            print("")
+            print("🚚 Promtail (counters since start)")
+            for url, stats in promtail.items():
+                if 'error' in stats:
+                    print(f"  ❌ {url}: {stats['error']}")
+                    continue
+                per_request = stats['sent_entries'] / stats['requests'] if stats['requests'] else 0
+                dropped = sum(stats['dropped'].values())
+                print(f"  {url}")
+                print(f"    sent {stats['sent_entries']:.0f} lines ({format_bytes(stats['sent_bytes'])}) in "
+                      f"{stats['requests']:.0f} pushes, {per_request:.0f} lines/push")
+                if stats['failed_entries']:
+                    print(f"    ❌ {stats['failed_entries']:.0f} lines failed to send")
+                if dropped:
+                    share = dropped / (dropped + stats['sent_entries']) * 100
+                    reasons = ', '.join(f"{reason} {count:.0f}" for reason, count in stats['dropped'].most_common())
+                    print(f"    dropped {dropped:.0f} lines ({share:.0f}%): {reasons}")
+
+    def to_dict(self, volume=None, promtail=None):
+        result = {
+            'streams': len(self.streams),
+            'labels': self.labels(),
+            'streams_by_job': self.streams_by('job'),
+            'streams_by_host': self.streams_by('host'),
+        }
+        if volume is not None:
+            result['volume'] = [{'labels': labels, 'bytes': size} for labels, size in volume]
+        if promtail:
+            result['promtail'] = {url: dict(stats, dropped=dict(stats.get('dropped', {})))
+                                  for url, stats in promtail.items()}
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the label sets Promtail sends to Loki')
+    parser.add_argument('--loki-url', default=os.environ.get('LOKI_URL', 'http://192.168.1.12:3100'),
+                        help='Loki base URL (or set LOKI_URL)')
+    parser.add_argument('--selector', default='{job=~".+"}', help='Stream selector to report on')
+    parser.add_argument('--since', default='1h', help='Time range to look at, e.g. 1h or 7d')
+    parser.add_argument('--top', type=int, default=10, help='Rows per section')
+    parser.add_argument('--max-values', type=int, default=50, help='Flag labels with more distinct values')
+    parser.add_argument('--volume', action='store_true', help='Also query bytes per stream (expensive on long ranges)')
+    parser.add_argument('--volume-by', default='job,host,unit', help='Labels to group the volume query by')
+    parser.add_argument('--promtail', action='append', default=[], metavar='URL',
+                        help='Promtail base URL to read pipeline and client counters from (repeatable)')
+    parser.add_argument('--json', help='Also write the report as JSON to this file')
+
+    args = parser.parse_args()
+
+    loki = LokiClient(args.loki_url)
+    end = time.time()
+    try:
+        streams = loki.series(args.selector, end - parse_duration(args.since), end)
+        volume = loki.volume(args.selector, args.since, args.volume_by.split(',')) if args.volume else None
+    except (urllib.error.URLError, RuntimeError, ValueError) as e:
+        print(f"❌ Cannot query Loki at {args.loki_url}: {e}")
+        sys.exit(1)
+
+    promtail = {}
+    for url in args.promtail:
+        try:
+            promtail[url] = scrape_promtail(url)
+        except (urllib.error.URLError, OSError) as e:
+            promtail[url] = {'error': str(e)}
+
+    report = CardinalityReport(streams, args.top, args.max_values)
+    report.print_report(volume, promtail)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.to_dict(volume, promtail), f, indent=2)
+        print(f"\n✅ Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Prometheus Long-Term Rollup Job
+===============================
+
+Downsamples selected series from the main Prometheus into 5-minute and
+1-hour aggregates and backfills them into a separate rollup TSDB, which a
+second Prometheus instance serves to Grafana ("Prometheus Rollup" datasource).
+The raw TSDB keeps its short retention while the rollups can be kept for a
+year at a fraction of the size.
+
+For every rule and resolution the job:
+
+1. Queries /api/v1/query_range for <agg>_over_time((<expr>)[<res>:]) from the
+   last completed bucket up to the newest complete one
+2. Writes the samples as OpenMetrics (<record>:<agg>{rollup="<res>"})
+3. Builds TSDB blocks with `promtool tsdb create-blocks-from openmetrics`
+   in a staging directory and moves them into the rollup data directory
+4. Records the new watermark so the next run only processes new buckets
+
+Usage:
+    python3 prometheus-rollup.py --config /etc/prometheus/rollup.json
+    python3 prometheus-rollup.py --config rollup.json --dry-run
+
+Requirements:
+    None (standard library only); promtool
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+# Stay well under Prometheus' 11000 points-per-series query limit
+MAX_POINTS_PER_QUERY = 10000
+
+DEFAULT_CONFIG = {
+    'source_url': 'http://localhost:9090',
+    'data_dir': '/var/lib/prometheus-rollup',
+    'state_file': None,
+    'promtool': 'promtool',
+    'scrape_interval': '15s',
+    'resolutions': ['5m', '1h'],
+    'max_backfill': '7d',
+    'rules': [],
+}
+
+
+def parse_duration(value):
+    """Convert a Prometheus duration such as 5m or 1h30m to seconds"""
+    parts = re.findall(r'(\d+)([smhdwy])', str(value))
+    if not parts:
+        raise ValueError(f"Invalid duration: {value}")
+    return sum(int(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusRollup:
+    def __init__(self, config, dry_run=False, timeout=60):
+        self.config = config
+        self.source_url = config['source_url'].rstrip('/')
+        self.data_dir = config['data_dir']
+        self.state_file = config['state_file'] or os.path.join(self.data_dir, 'rollup-state.json')
+        self.promtool = config['promtool']
+        self.scrape_interval = config['scrape_interval']
+        self.max_backfill = parse_duration(config['max_backfill'])
+        self.dry_run = dry_run
+        self.timeout = timeout
+
+    def load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_state(self, state):
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_file)
+
+    def query_range(self, query, start, end, step):
+        """Run a range query and return the result matrix"""
+        params = urllib.parse.urlencode({'query': query, 'start': start, 'end': end, 'step': step})
+        request = urllib.request.Request(f"{self.source_url}/api/v1/query_range", data=params.encode(),
+                                         headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.load(response)
+        if payload.get('status') != 'success':
+            raise RuntimeError(f"Query failed: {payload.get('error', 'unknown error')}")
+        return payload['data']['result']
+
+    def window(self, resolution, state, now):
+        """Bucket end timestamps (first, last) still to be processed for a resolution"""
+        step = parse_duration(resolution)
+        last_complete = math.floor(now / step) * step
+        done = state.get(resolution)
+        if done is None:
+            first = last_complete - math.floor(self.max_backfill / step) * step + step
+        else:
+            first = done + step
+        return first, last_complete, step
+
+    def collect(self, resolution, first, last, step):
+        """Query every rule for one resolution; returns {metric name: [(labels, ts, value)]}"""
+        families = {}
+        chunk = step * MAX_POINTS_PER_QUERY
+        for rule in self.config['rules']:
+            for agg in rule.get('aggregations', ['avg']):
+                name = f"{rule['record']}:{agg}"
+                query = f"{agg}_over_time(({rule['expr']})[{resolution}:{self.scrape_interval}])"
+                start = first
+                while start <= last:
+                    end = min(start + chunk - step, last)
+                    for series in self.query_range(query, start, end, step):
+                        labels = dict(series['metric'])
+                        labels.pop('__name__', None)
+                        labels['rollup'] = resolution
+                        for ts, value in series['values']:
+                            value = float(value)
+                            if math.isnan(value):
+                                continue
+                            families.setdefault(name, []).append((labels, float(ts), value))
+                    start = end + step
+        return families
+
+    @staticmethod
+    def write_openmetrics(families, path):
+        """Write samples grouped by family and series, timestamps ascending"""
+        count = 0
+        with open(path, 'w') as f:
+            for name in sorted(families):
+                f.write(f"# TYPE {name} gauge\n")
+                samples = sorted(families[name], key=lambda s: (sorted(s[0].items()), s[1]))
+                for labels, ts, value in samples:
+                    rendered = ','.join(f'{k}="{escape_label_value(v)}"' for k, v in sorted(labels.items()))
+                    f.write(f"{name}{{{rendered}}} {value!r} {ts:.3f}\n")
+                    count += 1
+            f.write("# EOF\n")
+        return count
+
+    def backfill(self, openmetrics_path):
+        """Create blocks in a staging dir on the same filesystem, then move them in atomically"""
+        # Prometheus only loads ULID-named directories, so the staging dir is ignored
+        staging = tempfile.mkdtemp(prefix='.rollup-staging-', dir=self.data_dir)
+        try:
+            subprocess.run([self.promtool, 'tsdb', 'create-blocks-from', 'openmetrics',
+                            openmetrics_path, staging], check=True, stdout=subprocess.DEVNULL)
+            blocks = [b for b in os.listdir(staging) if os.path.isdir(os.path.join(staging, b))]
+            for block in blocks:
+                os.rename(os.path.join(staging, block), os.path.join(self.data_dir, block))
+            return blocks
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def run(self):
+        if not self.config['rules']:
+            print("⚠️  No rollup rules configured")
+            return True
+
+        state = self.load_state()
+        now = time.time()
+        for resolution in self.config['resolutions']:
+            first, last, step = self.window(resolution, state, now)
+            if first > last:
+                print(f"⏭️  {resolution}: no complete buckets since last run")
+                continue
+
+            started = time.monotonic()
+            families = self.collect(resolution, first, last, step)
+            with tempfile.NamedTemporaryFile('w', suffix='.om', delete=False) as tmp:
+                openmetrics_path = tmp.name
+            try:
+                samples = self.write_openmetrics(families, openmetrics_path)
+                if self.dry_run:
+                    print(f"🔍 {resolution}: {samples} samples in {len(families)} metrics "
+                          f"({time.strftime('%Y-%m-%d %H:%M', time.gmtime(first))} → "
+                          f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(last))} UTC)")
+                    continue
+                blocks = self.backfill(openmetrics_path) if samples else []
+            finally:
+                os.unlink(openmetrics_path)
+
+            state[resolution] = last
+            self.save_state(state)
+            print(f"✅ {resolution}: {samples} samples → {len(blocks)} block(s) "
+                  f"in {time.monotonic() - started:.1f}s")
+        return True
+
+
+def load_config(path):
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path) as f:
+            config.update(json.load(f))
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Downsample Prometheus series into a long-term rollup TSDB')
+    parser.add_argument('--config', help='JSON config with source_url, data_dir, resolutions and rules')
+    parser.add_argument('--source-url', help='Prometheus to read raw data from')
+    parser.add_argument('--data-dir', help='Data directory of the rollup Prometheus')
+    parser.add_argument('--promtool', help='Path to promtool')
+    parser.add_argument('--dry-run', action='store_true', help='Query and report, but do not write blocks')
+    parser.add_argument('--reset', action='store_true', help='Forget watermarks and backfill max_backfill again')
+
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    for key in ('source_url', 'data_dir', 'promtool'):
+        if getattr(args, key):
+            config[key] = getattr(args, key)
+
+    rollup = PrometheusRollup(config, dry_run=args.dry_run)
+    if args.reset and not args.dry_run and os.path.exists(rollup.state_file):
+        os.unlink(rollup.state_file)
+
+    try:
+        success = rollup.run()
+    except (urllib.error.URLError, RuntimeError, subprocess.CalledProcessError, OSError) as e:
+        print(f"❌ Rollup failed: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
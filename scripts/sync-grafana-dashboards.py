@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Grafana Dashboard Sync
+======================
+
+Idempotent, parallel importer for the dashboards in grafana-dashboards/.
+Instead of running the 60-grafana-dashboards playbook, this script talks to
+the Grafana HTTP API directly:
+
+1. Hash every local dashboard (volatile fields such as id/version excluded)
+2. Fetch the live version of each dashboard via /api/dashboards/uid/<uid>
+3. Push only new or changed dashboards, concurrently, over one pooled session
+
+Usage:
+    python3 sync-grafana-dashboards.py
+    python3 sync-grafana-dashboards.py --dry-run
+    python3 sync-grafana-dashboards.py --grafana-url http://192.168.1.12:3000 node-details.json
+
+Environment:
+    GRAFANA_URL, GRAFANA_USER, GRAFANA_PASSWORD or GRAFANA_TOKEN
+
+Requirements:
+    pip install requests
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DASHBOARDS_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), 'grafana-dashboards')
+
+# Same folder layout as import-grafana-dashboards.sh and 60-grafana-dashboards.yml
+FOLDER_MAPPING = {
+    'cluster-overview.json': 'Homelab',
+    'node-details.json': 'Homelab',
+    'service-health.json': 'Homelab',
+    'authentik-monitoring.json': 'Security',
+    'alert-dashboard.json': 'Alerts',
+}
+
+# Fields Grafana rewrites on every save; they must not affect the content hash
+VOLATILE_FIELDS = ('id', 'version', 'iteration')
+
+
+def dashboard_hash(dashboard):
+    """Stable hash of a dashboard model, ignoring fields Grafana manages"""
+    model = {k: v for k, v in dashboard.items() if k not in VOLATILE_FIELDS}
+    canonical = json.dumps(model, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def folder_uid(title):
+    """Folder UID convention used by the import playbook"""
+    return title.lower().replace(' ', '-')
+
+
+class GrafanaDashboardSync:
+    def __init__(self, grafana_url, user=None, password=None, token=None, workers=4, timeout=10):
+        self.base_url = grafana_url.rstrip('/')
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        # One keep-alive connection per worker, reused for every request
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+        elif user:
+            self.session.auth = (user, password or '')
+
+    def check_health(self):
+        """Verify Grafana is reachable before doing any work"""
+        try:
+            response = self.session.get(f"{self.base_url}/api/health", timeout=self.timeout)
+            return response.status_code == 200
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Cannot reach Grafana at {self.base_url}: {e}")
+            return False
+
+    def load_local(self, paths):
+        """Load local dashboards keyed by UID"""
+        dashboards = []
+        for path in paths:
+            filename = os.path.basename(path)
+            with open(path) as f:
+                data = json.load(f)
+            dashboard = data.get('dashboard', data)
+            if not dashboard.get('uid'):
+                print(f"⚠️  {filename}: no uid, skipping (a stable uid is required for idempotent sync)")
+                continue
+            dashboards.append({
+                'file': filename,
+                'uid': dashboard['uid'],
+                'title': dashboard.get('title', filename),
+                'folder': FOLDER_MAPPING.get(filename, 'General'),
+                'dashboard': dashboard,
+                'hash': dashboard_hash(dashboard),
+            })
+        return dashboards
+
+    def ensure_folders(self, folders):
+        """Create any missing folders; General is Grafana's built-in root"""
+        for title in sorted(set(folders) - {'General'}):
+            uid = folder_uid(title)
+            response = self.session.get(f"{self.base_url}/api/folders/{uid}", timeout=self.timeout)
+            if response.status_code == 200:
+                continue
+            response = self.session.post(f"{self.base_url}/api/folders", json={'title': title, 'uid': uid},
+                                         timeout=self.timeout)
+            if response.status_code in (200, 409, 412):
+                print(f"📁 Folder ready: {title}")
+            else:
+                raise RuntimeError(f"Could not create folder {title}: HTTP {response.status_code} {response.text}")
+
+    def fetch_live(self, item):
+        """Return (live hash, live folder uid) or (None, None) if the dashboard does not exist"""
+        response = self.session.get(f"{self.base_url}/api/dashboards/uid/{item['uid']}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None, None
+        response.raise_for_status()
+        payload = response.json()
+        meta = payload.get('meta', {})
+        return dashboard_hash(payload['dashboard']), meta.get('folderUid') or ''
+
+    def plan(self, item):
+        """Decide whether a dashboard needs to be pushed"""
+        live_hash, live_folder = self.fetch_live(item)
+        wanted_folder = '' if item['folder'] == 'General' else folder_uid(item['folder'])
+        if live_hash is None:
+            return 'create'
+        if live_hash != item['hash']:
+            return 'update'
+        if live_folder != wanted_folder:
+            return 'move'
+        return 'unchanged'
+
+    def push(self, item):
+        """Upload a dashboard via /api/dashboards/db"""
+        dashboard = dict(item['dashboard'])
+        dashboard['id'] = None
+        body = {
+            'dashboard': dashboard,
+            'overwrite': True,
+            'message': f"sync-grafana-dashboards: {item['file']} {item['hash'][:12]}",
+        }
+        if item['folder'] != 'General':
+            body['folderUid'] = folder_uid(item['folder'])
+        response = self.session.post(f"{self.base_url}/api/dashboards/db", json=body, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def sync_one(self, item, dry_run=False):
+        start = time.monotonic()
+        action = self.plan(item)
+        if action != 'unchanged' and not dry_run:
+            self.push(item)
+        return action, time.monotonic() - start
+
+    def run(self, paths, dry_run=False, force=False):
+        dashboards = self.load_local(paths)
+        if not dashboards:
+            print("❌ No dashboards to sync")
+            return False
+
+        if not dry_run:
+            self.ensure_folders(d['folder'] for d in dashboards)
+
+        start = time.monotonic()
+        failures = 0
+        counts = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            if force and not dry_run:
+                futures = {executor.submit(self.push, d): d for d in dashboards}
+            else:
+                futures = {executor.submit(self.sync_one, d, dry_run): d for d in dashboards}
+            for future in concurrent.futures.as_completed(futures):
+                item = futures[future]
+                try:
+                    result = future.result()
+                except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+                    failures += 1
+                    print(f"  ❌ {item['file']:28} failed: {e}")
+                    continue
+                action = 'forced' if force and not dry_run else result[0]
+                counts[action] = counts.get(action, 0) + 1
+                icon = '⏭️ ' if action == 'unchanged' else ('🔍' if dry_run else '✅')
+                print(f"  {icon} {item['file']:28} {action:9} → {item['folder']}")
+
+        elapsed = time.monotonic() - start
+        summary = ', '.join(f"{n} {a}" for a, n in sorted(counts.items())) or 'nothing'
+        print("")
+        print(f"Synced {len(dashboards)} dashboards in {elapsed:.2f}s: {summary}"
+              + (f", {failures} failed" if failures else "")
+              + (" (dry run)" if dry_run else ""))
+        return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync Grafana dashboards via the HTTP API, pushing only changes')
+    parser.add_argument('files', nargs='*', help='Dashboard files or names (default: all in grafana-dashboards/)')
+    parser.add_argument('--dashboards-dir', default=DEFAULT_DASHBOARDS_DIR, help='Directory with dashboard JSON')
+    parser.add_argument('--grafana-url', default=os.environ.get('GRAFANA_URL', 'http://192.168.1.12:3000'),
+                        help='Grafana base URL')
+    parser.add_argument('--grafana-user', default=os.environ.get('GRAFANA_USER', 'admin'), help='Grafana username')
+    parser.add_argument('--grafana-password', default=os.environ.get('GRAFANA_PASSWORD', 'admin'),
+                        help='Grafana password')
+    parser.add_argument('--grafana-token', default=os.environ.get('GRAFANA_TOKEN'),
+                        help='Service account token (takes precedence over user/password)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent API requests')
+    parser.add_argument('--timeout', type=float, default=10, help='Per-request timeout in seconds')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    parser.add_argument('--force', action='store_true', help='Push every dashboard without comparing')
+
+    args = parser.parse_args()
+
+    if args.files:
+        paths = [f if os.path.exists(f) else os.path.join(args.dashboards_dir, os.path.basename(f)) for f in args.files]
+        paths = [p if p.endswith('.json') else f"{p}.json" for p in paths]
+    else:
+        paths = sorted(glob.glob(os.path.join(args.dashboards_dir, '*.json')))
+
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        print(f"❌ Dashboard file(s) not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    syncer = GrafanaDashboardSync(
+        args.grafana_url,
+        user=args.grafana_user,
+        password=args.grafana_password,
+        token=args.grafana_token,
+        workers=args.workers,
+        timeout=args.timeout,
+    )
+
+    print(f"🔄 Syncing dashboards to {syncer.base_url}")
+    if not syncer.check_health():
+        sys.exit(1)
+
+    try:
+        success = syncer.run(paths, dry_run=args.dry_run, force=args.force)
+    except KeyboardInterrupt:
+        print("\n⚠️  Sync interrupted by user")
+        sys.exit(1)
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        print(f"\n❌ Sync failed: {e}")
+        sys.exit(1)
+
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Prometheus Alert Rule Tests and Evaluation Benchmark
+====================================================
+
+Checks the alert rules in ansible/roles/prometheus/files/alerts before they
+are deployed:
+
+1. `promtool check rules` on every rule file
+2. Coverage: every alert must fire in at least one test of
+   ansible/roles/prometheus/tests/*.test.yml
+3. `promtool test rules` on the test files (synthetic series fixtures)
+
+With --benchmark it also measures how expensive the rules are on data shaped
+like the fleet:
+
+4. Generates node_exporter-like series for --instances hosts (default: the
+   `pis` group of the production inventory) over --hours of history and turns
+   them into TSDB blocks with `promtool tsdb create-blocks-from openmetrics`
+5. Starts a throwaway Prometheus on those blocks with the rule groups
+   evaluated every --eval-interval and GOMAXPROCS=--gomaxprocs (the production
+   container is limited to half a CPU)
+6. Reads the group and rule evaluation times from /api/v1/rules over
+   --rounds evaluations, and the samples each rule touches from
+   /api/v1/query?stats=all
+7. Fails if a group's p95 evaluation takes more than --budget of its
+   production interval or a single rule more than --max-rule-ms
+
+Usage:
+    python3 test-alert-rules.py
+    python3 test-alert-rules.py --benchmark
+    python3 test-alert-rules.py --benchmark --instances 40 --hours 12 --json rules-bench.json
+
+Requirements:
+    PyYAML; promtool; prometheus for --benchmark
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import yaml
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_GLOB = os.path.join(REPO_DIR, 'ansible', 'roles', 'prometheus', 'files', 'alerts', '*.yml')
+TESTS_GLOB = os.path.join(REPO_DIR, 'ansible', 'roles', 'prometheus', 'tests', '*.test.yml')
+INVENTORY = os.path.join(REPO_DIR, 'ansible', 'inventories', 'prod', 'hosts.yml')
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+CPU_MODES = ['idle', 'user', 'system', 'iowait', 'irq', 'softirq', 'nice', 'steal']
+FILESYSTEMS = [
+    ('/dev/mmcblk0p2', 'ext4', '/', 64 * 2 ** 30),
+    ('/dev/mmcblk0p1', 'vfat', '/boot/firmware', 512 * 2 ** 20),
+    ('tmpfs', 'tmpfs', '/run', 800 * 2 ** 20),
+]
+SERVICE_JOBS = [('prometheus', 9090), ('grafana', 3000), ('loki', 3100)]
+
+
+def parse_duration(value):
+    """Convert a Prometheus duration such as 30s or 1m30s to seconds"""
+    value = str(value)
+    total, number = 0.0, ''
+    i = 0
+    while i < len(value):
+        if value[i].isdigit():
+            number += value[i]
+            i += 1
+            continue
+        unit = 'ms' if value[i:i + 2] == 'ms' else value[i]
+        if not number or unit not in DURATION_UNITS:
+            raise ValueError(f"Invalid duration: {value}")
+        total += int(number) * DURATION_UNITS[unit]
+        number = ''
+        i += len(unit)
+    if number:
+        raise ValueError(f"Invalid duration: {value}")
+    return total
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(share * (len(ordered) - 1))))]
+
+
+def fleet_size(inventory=INVENTORY, group='pis'):
+    """Number of hosts in an inventory group, or None if it cannot be read"""
+    try:
+        with open(inventory) as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError):
+        return None
+
+    def find(node):
+        if not isinstance(node, dict):
+            return None
+        for name, child in (node.get('children') or {}).items():
+            if name == group:
+                return child or {}
+            found = find(child)
+            if found is not None:
+                return found
+        return None
+
+    found = find(data.get('all', data))
+    return len(found.get('hosts') or {}) if found is not None else None
+
+
+class RuleTests:
+    """promtool check/test plus a coverage check of the alert names"""
+
+    def __init__(self, rule_files, test_files, promtool='promtool'):
+        self.rule_files = rule_files
+        self.test_files = test_files
+        self.promtool = promtool
+
+    def alerts(self):
+        names = {}
+        for path in self.rule_files:
+            with open(path) as f:
+                data = yaml.safe_load(f) or {}
+            for group in data.get('groups', []):
+                for rule in group.get('rules', []):
+                    if 'alert' in rule:
+                        names[rule['alert']] = os.path.relpath(path, REPO_DIR)
+        return names
+
+    def tested_alerts(self):
+        """Alert names with at least one test case that expects them to fire"""
+        fired = set()
+        for path in self.test_files:
+            with open(path) as f:
+                data = yaml.safe_load(f) or {}
+            for test in data.get('tests', []):
+                for case in test.get('alert_rule_test', []):
+                    if case.get('exp_alerts'):
+                        fired.add(case['alertname'])
+        return fired
+
+    def run_promtool(self, args):
+        proc = subprocess.run([self.promtool] + args, capture_output=True, text=True)
+        output = (proc.stdout + proc.stderr).strip()
+        return proc.returncode == 0, output
+
+    def run(self):
+        ok = True
+
+        print("🔍 Checking rule files")
+        passed, output = self.run_promtool(['check', 'rules'] + self.rule_files)
+        print(f"  {'✅' if passed else '❌'} {len(self.rule_files)} file(s)")
+        if not passed:
+            print('\n'.join(f"    {line}" for line in output.splitlines()))
+        ok &= passed
+
+        print("")
+        print("📋 Coverage")
+        untested = {name: path for name, path in self.alerts().items() if name not in self.tested_alerts()}
+        if untested:
+            for name, path in sorted(untested.items()):
+                print(f"  ❌ {name} ({path}) is never expected to fire in a test")
+            ok = False
+        else:
+            print(f"  ✅ All {len(self.alerts())} alerts have a firing test")
+
+        print("")
+        print("🧪 Unit tests")
+        if not self.test_files:
+            print("  ❌ No test files found")
+            return False
+        for path in self.test_files:
+            passed, output = self.run_promtool(['test', 'rules', path])
+            print(f"  {'✅' if passed else '❌'} {os.path.relpath(path, REPO_DIR)}")
+            if not passed:
+                print('\n'.join(f"    {line}" for line in output.splitlines()))
+            ok &= passed
+        return ok
+
+
+class FleetSeries:
+    """Deterministic node_exporter-like history for a number of hosts"""
+
+    def __init__(self, instances, cpus, hours, scrape_interval, seed=42, lead=1800):
+        self.instances = [f"pi-{i}" for i in range(instances)]
+        self.cpus = cpus
+        # Run past now so the rules still see fresh samples while the benchmark runs
+        self.end = int((time.time() + lead) // scrape_interval * scrape_interval)
+        self.start = self.end - int(hours * 3600)
+        self.step = scrape_interval
+        self.seed = seed
+
+    def timestamps(self):
+        return range(self.start, self.end + 1, self.step)
+
+    @staticmethod
+    def render(labels):
+        return ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+    def families(self):
+        """Yield (name, type, [(labels, [values])]) per metric family"""
+        count = len(self.timestamps())
+        rng = random.Random(self.seed)
+
+        up, cpu, load, mem_total, mem_avail, fs_size, fs_avail = [], [], [], [], [], [], []
+        for host in self.instances:
+            node = {'job': 'node_exporter', 'instance': f"{host}:9100"}
+            up.append((node, [1] * count))
+            busy = rng.uniform(0.05, 0.6)
+            for core in range(self.cpus):
+                # Mode shares of one second per second, idle takes the rest
+                shares = {mode: busy * rng.uniform(0.1, 1) / 4 for mode in CPU_MODES[1:]}
+                shares['idle'] = max(0.0, 1 - sum(shares.values()))
+                for mode in CPU_MODES:
+                    values, total = [], rng.uniform(0, 1e5)
+                    for _ in range(count):
+                        total += shares[mode] * self.step * rng.uniform(0.8, 1.2)
+                        values.append(round(total, 2))
+                    cpu.append((dict(node, cpu=str(core), mode=mode), values))
+            load.append((node, [round(busy * self.cpus * rng.uniform(0.7, 1.3), 2) for _ in range(count)]))
+            total_mem = 8 * 2 ** 30
+            mem_total.append((node, [total_mem] * count))
+            mem_avail.append((node, [int(total_mem * rng.uniform(0.2, 0.7)) for _ in range(count)]))
+            for device, fstype, mountpoint, size in FILESYSTEMS:
+                labels = dict(node, device=device, fstype=fstype, mountpoint=mountpoint)
+                used = rng.uniform(0.1, 0.8)
+                fs_size.append((labels, [size] * count))
+                fs_avail.append((labels, [int(size * (1 - used))] * count))
+
+        monitoring = self.instances[0]
+        for job, port in SERVICE_JOBS:
+            up.append(({'job': job, 'instance': f"{monitoring}:{port}"}, [1] * count))
+
+        yield 'up', 'gauge', up
+        yield 'node_cpu_seconds', 'counter', cpu
+        yield 'node_load1', 'gauge', load
+        yield 'node_memory_MemTotal_bytes', 'gauge', mem_total
+        yield 'node_memory_MemAvailable_bytes', 'gauge', mem_avail
+        yield 'node_filesystem_size_bytes', 'gauge', fs_size
+        yield 'node_filesystem_avail_bytes', 'gauge', fs_avail
+
+    def write_openmetrics(self, path):
+        """Write all families; counters get the _total suffix on their samples"""
+        series = samples = 0
+        timestamps = list(self.timestamps())
+        with open(path, 'w') as f:
+            for name, kind, members in self.families():
+                f.write(f"# TYPE {name} {kind}\n")
+                sample_name = f"{name}_total" if kind == 'counter' else name
+                for labels, values in members:
+                    rendered = self.render(labels)
+                    for ts, value in zip(timestamps, values):
+                        f.write(f"{sample_name}{{{rendered}}} {value} {ts}\n")
+                    series += 1
+                    samples += len(values)
+            f.write("# EOF\n")
+        return series, samples
+
+
+class RuleBenchmark:
+    """Evaluates the rule groups on a generated TSDB and collects timings"""
+
+    def __init__(self, rule_files, args):
+        self.rule_files = rule_files
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix='rule-bench-')
+        self.port = None
+        self.process = None
+        # Production interval per group, before the benchmark shortens it
+        self.intervals = {}
+
+    def build_tsdb(self):
+        series = FleetSeries(self.args.instances, self.args.cpus, self.args.hours,
+                             int(parse_duration(self.args.scrape_interval)), self.args.seed)
+        openmetrics_path = os.path.join(self.workdir, 'fleet.om')
+        count, samples = series.write_openmetrics(openmetrics_path)
+        print(f"  📦 {count} series, {samples} samples ({self.args.instances} hosts × {self.args.hours:g}h)")
+
+        data_dir = os.path.join(self.workdir, 'data')
+        started = time.monotonic()
+        subprocess.run([self.args.promtool, 'tsdb', 'create-blocks-from', 'openmetrics',
+                        openmetrics_path, data_dir], check=True, stdout=subprocess.DEVNULL)
+        os.unlink(openmetrics_path)
+        print(f"  🧱 TSDB blocks created in {time.monotonic() - started:.1f}s")
+        return data_dir
+
+    def write_config(self):
+        """Copy the rule files with the benchmark interval and write prometheus.yml"""
+        rules_dir = os.path.join(self.workdir, 'rules')
+        os.makedirs(rules_dir)
+        for path in self.rule_files:
+            with open(path) as f:
+                data = yaml.safe_load(f) or {}
+            for group in data.get('groups', []):
+                self.intervals[group['name']] = parse_duration(group.get('interval', '1m'))
+                group['interval'] = self.args.eval_interval
+            with open(os.path.join(rules_dir, os.path.basename(path)), 'w') as f:
+                yaml.safe_dump(data, f, sort_keys=False)
+
+        config_path = os.path.join(self.workdir, 'prometheus.yml')
+        with open(config_path, 'w') as f:
+            yaml.safe_dump({
+                'global': {'evaluation_interval': self.args.eval_interval},
+                'rule_files': [os.path.join(rules_dir, '*.yml')],
+            }, f, sort_keys=False)
+        return config_path
+
+    def start(self, config_path, data_dir):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        env = dict(os.environ, GOMAXPROCS=str(self.args.gomaxprocs))
+        log = open(os.path.join(self.workdir, 'prometheus.log'), 'w')
+        self.process = subprocess.Popen([
+            self.args.prometheus,
+            f'--config.file={config_path}',
+            f'--storage.tsdb.path={data_dir}',
+            '--storage.tsdb.retention.time=30d',
+            f'--web.listen-address=127.0.0.1:{self.port}',
+        ], stdout=log, stderr=subprocess.STDOUT, env=env)
+
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"prometheus exited, see {log.name}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{self.port}/-/ready", timeout=2):
+                    return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.5)
+        raise RuntimeError("prometheus did not become ready within 60s")
+
+    def api(self, path, **params):
+        url = f"http://127.0.0.1:{self.port}/api/v1/{path}"
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            payload = json.load(response)
+        if payload.get('status') != 'success':
+            raise RuntimeError(f"API error: {payload.get('error', 'unknown error')}")
+        return payload['data']
+
+    def collect(self):
+        """Evaluation times per group and rule over --rounds evaluations"""
+        groups, rules, seen = {}, {}, set()
+        interval = parse_duration(self.args.eval_interval)
+        deadline = time.monotonic() + interval * (self.args.rounds + 5)
+        while time.monotonic() < deadline:
+            for group in self.api('rules')['groups']:
+                key = (group['name'], group.get('lastEvaluation'))
+                if not group.get('lastEvaluation', '').startswith('0001') and key not in seen:
+                    seen.add(key)
+                    groups.setdefault(group['name'], []).append(group['evaluationTime'])
+                    for rule in group['rules']:
+                        rules.setdefault((group['name'], rule['name']), {
+                            'query': rule['query'], 'times': []})['times'].append(rule['evaluationTime'])
+            if groups and min(len(times) for times in groups.values()) >= self.args.rounds:
+                break
+            time.sleep(interval / 2)
+        return groups, rules
+
+    def samples_touched(self, query):
+        try:
+            data = self.api('query', query=query, stats='all')
+        except (urllib.error.URLError, RuntimeError):
+            return None
+        return data.get('stats', {}).get('samples', {}).get('totalQueryableSamples')
+
+    def run(self):
+        try:
+            print("🏗️  Generating fleet TSDB")
+            data_dir = self.build_tsdb()
+            config_path = self.write_config()
+            print(f"  🚀 Starting Prometheus (GOMAXPROCS={self.args.gomaxprocs}, "
+                  f"rules every {self.args.eval_interval})")
+            self.start(config_path, data_dir)
+            groups, rules = self.collect()
+            if not groups:
+                raise RuntimeError("no rule group was evaluated")
+            for rule in rules.values():
+                rule['samples'] = self.samples_touched(rule['query'])
+            return self.summarize(groups, rules)
+        finally:
+            if self.process:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            if self.args.keep:
+                print(f"  📁 Kept {self.workdir}")
+            else:
+                shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def summarize(self, groups, rules):
+        result = {'groups': [], 'rules': []}
+        for name, times in groups.items():
+            p95 = percentile(times, 0.95)
+            interval = self.intervals.get(name, 60)
+            result['groups'].append({
+                'group': name, 'rounds': len(times), 'interval': interval,
+                'median_ms': statistics.median(times) * 1000, 'p95_ms': p95 * 1000,
+                'max_ms': max(times) * 1000, 'share': p95 / interval,
+                'over_budget': p95 / interval > self.args.budget,
+            })
+        for (group, name), rule in rules.items():
+            p95 = percentile(rule['times'], 0.95)
+            result['rules'].append({
+                'group': group, 'rule': name, 'median_ms': statistics.median(rule['times']) * 1000,
+                'p95_ms': p95 * 1000, 'samples': rule['samples'],
+                'over_budget': p95 * 1000 > self.args.max_rule_ms,
+            })
+        result['rules'].sort(key=lambda row: row['p95_ms'], reverse=True)
+        return result
+
+    def print_report(self, result):
+        print("")
+        print(f"⏱️  Rule groups (budget: p95 ≤ {self.args.budget * 100:g}% of the production interval)")
+        for row in result['groups']:
+            flag = '❌' if row['over_budget'] else '✅'
+            print(f"  {flag} {row['group']:20} every {row['interval']:g}s  median {row['median_ms']:7.2f}ms  "
+                  f"p95 {row['p95_ms']:7.2f}ms  max {row['max_ms']:7.2f}ms  "
+                  f"({row['share'] * 100:.2f}%, {row['rounds']} rounds)")
+
+        print("")
+        print(f"🐢 Rules by p95 evaluation time (budget {self.args.max_rule_ms:g}ms)")
+        for row in result['rules']:
+            flag = '❌' if row['over_budget'] else '  '
+            samples = f"{row['samples']:>9}" if row['samples'] is not None else '        ?'
+            print(f"  {flag} {row['p95_ms']:7.2f}ms  {samples} samples  {row['rule']:18} [{row['group']}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Unit-test the Prometheus alert rules and benchmark their evaluation')
+    parser.add_argument('--rules', default=RULES_GLOB, help='Glob of rule files')
+    parser.add_argument('--tests', default=TESTS_GLOB, help='Glob of promtool test files')
+    parser.add_argument('--promtool', default='promtool', help='Path to promtool')
+    parser.add_argument('--skip-tests', action='store_true', help='Only run the benchmark')
+    parser.add_argument('--benchmark', action='store_true', help='Measure rule evaluation time on a generated TSDB')
+    parser.add_argument('--prometheus', default='prometheus', help='Path to the prometheus binary')
+    parser.add_argument('--instances', type=int, default=fleet_size() or 4,
+                        help='Hosts to generate series for (default: pis group of the production inventory)')
+    parser.add_argument('--cpus', type=int, default=4, help='CPU cores per host')
+    parser.add_argument('--hours', type=float, default=6, help='Hours of history to generate')
+    parser.add_argument('--scrape-interval', default='15s', help='Interval of the generated samples')
+    parser.add_argument('--eval-interval', default='2s', help='Rule evaluation interval during the benchmark')
+    parser.add_argument('--rounds', type=int, default=20, help='Evaluations to measure per group')
+    parser.add_argument('--gomaxprocs', type=int, default=1, help='GOMAXPROCS for the benchmark Prometheus')
+    parser.add_argument('--budget', type=float, default=0.01,
+                        help='Max share of its production interval a group evaluation may take')
+    parser.add_argument('--max-rule-ms', type=float, default=100, help='Max p95 evaluation time of one rule')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the generated series')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark TSDB and Prometheus log')
+    parser.add_argument('--json', help='Write the benchmark results as JSON to this file')
+
+    args = parser.parse_args()
+
+    rule_files = sorted(glob.glob(args.rules))
+    test_files = sorted(glob.glob(args.tests))
+    if not rule_files:
+        print(f"❌ No rule files match {args.rules}")
+        sys.exit(1)
+
+    ok = True
+    if not args.skip_tests:
+        try:
+            ok = RuleTests(rule_files, test_files, args.promtool).run()
+        except FileNotFoundError as e:
+            print(f"❌ {e.filename} not found; install promtool or pass --promtool")
+            sys.exit(1)
+
+    if args.benchmark:
+        print("")
+        benchmark = RuleBenchmark(rule_files, args)
+        try:
+            result = benchmark.run()
+        except (FileNotFoundError, RuntimeError, subprocess.CalledProcessError, urllib.error.URLError) as e:
+            print(f"❌ Benchmark failed: {e}")
+            sys.exit(1)
+        benchmark.print_report(result)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(result, f, indent=2)
+            print(f"\n✅ Results saved to {args.json}")
+        ok &= not any(row['over_budget'] for row in result['groups'] + result['rules'])
+
+    print("")
+    print("✅ All rule checks passed" if ok else "❌ Rule checks failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+ForwardAuth Cache Test
+======================
+
+Runs forwardauth-cache.py against a fake Authentik outpost on localhost and
+checks which decisions it caches:
+
+1. A made-up session cookie sent to a skip/unauthenticated path gets the
+   outpost's 200, but that reply is not cached, so the same cookie is still
+   redirected to the login flow on protected paths
+2. A valid session is cached: the second request to a protected path is a
+   cache hit answered without the outpost
+3. Redirects to the login flow are never cached
+
+Usage:
+    python3 test-forwardauth-cache.py
+
+Requirements:
+    None (standard library only)
+"""
+
+import http.client
+import http.server
+import importlib.util
+import os
+import sys
+import threading
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AUTH_PATH = '/outpost.goauthentik.io/auth/traefik'
+VALID_COOKIE = 'authentik_proxy_a1b2=valid-session'
+FORGED_COOKIE = 'authentik_proxy_x=junk'
+
+
+def load_cache_module():
+    spec = importlib.util.spec_from_file_location('forwardauth_cache', os.path.join(SCRIPT_DIR, 'forwardauth-cache.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeOutpost(http.server.BaseHTTPRequestHandler):
+    """Answers like the proxy outpost: /public is a skip path, everything else needs a session"""
+    protocol_version = 'HTTP/1.1'
+    calls = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, headers):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        FakeOutpost.calls += 1
+        uri = self.headers.get('X-Forwarded-Uri', '/')
+        if uri.startswith('/public'):
+            self.reply(200, [])
+        elif VALID_COOKIE in self.headers.get('Cookie', ''):
+            self.reply(200, [('X-authentik-username', 'alice')])
+        else:
+            self.reply(302, [('Location', 'https://auth.example/flows/login')])
+
+
+class CacheTest:
+    def __init__(self):
+        module = load_cache_module()
+        self.outpost = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeOutpost)
+        upstream = f"http://127.0.0.1:{self.outpost.server_address[1]}"
+        self.cache = module.ForwardAuthCacheServer(('127.0.0.1', 0), upstream, 30, 100, 'authentik_proxy_', 5)
+        for server in (self.outpost, self.cache):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.failures = 0
+
+    def request(self, cookie, uri):
+        """Returns (status, cache state, outpost calls) for one ForwardAuth request"""
+        before = FakeOutpost.calls
+        conn = http.client.HTTPConnection('127.0.0.1', self.cache.server_address[1], timeout=5)
+        conn.request('GET', AUTH_PATH, headers={
+            'Cookie': cookie, 'X-Forwarded-Host': 'grafana.example',
+            'X-Forwarded-Method': 'GET', 'X-Forwarded-Uri': uri,
+        })
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        return response.status, response.getheader('X-Forwardauth-Cache'), FakeOutpost.calls - before
+
+    def check(self, description, actual, expected):
+        if actual == expected:
+            print(f"  ✅ {description}")
+        else:
+            print(f"  ❌ {description}: got {actual}, expected {expected}")
+            self.failures += 1
+
+    def run(self):
+        print("🧪 ForwardAuth cache decisions")
+
+        self.check("forged cookie on a skip path passes through",
+                   self.request(FORGED_COOKIE, '/public/health'), (200, 'bypass', 1))
+        self.check("forged cookie on a protected path is redirected to login",
+                   self.request(FORGED_COOKIE, '/d/home'), (302, 'bypass', 1))
+        self.check("forged cookie stays uncached on repeat",
+                   self.request(FORGED_COOKIE, '/d/home'), (302, 'bypass', 1))
+
+        self.check("valid session is fetched from the outpost once",
+                   self.request(VALID_COOKIE, '/d/home'), (200, 'miss', 1))
+        self.check("valid session is then a cache hit on other paths",
+                   self.request(VALID_COOKIE, '/api/ds/query'), (200, 'hit', 0))
+
+        self.cache.shutdown()
+        self.outpost.shutdown()
+        return self.failures == 0
+
+
+def main():
+    if not CacheTest().run():
+        sys.exit(1)
+    print("\n✅ All ForwardAuth cache tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Traefik Access Log Analyzer
+===========================
+
+Streams Traefik's JSON access log and turns it into per-route latency data
+that the built-in router/service metrics cannot provide:
+
+- Request latency per router and normalised path (/api/dashboards/uid/abc123
+  becomes /api/dashboards/uid/:id)
+- Upstream latency per backend server (OriginDuration)
+- Traefik overhead per router (Duration - OriginDuration), which on routers
+  behind the Authentik middleware is dominated by the ForwardAuth round trip
+
+Latencies are kept as cumulative histograms, so Prometheus can compute any
+percentile over any window with histogram_quantile(). The report mode prints
+p50/p95/p99 tables directly.
+
+Requires the JSON access log format (traefik_access_log_json: true in the
+ingress role).
+
+Usage:
+    # Follow the live log and serve /metrics for Prometheus
+    python3 traefik-access-analyzer.py --file /var/log/traefik/access.log --listen 0.0.0.0:9105
+
+    # One-shot report from a log file or from Loki
+    python3 traefik-access-analyzer.py --file access.log --report --auth-routers 'grafana-*'
+    python3 traefik-access-analyzer.py --loki-url http://192.168.1.12:3100 --since 1h --report
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import fnmatch
+import http.server
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+# Histogram buckets in seconds, tuned for a homelab on Pis (5ms .. 30s)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Path segments that identify a resource rather than a route
+ID_SEGMENT_RE = re.compile(
+    r'^(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{16,}|[A-Za-z0-9_-]{24,})$',
+    re.IGNORECASE,
+)
+
+# Grafana UIDs and similar short random slugs: mixed letters and digits
+SLUG_SEGMENT_RE = re.compile(r'^(?=.*\d)(?=.*[A-Za-z])[A-Za-z0-9_-]{8,}$')
+
+OVERFLOW_PATH = '/:other'
+
+
+def normalize_path(path, depth):
+    """Strip the query string, replace IDs with :id and cut the path to `depth` segments"""
+    path = path.split('?', 1)[0] or '/'
+    segments = [s for s in path.split('/') if s]
+    normalized = []
+    for segment in segments[:depth]:
+        if ID_SEGMENT_RE.match(segment) or SLUG_SEGMENT_RE.match(segment):
+            normalized.append(':id')
+        else:
+            normalized.append(segment)
+    if len(segments) > depth:
+        normalized.append('*')
+    return '/' + '/'.join(normalized)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.total += seconds
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside the bucket, like histogram_quantile()"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if seen + count >= rank and count:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return BUCKETS[-1]
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class AccessLogStats:
+    """Aggregates access log entries; safe to feed from one thread and render from others"""
+
+    def __init__(self, path_depth=3, max_paths=50, auth_routers=()):
+        self.path_depth = path_depth
+        self.max_paths = max_paths
+        self.auth_routers = list(auth_routers)
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.upstreams = {}
+        self.overhead = {}
+        self.status = {}
+        self.denied = {}
+        self.paths_per_router = {}
+        self.parse_errors = 0
+        self.entries = 0
+
+    def is_auth_router(self, router):
+        return any(fnmatch.fnmatch(router, pattern) for pattern in self.auth_routers)
+
+    def route_path(self, router, raw_path):
+        """Normalised path, folded into /:other once a router has max_paths distinct paths"""
+        path = normalize_path(raw_path, self.path_depth)
+        known = self.paths_per_router.setdefault(router, set())
+        if path not in known:
+            if len(known) >= self.max_paths:
+                return OVERFLOW_PATH
+            known.add(path)
+        return path
+
+    def observe_line(self, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            entry = json.loads(line)
+            duration = entry['Duration'] / 1e9
+        except (ValueError, KeyError, TypeError):
+            with self.lock:
+                self.parse_errors += 1
+            return
+        self.observe(entry, duration)
+
+    def observe(self, entry, duration):
+        router = entry.get('RouterName') or 'unrouted'
+        origin = (entry.get('OriginDuration') or 0) / 1e9
+        overhead = (entry.get('Overhead') or 0) / 1e9 if 'Overhead' in entry else max(duration - origin, 0.0)
+        status = entry.get('DownstreamStatus') or 0
+        code = f"{status // 100}xx" if status else 'none'
+
+        with self.lock:
+            self.entries += 1
+            path = self.route_path(router, entry.get('RequestPath') or '/')
+            self.routes.setdefault((router, path), Histogram()).observe(duration)
+            self.overhead.setdefault(router, Histogram()).observe(overhead)
+            self.status[(router, code)] = self.status.get((router, code), 0) + 1
+            if entry.get('ServiceURL') and entry.get('OriginStatus'):
+                key = (entry.get('ServiceName') or 'unknown', entry['ServiceURL'])
+                self.upstreams.setdefault(key, Histogram()).observe(origin)
+            elif status in (302, 401, 403) and self.is_auth_router(router):
+                # Rejected by ForwardAuth before reaching the backend
+                self.denied[router] = self.denied.get(router, 0) + 1
+
+    def render_metrics(self):
+        lines = []
+        with self.lock:
+            lines += [
+                '# HELP traefik_access_request_duration_seconds Request latency by router and normalised path',
+                '# TYPE traefik_access_request_duration_seconds histogram',
+            ]
+            for (router, path), histogram in sorted(self.routes.items()):
+                labels = f'router="{escape_label_value(router)}",path="{escape_label_value(path)}"'
+                lines += histogram.render('traefik_access_request_duration_seconds', labels)
+            lines += [
+                '# HELP traefik_access_upstream_duration_seconds Backend response time by service and server',
+                '# TYPE traefik_access_upstream_duration_seconds histogram',
+            ]
+            for (service, server), histogram in sorted(self.upstreams.items()):
+                labels = f'service="{escape_label_value(service)}",server="{escape_label_value(server)}"'
+                lines += histogram.render('traefik_access_upstream_duration_seconds', labels)
+            lines += [
+                '# HELP traefik_access_overhead_seconds Time spent in Traefik and middlewares (incl. ForwardAuth)',
+                '# TYPE traefik_access_overhead_seconds histogram',
+            ]
+            for router, histogram in sorted(self.overhead.items()):
+                labels = (f'router="{escape_label_value(router)}",'
+                          f'forwardauth="{str(self.is_auth_router(router)).lower()}"')
+                lines += histogram.render('traefik_access_overhead_seconds', labels)
+            lines += [
+                '# HELP traefik_access_requests_total Requests by router and status class',
+                '# TYPE traefik_access_requests_total counter',
+            ]
+            for (router, code), count in sorted(self.status.items()):
+                lines.append(f'traefik_access_requests_total{{router="{escape_label_value(router)}",code="{code}"}} '
+                             f'{count}')
+            lines += [
+                '# HELP traefik_access_forwardauth_denied_total Requests rejected by ForwardAuth',
+                '# TYPE traefik_access_forwardauth_denied_total counter',
+            ]
+            for router, count in sorted(self.denied.items()):
+                lines.append(f'traefik_access_forwardauth_denied_total{{router="{escape_label_value(router)}"}} {count}')
+            lines += [
+                '# HELP traefik_access_parse_errors_total Log lines that were not JSON access log entries',
+                '# TYPE traefik_access_parse_errors_total counter',
+                f'traefik_access_parse_errors_total {self.parse_errors}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def print_report(self, top):
+        def ms(seconds):
+            return f"{seconds * 1000:8.1f}"
+
+        with self.lock:
+            print(f"📊 {self.entries} requests analysed, {self.parse_errors} unparseable lines")
+            if self.parse_errors and not self.entries:
+                print("⚠️  No JSON entries found - is traefik_access_log_json enabled?")
+                return
+
+            print("")
+            print(f"🐢 Slowest routes by p95 (top {top})")
+            print(f"  {'router':28} {'path':36} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            ranked = sorted(self.routes.items(), key=lambda kv: kv[1].quantile(0.95), reverse=True)
+            for (router, path), h in ranked[:top]:
+                print(f"  {router[:28]:28} {path[:36]:36} {h.count:7d} "
+                      f"{ms(h.quantile(0.5))} {ms(h.quantile(0.95))} {ms(h.quantile(0.99))}")
+
+            print("")
+            print(f"🖥️  Slowest upstreams by p95 (top {top})")
+            print(f"  {'service':28} {'server':36} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            ranked = sorted(self.upstreams.items(), key=lambda kv: kv[1].quantile(0.95), reverse=True)
+            for (service, server), h in ranked[:top]:
+                print(f"  {service[:28]:28} {server[:36]:36} {h.count:7d} "
+                      f"{ms(h.quantile(0.5))} {ms(h.quantile(0.95))} {ms(h.quantile(0.99))}")
+
+            print("")
+            print("🔐 Traefik overhead per router (middlewares, ForwardAuth)")
+            print(f"  {'router':28} {'auth':>5} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'denied':>7}")
+            for router, h in sorted(self.overhead.items(), key=lambda kv: kv[1].quantile(0.5), reverse=True):
+                auth = 'yes' if self.is_auth_router(router) else 'no'
+                print(f"  {router[:28]:28} {auth:>5} {h.count:7d} {ms(h.quantile(0.5))} {ms(h.quantile(0.95))} "
+                      f"{self.denied.get(router, 0):7d}")
+
+            auth = [h for r, h in self.overhead.items() if self.is_auth_router(r)]
+            plain = [h for r, h in self.overhead.items() if not self.is_auth_router(r)]
+            if auth and plain:
+                auth_p50 = sum(h.quantile(0.5) * h.count for h in auth) / sum(h.count for h in auth)
+                plain_p50 = sum(h.quantile(0.5) * h.count for h in plain) / sum(h.count for h in plain)
+                print("")
+                print(f"  Estimated ForwardAuth cost: {(auth_p50 - plain_p50) * 1000:.1f}ms per request "
+                      f"(median overhead {auth_p50 * 1000:.1f}ms with auth vs {plain_p50 * 1000:.1f}ms without)")
+
+
+def follow_file(path, from_start=False, poll_interval=0.5):
+    """Yield lines as they are appended, reopening the file after rotation"""
+    handle = None
+    inode = None
+    pending = b''
+    while True:
+        if handle is None:
+            try:
+                handle = open(path, 'rb')
+            except FileNotFoundError:
+                time.sleep(poll_interval * 4)
+                continue
+            inode = os.fstat(handle.fileno()).st_ino
+            if not from_start:
+                handle.seek(0, os.SEEK_END)
+            # A rotated-in file is always read from the beginning
+            from_start = True
+
+        chunk = handle.readline()
+        if chunk:
+            # Partial lines are buffered until Traefik finishes writing them
+            pending += chunk
+            if pending.endswith(b'\n'):
+                yield pending.decode('utf-8', errors='replace')
+                pending = b''
+            continue
+
+        time.sleep(poll_interval)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_ino != inode or stat.st_size < handle.tell():
+            handle.close()
+            handle = None
+            pending = b''
+
+
+def read_file(path):
+    with open(path, 'r', errors='replace') as handle:
+        yield from handle
+
+
+def read_loki(loki_url, query, since, limit=5000, timeout=30):
+    """Yield log lines from Loki's query_range API, oldest first, paging by timestamp"""
+    end_ns = time.time_ns()
+    start_ns = end_ns - since * 10**9
+    while start_ns < end_ns:
+        params = urllib.parse.urlencode({
+            'query': query, 'start': start_ns, 'end': end_ns, 'limit': limit, 'direction': 'forward',
+        })
+        with urllib.request.urlopen(f"{loki_url.rstrip('/')}/loki/api/v1/query_range?{params}",
+                                    timeout=timeout) as response:
+            payload = json.load(response)
+        if payload.get('status') != 'success':
+            raise RuntimeError(f"Loki query failed: {payload.get('error', 'unknown error')}")
+
+        values = sorted(value for stream in payload['data']['result'] for value in stream['values'])
+        for _, line in values:
+            yield line
+        if len(values) < limit:
+            break
+        start_ns = int(values[-1][0]) + 1
+
+
+def parse_duration(value):
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    match = re.fullmatch(r'(\d+)([smhd])', value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid duration: {value} (expected e.g. 30m, 6h, 1d)")
+    return int(match.group(1)) * units[match.group(2)]
+
+
+def serve_metrics(stats, listen):
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = stats.render_metrics().encode()
+                content_type = 'text/plain; version=0.0.4'
+            elif self.path == '/healthz':
+                body, content_type = b'ok\n', 'text/plain'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    host, _, port = listen.rpartition(':')
+    server = http.server.ThreadingHTTPServer((host or '0.0.0.0', int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-route latency analytics from the Traefik JSON access log')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--file', default='/var/log/traefik/access.log', help='Access log to read or follow')
+    source.add_argument('--loki-url', help='Read the access log from Loki instead of a file (implies --report)')
+    parser.add_argument('--loki-query', default='{job="traefik-access"}', help='LogQL stream selector')
+    parser.add_argument('--since', type=parse_duration, default='1h', help='Loki time range, e.g. 30m, 6h')
+    parser.add_argument('--report', action='store_true', help='Read once, print a report and exit')
+    parser.add_argument('--listen', default='0.0.0.0:9105', help='host:port for /metrics when following')
+    parser.add_argument('--from-start', action='store_true', help='Process the existing file before following')
+    parser.add_argument('--auth-routers', default='',
+                        help='Comma-separated router name patterns protected by ForwardAuth')
+    parser.add_argument('--path-depth', type=int, default=3, help='Path segments kept after normalisation')
+    parser.add_argument('--max-paths', type=int, default=50, help='Distinct paths tracked per router')
+    parser.add_argument('--top', type=int, default=10, help='Rows per report table')
+
+    args = parser.parse_args()
+
+    auth_routers = [p.strip() for p in args.auth_routers.split(',') if p.strip()]
+    stats = AccessLogStats(args.path_depth, args.max_paths, auth_routers)
+
+    if args.loki_url or args.report:
+        try:
+            if args.loki_url:
+                lines = read_loki(args.loki_url, args.loki_query, args.since)
+            else:
+                lines = read_file(args.file)
+            for line in lines:
+                stats.observe_line(line)
+        except (urllib.error.URLError, RuntimeError, OSError) as e:
+            print(f"❌ Cannot read access log: {e}")
+            sys.exit(1)
+        stats.print_report(args.top)
+        sys.exit(0)
+
+    server = serve_metrics(stats, args.listen)
+    print(f"🔍 Following {args.file}, metrics on http://{args.listen}/metrics", flush=True)
+    try:
+        for line in follow_file(args.file, from_start=args.from_start):
+            stats.observe_line(line)
+    except KeyboardInterrupt:
+        print("\n⚠️  Shutting down")
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()